@@ -0,0 +1,115 @@
+# actor.py
+
+"""
+Écrivain unique de l'état d'une table (shard).
+
+Les écritures qui ne viennent pas d'un update (tâches planifiées : reset,
+bilans, messages de démarrage ; reprise du journal des envois) ne touchent
+plus l'état depuis le thread qui les déclenche : elles sont déposées dans la
+file de commandes du StateActor du shard, consommée par un seul thread. Chaque
+commande s'exécute dans le contexte du shard et sous son verrou de la logique
+métier (EngineGate), celui que prennent aussi les updates : une tâche
+planifiée ne s'exécute jamais pendant qu'un update parcourt les prédictions.
+
+Un appel fait depuis l'écrivain lui-même (thread de l'acteur, ou thread qui
+détient déjà le verrou) est exécuté sur place, sans passer par la file.
+Après chaque commande, toujours sous le verrou, `after` publie la vue
+immuable de la table (Shard.publish_snapshot).
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ACTOR_COMMANDS = REGISTRY.counter('bot_actor_commands_total', "Commandes exécutées par l'écrivain unique de chaque table", ('shard', 'result'))
+ACTOR_QUEUE_DEPTH = REGISTRY.gauge('bot_actor_queue_depth', "Commandes en attente de l'écrivain unique", ('shard',))
+ACTOR_WAIT = REGISTRY.histogram('bot_actor_wait_seconds', "Attente d'une commande avant son exécution par l'écrivain unique", ('shard',))
+
+_STOP = object()
+
+
+class StateActor:
+    """File de commandes consommée par un thread, sous le verrou de la logique métier du shard."""
+
+    def __init__(self, name: str, gate=None, context: Optional[Callable[[], ContextManager]] = None, maxsize: int = 1000,
+                 after: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.gate = gate
+        self._context = context or nullcontext
+        self._after = after
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        ACTOR_QUEUE_DEPTH.set_function(self._queue.qsize, shard=name)
+
+    def start(self) -> 'StateActor':
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'actor-{self.name}', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Termine le thread après les commandes déjà déposées."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_writer(self) -> bool:
+        """Vrai sur le thread de l'acteur ou sur un thread qui détient déjà le verrou du shard."""
+        return threading.current_thread() is self._thread or bool(self.gate and self.gate.held())
+
+    # --- Commandes ---
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Dépose une commande ; le Future porte son résultat ou son exception."""
+        future: Future = Future()
+        if self.is_writer() or self._thread is None:
+            # Déjà écrivain (ou acteur non démarré) : exécution sur place, sans file
+            self._execute(future, fn, args, kwargs)
+            return future
+        self._queue.put((time.monotonic(), future, fn, args, kwargs))
+        return future
+
+    def call(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Exécute la commande par l'écrivain et attend son résultat."""
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    def join(self) -> None:
+        """Attend que toutes les commandes déposées soient exécutées."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                enqueued_at, future, fn, args, kwargs = item
+                ACTOR_WAIT.observe(time.monotonic() - enqueued_at, shard=self.name)
+                self._execute(future, fn, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, future: Future, fn: Callable[..., Any], args, kwargs) -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        # Verrou déjà détenu par ce thread (appel sur place depuis un update) : pas de réentrée
+        gate = self.gate if self.gate is not None and not self.gate.held() else None
+        try:
+            with self._context(), (gate or nullcontext()):
+                result = fn(*args, **kwargs)
+                if self._after is not None and gate is not None:
+                    self._after()
+        except Exception as e:
+            ACTOR_COMMANDS.inc(shard=self.name, result='error')
+            logger.error(f"❌ Commande échouée sur la table '{self.name}': {e}")
+            future.set_exception(e)
+            return
+        ACTOR_COMMANDS.inc(shard=self.name, result='ok')
+        future.set_result(result)
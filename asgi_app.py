@@ -0,0 +1,357 @@
+# asgi_app.py
+
+"""
+Point d'entrée asyncio/ASGI optionnel, alternative à main.py (Flask + gunicorn).
+
+    pip install -r requirements-async.txt
+    uvicorn asgi_app:app --host 0.0.0.0 --port $PORT
+
+Les appels à l'API Telegram passent par un client HTTP asynchrone avec pool de
+connexions : les envois pour des chats indépendants se chevauchent au lieu de
+s'additionner. La logique métier (TelegramHandlers / CardPredictor) est
+réutilisée telle quelle ; elle s'exécute dans des threads mais jamais en
+parallèle avec elle-même pour une même table (un EngineGate par shard, voir shards.py).
+"""
+import asyncio
+import concurrent.futures
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from config import Config
+from dispatcher import update_chat_key
+from bot import ALLOWED_UPDATES
+from card_predictor import BENIN_TZ
+from handlers import TelegramHandlers
+from telegram_api import API_FAST_FAILS, API_SECONDS, DEFAULT_API_BASE, breaker_for, configure_breaker, remaining_budget
+from update_dedup import UpdateDeduplicator
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, STAGE_SECONDS, WEBHOOK_SECONDS
+from priority import priority_class
+from profiler import PROFILER, handle_profile_request, is_authorized
+import jobs
+from logging_setup import configure_logging
+
+# Niveaux (LOG_LEVEL, LOG_LEVELS) et écriture des logs hors du thread de traitement
+configure_logging()
+logger = logging.getLogger(__name__)
+
+PENDING_UPDATES = REGISTRY.gauge('bot_asgi_pending_updates', "Updates acceptés par la route ASGI et pas encore traités")
+
+
+class AsyncTelegramClient:
+    """Client asynchrone de l'API Bot Telegram (connexions réutilisées)."""
+
+    def __init__(self, token: str, api_base: Optional[str] = None, max_connections: int = 20, timeout: float = 10.0):
+        if httpx is None:
+            raise RuntimeError("httpx n'est pas installé (pip install -r requirements-async.txt)")
+        self.base_url = f"{(api_base or DEFAULT_API_BASE).rstrip('/')}/bot{token}"
+        # Même disjoncteur que les clients synchrones de cette URL (telegram_api.py)
+        self.breaker = breaker_for(api_base)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def _post(self, method: str, payload: Dict[str, Any]) -> Tuple[Optional[Any], bool]:
+        """(réponse HTTP ou None, issue inconnue) : l'issue est inconnue quand la requête a pu atteindre Telegram sans réponse lisible."""
+        if not self.breaker.allow():
+            API_FAST_FAILS.inc(reason='circuit_open')
+            logger.error(f"Appel {method} refusé: disjoncteur ouvert")
+            return None, False
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            r = await self._client.post(f"{self.base_url}/{method}", json=payload)
+            status = r.status_code
+            if r.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return r, False
+        except asyncio.CancelledError:
+            # Annulé par le budget de l'update : aucun verdict sur l'API
+            self.breaker.record_neutral()
+            raise
+        except httpx.ConnectTimeout as e:
+            # Connexion jamais établie : échec certain
+            self.breaker.record_failure()
+            logger.error(f"Exception appel {method}: {e}")
+            return None, False
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.error(f"Exception appel {method} (issue inconnue): {e}")
+            return None, True
+        finally:
+            API_SECONDS.observe(time.perf_counter() - start, method=method, status=status)
+
+    async def call(self, method: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        r, _ = await self._post(method, payload)
+        if r is None:
+            return None
+        if r.status_code != 200:
+            logger.error(f"Erreur Telegram {r.status_code}: {r.text}")
+            return None
+        try:
+            return r.json()
+        except ValueError as e:
+            logger.error(f"Réponse illisible pour {method}: {e}")
+            return None
+
+    async def post_message(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False,
+                           reply_markup: Optional[Dict] = None) -> Tuple[Optional[int], bool]:
+        """Même contrat que TelegramHandlers._post_message : (message_id, issue inconnue)."""
+        if not chat_id or not text: return None, False
+
+        method = 'editMessageText' if (message_id or edit) else 'sendMessage'
+        payload = {'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode}
+        if message_id: payload['message_id'] = message_id
+        if reply_markup:
+            payload['reply_markup'] = json.dumps(reply_markup) if isinstance(reply_markup, dict) else reply_markup
+
+        r, unknown = await self._post(method, payload)
+        if r is None:
+            return None, unknown
+        if r.status_code == 200:
+            try:
+                return r.json().get('result', {}).get('message_id'), False
+            except ValueError as e:
+                # Accepté par Telegram mais réponse illisible : le message existe peut-être
+                logger.error(f"Réponse illisible pour {method} (issue inconnue): {e}")
+                return None, True
+        if method == 'editMessageText' and 'message is not modified' in r.text:
+            # Édition rejouée (reprise du journal des envois) : le message a déjà ce contenu
+            return message_id, False
+        logger.error(f"Erreur Telegram {r.status_code}: {r.text}")
+        return None, False
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class AsyncBridgeHandlers(TelegramHandlers):
+    """TelegramHandlers dont les envois (réponses admin, prédictions, éditions de résultat) passent par le client asynchrone sur la boucle."""
+
+    def __init__(self, bot_token: str, client: AsyncTelegramClient, loop: asyncio.AbstractEventLoop, api_base: Optional[str] = None):
+        self.client = client
+        self.loop = loop
+        super().__init__(bot_token, api_base=api_base)
+
+    def _post_message(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False,
+                      reply_markup: Optional[Dict] = None) -> Tuple[Optional[int], bool]:
+        if not chat_id or not text: return None, False
+        remaining = remaining_budget()
+        if remaining is not None and remaining <= 0:
+            # Appel jamais parti : échec certain
+            API_FAST_FAILS.inc(reason='deadline')
+            return None, False
+        future = asyncio.run_coroutine_threadsafe(
+            self.client.post_message(chat_id, text, parse_mode, message_id=message_id, edit=edit, reply_markup=reply_markup),
+            self.loop
+        )
+        with STAGE_SECONDS.time(stage='send'), self._network_call():
+            remaining = remaining_budget()
+            try:
+                return future.result(timeout=remaining)
+            except concurrent.futures.TimeoutError:
+                # Budget de l'update épuisé pendant l'appel : la requête a pu partir, issue inconnue
+                future.cancel()
+                API_FAST_FAILS.inc(reason='deadline')
+                logger.error(f"Envoi vers {chat_id} abandonné: budget de l'update épuisé (issue inconnue)")
+                return None, True
+
+
+class AsyncBotApp:
+    """Application ASGI : webhook, santé, métriques et tâches planifiées asynchrones."""
+
+    def __init__(self, max_pending: int = 1000):
+        self.config = Config()
+        self.max_pending = max_pending
+        self.client: Optional[AsyncTelegramClient] = None
+        self.handlers: Optional[AsyncBridgeHandlers] = None
+        self.deduplicator = UpdateDeduplicator(capacity=self.config.DEDUP_WINDOW)
+        # Chat → [verrou, nombre de tâches qui l'utilisent ou l'attendent] ; supprimé quand plus personne n'en a besoin
+        self._chat_locks: Dict[Any, List] = {}
+        self._tasks = set()
+        self._scheduler_task: Optional[asyncio.Task] = None
+
+    # --- Cycle de vie ---
+    async def startup(self) -> None:
+        loop = asyncio.get_running_loop()
+        configure_breaker(self.config.TELEGRAM_API_BASE, self.config.API_FAILURE_THRESHOLD, self.config.API_RESET_TIMEOUT)
+        self.client = AsyncTelegramClient(self.config.BOT_TOKEN, api_base=self.config.TELEGRAM_API_BASE)
+        self.handlers = await asyncio.to_thread(AsyncBridgeHandlers, self.config.BOT_TOKEN, self.client, loop,
+                                                self.config.TELEGRAM_API_BASE)
+        await asyncio.to_thread(self.handlers.apply_config, self.config)
+        await asyncio.to_thread(self.handlers.retry_outbox)
+        PENDING_UPDATES.set_function(lambda: len(self._tasks))
+
+        webhook_url = self.config.get_webhook_url()
+        if webhook_url:
+            result = await self.client.call('setWebhook', {'url': webhook_url, 'allowed_updates': ALLOWED_UPDATES})
+            if result and result.get('ok'):
+                logger.info(f"✅ Webhook configuré avec succès: {webhook_url}")
+            else:
+                logger.error("❌ Échec configuration webhook.")
+        else:
+            logger.warning("⚠️ WEBHOOK_URL non configurée. Le webhook ne sera PAS configuré.")
+
+        self._scheduler_task = asyncio.create_task(self._run_scheduler())
+        logger.info("🚀 Pipeline asyncio démarré")
+
+    async def shutdown(self) -> None:
+        if self._scheduler_task:
+            self._scheduler_task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.deduplicator.flush()
+        if self.client:
+            await self.client.aclose()
+
+    # --- Traitement des updates ---
+    def _run_handlers(self, update: Dict[str, Any]) -> None:
+        # Le verrou de la table (shard) concernée est pris par handle_update
+        with priority_class(self.handlers.classify_update(update)):
+            PROFILER.profile_once(self.handlers.handle_update, update)
+
+    async def _process(self, update: Dict[str, Any]) -> None:
+        # Verrou par chat : ordre strict dans un chat (asyncio.Lock est FIFO), parallélisme entre chats
+        key = update_chat_key(update)
+        entry = self._chat_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._process_locked(update)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[key]
+
+    async def _process_locked(self, update: Dict[str, Any]) -> None:
+        version = self.handlers.state_version()
+        try:
+            await asyncio.to_thread(self._run_handlers, update)
+        except Exception as e:
+            self.deduplicator.release(update['update_id'])
+            logger.error(f"❌ Error handling update {update.get('update_id')}: {e}")
+            return
+        self.deduplicator.mark_processed(update['update_id'], flush=self.handlers.state_version() != version)
+
+    def accept(self, update: Dict[str, Any]) -> bool:
+        """Planifie le traitement de l'update ; False si trop d'updates sont déjà en cours."""
+        if len(self._tasks) >= self.max_pending:
+            return False
+        if not self.deduplicator.claim(update['update_id']):
+            return True
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    # --- Tâches planifiées (remplace APScheduler) ---
+    def _run_job(self, job: jobs.ScheduledJob) -> None:
+        jobs.run_job_on_shards(job, self.handlers.shards)
+
+    async def _run_scheduler(self) -> None:
+        while True:
+            now = self.handlers.clock.now(BENIN_TZ)
+            upcoming = sorted((jobs.next_run_time(job, now), job.id, job) for job in jobs.SCHEDULE)
+            when = upcoming[0][0]
+            await asyncio.sleep(max(0.0, (when - now).total_seconds()))
+            for run_at, _, job in upcoming:
+                if run_at != when:
+                    break
+                logger.info(f"⏰ Tâche planifiée: {job.name}")
+                try:
+                    await asyncio.to_thread(self._run_job, job)
+                except Exception as e:
+                    logger.error(f"❌ Erreur tâche {job.id}: {e}")
+
+    # --- ASGI ---
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        path, method = scope['path'], scope['method']
+        if path == '/webhook' and method == 'POST':
+            start = time.perf_counter()
+            body = await self._read_body(receive)
+            try:
+                update = json.loads(body) if body else None
+            except ValueError:
+                update = None
+            if not update:
+                status, payload = 200, {'status': 'ok'}
+            elif not isinstance(update, dict) or not isinstance(update.get('update_id'), int):
+                status, payload = 400, {'status': 'invalid update'}
+            elif not self.accept(update):
+                status, payload = 503, {'status': 'busy'}
+            else:
+                status, payload = 200, 'OK'
+            await self._respond(send, status, payload)
+            WEBHOOK_SECONDS.observe(time.perf_counter() - start, status=status)
+        elif path == '/health' and method == 'GET':
+            await self._respond(send, 200, {'status': 'healthy', 'service': 'telegram-bot'})
+        elif path == '/metrics' and method == 'GET':
+            await self._respond(send, 200, REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+        elif path == '/debug/profile' and method in ('GET', 'POST'):
+            headers = dict(scope.get('headers') or [])
+            if not is_authorized(self.config.ADMIN_TOKEN, headers.get(b'x-admin-token', b'').decode()):
+                await self._respond(send, 404, {'status': 'not found'})
+                return
+            params = {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+            status, payload = await asyncio.to_thread(handle_profile_request, method, params)
+            await self._respond(send, status, payload)
+        elif path == '/' and method == 'GET':
+            await self._respond(send, 200, {'message': 'Telegram Bot is running', 'status': 'active'})
+        else:
+            await self._respond(send, 404, {'status': 'not found'})
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                    await send({'type': 'lifespan.startup.complete'})
+                except Exception as e:
+                    logger.error(f"❌ Erreur démarrage ASGI: {e}")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    @staticmethod
+    async def _respond(send, status: int, payload, content_type: Optional[str] = None) -> None:
+        if isinstance(payload, (dict, list)):
+            body = json.dumps(payload).encode()
+            content_type = content_type or 'application/json'
+        else:
+            body = str(payload).encode()
+            content_type = content_type or 'text/plain; charset=utf-8'
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+app = AsyncBotApp()
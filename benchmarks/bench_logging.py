@@ -0,0 +1,140 @@
+# benchmarks/bench_logging.py
+
+"""
+Coût des logs par update, selon la configuration de logging_setup.py.
+
+    python benchmarks/bench_logging.py --games 300
+    python benchmarks/bench_logging.py --configs legacy,queue_info --stream stderr
+
+Chaque configuration rejoue le même trafic synthétique du canal source
+(TelegramBot.handle_update, API Telegram simulée) ; le surcoût est mesuré par
+rapport à une exécution avec les logs désactivés. `legacy` reproduit
+l'ancienne configuration : card_predictor forcé en DEBUG, écriture synchrone.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_source import SyntheticSource, SOURCE_CHANNEL_ID, PREDICTION_CHANNEL_ID  # noqa: E402
+
+CONFIGS = {
+    'legacy': dict(level='INFO', module_levels='card_predictor=DEBUG', use_queue=False),
+    'sync_info': dict(level='INFO', module_levels='', use_queue=False),
+    'queue_info': dict(level='INFO', module_levels='', use_queue=True),
+    'queue_warning': dict(level='WARNING', module_levels='', use_queue=True),
+}
+
+
+def _replay(updates, api_base, start_time) -> float:
+    """Temps (s) de traitement des updates par un bot neuf, dans un répertoire jetable."""
+    from bot import TelegramBot
+    from clock import SimulatedClock
+
+    os.chdir(tempfile.mkdtemp(prefix='bench_logging_'))
+    clock = SimulatedClock(start_time)
+    bot = TelegramBot('123456:bench', api_base=api_base, clock=clock)
+    predictor = bot.handlers.card_predictor
+    predictor.target_channel_id = SOURCE_CHANNEL_ID
+    predictor.prediction_channel_id = PREDICTION_CHANNEL_ID
+
+    # Sauvegardes différées hors mesure : l'écriture de l'état masquerait le coût des logs
+    with predictor.deferred_save():
+        started = time.perf_counter()
+        for update in updates:
+            post = update.get('channel_post') or update.get('edited_channel_post')
+            clock.set(post['date'])
+            bot.handle_update(update)
+        elapsed = time.perf_counter() - started
+    return elapsed
+
+
+def run(games: int, seed: int, configs, stream_kind: str, repeat: int) -> dict:
+    import logging
+    from datetime import datetime
+    from mock_telegram import MockTelegramServer
+
+    original_dir = os.getcwd()
+    mock = MockTelegramServer(seed=seed)
+    api_base = mock.start()
+    os.chdir(tempfile.mkdtemp(prefix='bench_logging_'))
+
+    from card_predictor import BENIN_TZ
+    from logging_setup import configure_logging, stop_logging
+
+    # Jeux à partir de 10h00 (en session) : le moteur prédit et vérifie comme en production
+    start_time = BENIN_TZ.localize(datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)).timestamp()
+    updates = list(SyntheticSource(seed=seed, start_time=start_time).updates(games))
+
+    if stream_kind == 'stderr':
+        stream = sys.stderr
+    elif stream_kind == 'null':
+        stream = open(os.devnull, 'w')
+    else:
+        stream = open(os.path.join(tempfile.mkdtemp(prefix='bench_logging_'), 'bot.log'), 'w')
+
+    def best_of(fn):
+        return min(fn() for _ in range(repeat))
+
+    logging.disable(logging.CRITICAL)
+    baseline = best_of(lambda: _replay(updates, api_base, start_time))
+    logging.disable(logging.NOTSET)
+
+    results = {'games': games, 'updates': len(updates), 'stream': stream_kind,
+               'off_us_per_update': baseline / len(updates) * 1e6, 'configs': {}}
+    for name in configs:
+        configure_logging(stream=stream, **CONFIGS[name])
+        elapsed = best_of(lambda: _replay(updates, api_base, start_time))
+        stop_logging()
+        per_update = elapsed / len(updates) * 1e6
+        results['configs'][name] = {
+            'us_per_update': per_update,
+            'overhead_us_per_update': per_update - results['off_us_per_update'],
+        }
+
+    mock.stop()
+    os.chdir(original_dir)
+    return results
+
+
+def print_report(results: dict) -> None:
+    print(f"\n📝 Logs: {results['updates']} updates ({results['games']} jeux), sortie={results['stream']}", file=sys.stderr)
+    print(f"   {'off':<14} {results['off_us_per_update']:>9.1f} µs/update", file=sys.stderr)
+    for name, values in results['configs'].items():
+        print(f"   {name:<14} {values['us_per_update']:>9.1f} µs/update  (surcoût {values['overhead_us_per_update']:+.1f} µs)",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Surcoût des logs par update")
+    parser.add_argument('--games', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--configs', default=','.join(CONFIGS), help=f"Parmi: {', '.join(CONFIGS)}")
+    parser.add_argument('--stream', choices=['file', 'stderr', 'null'], default='file', help="Destination des logs")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Écrit les résultats JSON dans ce fichier")
+    args = parser.parse_args()
+
+    configs = [c for c in args.configs.split(',') if c]
+    unknown = [c for c in configs if c not in CONFIGS]
+    if unknown:
+        parser.error(f"Configuration inconnue: {', '.join(unknown)}")
+
+    output = os.path.abspath(args.output) if args.output else None
+    results = run(args.games, args.seed, configs, args.stream, args.repeat)
+    print_report(results)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
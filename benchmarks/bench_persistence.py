@@ -0,0 +1,165 @@
+# benchmarks/bench_persistence.py
+
+"""
+Micro-benchmarks de la persistance de CardPredictor selon la taille de l'état.
+
+    python benchmarks/bench_persistence.py
+    python benchmarks/bench_persistence.py --sizes 1000,10000 --output persistence_results.json
+
+Pour chaque stratégie de stockage et chaque taille (observations INTER et
+prédictions), mesure : sauvegarde complète, sauvegarde après une nouvelle
+observation (« incrémentale »), chargement à froid et reset quotidien.
+Les résultats sont écrits en JSON (un enregistrement par mesure).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+SUITS = ['♠️', '♥️', '♦️', '♣️']
+VALUES = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+
+
+def seed_predictor(predictor, size: int) -> None:
+    """Remplit l'état avec `size` observations INTER et `size` prédictions."""
+    now = datetime.now().isoformat()
+    predictor.inter_data = [{
+        'numero_resultat': i + 2,
+        'declencheur': f"{VALUES[i % 13]}{SUITS[i % 4]}",
+        'numero_declencheur': i,
+        'result_suit': SUITS[(i // 13) % 4],
+        'date': now,
+    } for i in range(size)]
+    predictor.sequential_history = {i: {'carte': f"{VALUES[i % 13]}{SUITS[i % 4]}", 'date': now} for i in range(size)}
+    predictor.collected_games = set(range(size))
+    predictor.predictions = {i + 2: {
+        'predicted_costume': SUITS[i % 4],
+        'status': 'won' if i % 3 else 'lost',
+        'predicted_from': i,
+        'predicted_from_trigger': f"{VALUES[i % 13]}{SUITS[i % 4]}",
+        'message_text': f"🔵{i + 2}🔵:{SUITS[i % 4]} statut :⏳",
+        'message_id': i,
+        'is_inter': bool(i % 2),
+        'rule_index': i % 4,
+        'timestamp': time.time(),
+    } for i in range(size)}
+    predictor.is_inter_mode_active = True
+
+
+def _directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path) if f.endswith('.json'))
+
+
+def _timed(fn, repeat: int) -> float:
+    """Meilleur temps sur `repeat` exécutions (secondes)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class JsonFilesStrategy:
+    """Stockage actuel : un fichier JSON indenté par champ, réécrit en entier à chaque sauvegarde."""
+    name = 'json_files'
+
+    def full_save(self, predictor):
+        predictor._save_all_data()
+
+    def incremental_save(self, predictor, index: int):
+        # Une nouvelle observation, puis la sauvegarde déclenchée par collect_inter_data
+        game = len(predictor.inter_data) + index + 10
+        predictor.inter_data.append({'numero_resultat': game, 'declencheur': 'A♠️', 'numero_declencheur': game - 2,
+                                     'result_suit': '♠️', 'date': datetime.now().isoformat()})
+        predictor._save_all_data()
+
+    def cold_load(self, predictor_cls):
+        return predictor_cls()
+
+    def daily_reset(self, predictor):
+        import jobs
+        jobs.reset_all_data(predictor)
+
+
+STRATEGIES = {JsonFilesStrategy.name: JsonFilesStrategy}
+
+
+def run(sizes, strategies, repeat):
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    results = []
+    original_dir = os.getcwd()
+    for strategy_name in strategies:
+        strategy = STRATEGIES[strategy_name]()
+        for size in sizes:
+            work_dir = tempfile.mkdtemp(prefix=f'bench_persistence_{size}_')
+            os.chdir(work_dir)
+            try:
+                from card_predictor import CardPredictor
+
+                predictor = CardPredictor()
+                seed_predictor(predictor, size)
+                reps = repeat or max(1, min(5, 100_000 // size))
+
+                def record(operation, seconds, **extra):
+                    results.append(dict(strategy=strategy_name, size=size, operation=operation, seconds=seconds, repeat=reps, **extra))
+                    print(f"   {strategy_name:<11} {size:>9} {operation:<17} {seconds * 1000:>12.2f} ms")
+
+                record('full_save', _timed(lambda: strategy.full_save(predictor), reps), bytes=None)
+                results[-1]['bytes'] = _directory_bytes(work_dir)
+
+                counter = iter(range(10 ** 9))
+                record('incremental_save', _timed(lambda: strategy.incremental_save(predictor, next(counter)), reps))
+                record('cold_load', _timed(lambda: strategy.cold_load(CardPredictor), reps))
+                # Le reset vide l'état : une seule mesure, sur l'état complet
+                record('daily_reset', _timed(lambda: strategy.daily_reset(predictor), 1))
+            finally:
+                os.chdir(original_dir)
+                shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de persistance de CardPredictor")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Tailles d'état séparées par des virgules")
+    parser.add_argument('--strategies', default=','.join(STRATEGIES), help=f"Parmi: {', '.join(STRATEGIES)}")
+    parser.add_argument('--repeat', type=int, default=0, help="Répétitions par mesure (0 = automatique selon la taille)")
+    parser.add_argument('--output', default='persistence_results.json')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    strategies = [s for s in args.strategies.split(',') if s]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"Stratégie inconnue: {', '.join(unknown)}")
+
+    output = os.path.abspath(args.output)
+    print(f"💾 Persistance: tailles={sizes} stratégies={strategies}")
+    results = run(sizes, strategies, args.repeat)
+
+    with open(output, 'w') as f:
+        json.dump({
+            'generated_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2)
+    print(f"📄 Résultats: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
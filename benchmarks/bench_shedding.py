@@ -0,0 +1,146 @@
+# benchmarks/bench_shedding.py
+
+"""
+Délestage du dispatcher parallèle (WEBHOOK_MODE=parallel) en surcharge.
+
+    python benchmarks/bench_shedding.py
+    python benchmarks/bench_shedding.py --threshold 5 --workers 2
+
+Chaque scénario remplit un ChatDispatcher au-delà du seuil de son
+LoadShedder, puis mesure le temps nécessaire pour tout traiter. Les
+commandes admin mises de côté doivent reprendre même sans autre trafic (une
+surcharge due aux seules commandes admin) et rester dans l'ordre de leur
+chat. Code de sortie 1 si un update reste en file ou sort du désordre.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from dispatcher import ChatDispatcher  # noqa: E402
+from load_shedding import LoadShedder  # noqa: E402
+from priority import ADMIN, VERIFY  # noqa: E402
+
+SOURCE_CHAT = -1001
+ADMIN_CHATS = [11, 12, 13]
+
+# Scénario → (updates du canal source, commandes par chat admin, chats admin)
+SCENARIOS = {
+    'admin_only': (0, 10, 1),
+    'admin_many_chats': (0, 5, 3),
+    'mixed': (20, 10, 2),
+}
+
+
+def _update(update_id: int, chat_id: int, text: str) -> dict:
+    kind = 'channel_post' if chat_id == SOURCE_CHAT else 'message'
+    return {'update_id': update_id, kind: {'message_id': update_id, 'chat': {'id': chat_id}, 'text': text}}
+
+
+def _classify(update: dict) -> str:
+    return VERIFY if 'channel_post' in update else ADMIN
+
+
+def run_scenario(source_updates: int, commands: int, admin_chats: int, threshold: int, workers: int,
+                 work_s: float, timeout: float) -> dict:
+    processed = []
+    lock = threading.Lock()
+
+    def handle(update):
+        time.sleep(work_s)
+        with lock:
+            processed.append(update)
+
+    shedder = LoadShedder(threshold, _classify, lambda text: None, name='bench')
+    dispatcher = ChatDispatcher(handle, workers=workers, maxsize=1000, name='bench', classify=_classify, shedder=shedder)
+    updates = []
+    update_id = 0
+    for _ in range(source_updates):
+        update_id += 1
+        updates.append(_update(update_id, SOURCE_CHAT, f"#N{update_id}. ✅"))
+    for i in range(commands):
+        for chat_id in ADMIN_CHATS[:admin_chats]:
+            update_id += 1
+            updates.append(_update(update_id, chat_id, f"/status {i}"))
+    # File remplie avant le démarrage des threads : la surcharge est visible dès le premier update
+    for update in updates:
+        dispatcher.put(update)
+    started = time.perf_counter()
+    dispatcher.start()
+    deadline = started + timeout
+    while dispatcher.qsize() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    remaining = dispatcher.qsize()
+    dispatcher.stop(timeout=0)
+
+    out_of_order = 0
+    for chat_id in [SOURCE_CHAT] + ADMIN_CHATS:
+        ids = [u['update_id'] for u in processed if _update_chat(u) == chat_id]
+        out_of_order += sum(1 for a, b in zip(ids, ids[1:]) if b < a)
+    return {
+        'updates': len(updates),
+        'processed': len(processed),
+        'remaining': remaining,
+        'out_of_order': out_of_order,
+        'overloaded_at_end': shedder.overloaded,
+        'drain_s': elapsed,
+    }
+
+
+def _update_chat(update: dict) -> int:
+    return (update.get('channel_post') or update['message'])['chat']['id']
+
+
+def check(results: dict) -> list:
+    """Liste des écarts (vide si chaque scénario a tout traité, dans l'ordre de chaque chat)."""
+    problems = []
+    for name, result in results.items():
+        if result['remaining']:
+            problems.append(f"{name}: {result['remaining']} updates restés en file sur {result['updates']}")
+        if result['out_of_order']:
+            problems.append(f"{name}: {result['out_of_order']} updates traités hors de l'ordre de leur chat")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Délestage du dispatcher parallèle en surcharge")
+    parser.add_argument('--threshold', type=int, default=5, help="Seuil de surcharge (SHED_QUEUE_DEPTH)")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--work-ms', type=float, default=2.0, help="Durée simulée du traitement d'un update (ms)")
+    parser.add_argument('--timeout', type=float, default=5.0, help="Attente maximale par scénario (s)")
+    parser.add_argument('--output', help="Écrit les résultats JSON dans ce fichier")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    results = {name: run_scenario(*spec, args.threshold, args.workers, args.work_ms / 1000, args.timeout)
+               for name, spec in SCENARIOS.items()}
+    print(f"\n🚦 Délestage (seuil {args.threshold}, {args.workers} threads)")
+    for name, result in results.items():
+        print(f"   {name:<17} {result['processed']}/{result['updates']} traités en {result['drain_s'] * 1000:.0f}ms "
+              f"(restants: {result['remaining']}, hors ordre: {result['out_of_order']})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    problems = check(results)
+    if problems:
+        print("❌ Délestage bloquant:")
+        for line in problems:
+            print(f"   - {line}")
+        return 1
+    print("✅ Toutes les files se vident")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
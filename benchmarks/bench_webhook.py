@@ -0,0 +1,221 @@
+# benchmarks/bench_webhook.py
+
+"""
+Benchmark de bout en bout du webhook : trafic synthétique du canal source
+envoyé à main.app (client de test Flask) contre l'API Telegram simulée.
+
+    python benchmarks/bench_webhook.py --games 500
+    python benchmarks/bench_webhook.py --games 500 --update-baseline
+
+Rapporte les updates/s et les latences p50/p95/p99 du webhook et de chaque
+étape (parse, collect, verify, predict, persist, send). Code de sortie 1 si
+les résultats régressent au-delà de la tolérance par rapport à la baseline.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_source import SyntheticSource, SOURCE_CHANNEL_ID, PREDICTION_CHANNEL_ID  # noqa: E402
+
+STAGES = ['parse', 'collect', 'verify', 'predict', 'persist', 'send']
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline_webhook.json')
+
+# Écart absolu minimal (ms) pour signaler une régression de latence
+MIN_REGRESSION_MS = 0.5
+
+# Couverture minimale du moteur par le rejeu : part des updates arrivés à 'collect', des jeux vérifiés,
+# et prédictions par jeu. En dessous, le trafic a été filtré en amont (limiteur de débit...) et les
+# mesures ne décrivent pas le chemin réel
+MIN_COLLECT_RATIO = 0.9
+MIN_VERIFY_RATIO = 0.9
+MIN_PREDICTIONS_PER_GAME = 0.02
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {'p50': None, 'p95': None, 'p99': None}
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+
+def run(games: int, seed: int, latency: float, webhook_mode: str) -> dict:
+    from mock_telegram import MockTelegramServer
+
+    mock = MockTelegramServer(latency=latency, seed=seed)
+    api_base = mock.start()
+
+    # L'état du bot (fichiers JSON) est écrit dans un répertoire jetable
+    work_dir = tempfile.mkdtemp(prefix='bench_webhook_')
+    os.chdir(work_dir)
+    os.environ.update({'BOT_TOKEN': '123456:bench', 'TELEGRAM_API_BASE': api_base, 'WEBHOOK_MODE': webhook_mode})
+    os.environ.pop('WEBHOOK_URL', None)
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    import main
+    from metrics import STAGE_SECONDS
+
+    if main.scheduler:
+        main.scheduler.shutdown(wait=False)
+
+    from card_predictor import BENIN_TZ
+    from clock import SimulatedClock
+
+    predictor = main.bot.handlers.card_predictor
+    predictor.target_channel_id = SOURCE_CHANNEL_ID
+    predictor.prediction_channel_id = PREDICTION_CHANNEL_ID
+    # Horloge du moteur figée à 10h00 (en session), sans délai entre deux prédictions
+    predictor.clock = SimulatedClock(BENIN_TZ.localize(datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)).timestamp())
+    predictor.prediction_cooldown = 0
+
+    source = SyntheticSource(seed=seed)
+    updates = list(source.updates(games))
+    client = main.app.test_client()
+
+    latencies = []
+    started = time.perf_counter()
+    for update in updates:
+        t0 = time.perf_counter()
+        response = client.post('/webhook', json=update)
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code != 200:
+            raise RuntimeError(f"Webhook {response.status_code} pour update {update['update_id']}")
+    if main.update_queue is not None:
+        main.update_queue.join()
+    elapsed = time.perf_counter() - started
+    mock.stop()
+
+    stages = {}
+    for stage in STAGES:
+        count = STAGE_SECONDS.count(stage=stage)
+        quantiles = {f'p{int(q * 100)}': (STAGE_SECONDS.quantile(q, stage=stage) or 0) * 1000 for q in (0.5, 0.95, 0.99)}
+        stages[stage] = dict(count=count, **quantiles)
+
+    return {
+        'games': games,
+        'updates': len(updates),
+        'webhook_mode': webhook_mode,
+        'mock_latency_s': latency,
+        'elapsed_s': elapsed,
+        'updates_per_second': len(updates) / elapsed if elapsed else 0,
+        'webhook_ms': _percentiles(latencies),
+        'stages_ms': stages,
+        'outbound_calls': {m: mock.count(m) for m in ('sendMessage', 'editMessageText')},
+        'predictions': len(predictor.predictions),
+    }
+
+
+def check_coverage(results: dict) -> list:
+    """Liste des manques de couverture du moteur (vide si le rejeu l'a réellement exercé)."""
+    problems = []
+    stages = results['stages_ms']
+    collected = stages.get('collect', {}).get('count', 0)
+    if collected < results['updates'] * MIN_COLLECT_RATIO:
+        problems.append(f"collect: {collected} updates sur {results['updates']} (min {MIN_COLLECT_RATIO:.0%})")
+    verified = stages.get('verify', {}).get('count', 0)
+    if verified < results['games'] * MIN_VERIFY_RATIO:
+        problems.append(f"verify: {verified} jeux sur {results['games']} (min {MIN_VERIFY_RATIO:.0%})")
+    if results['predictions'] < results['games'] * MIN_PREDICTIONS_PER_GAME:
+        problems.append(f"prédictions: {results['predictions']} pour {results['games']} jeux "
+                        f"(min {results['games'] * MIN_PREDICTIONS_PER_GAME:.0f})")
+    return problems
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Liste des régressions (vide si aucune). Les écarts absolus < MIN_REGRESSION_MS sont ignorés (bruit)."""
+    regressions = []
+    floor = baseline['updates_per_second'] * (1 - tolerance)
+    if results['updates_per_second'] < floor:
+        regressions.append(f"updates/s {results['updates_per_second']:.1f} < {floor:.1f}")
+
+    def ceiling(value):
+        return max(value * (1 + tolerance), value + MIN_REGRESSION_MS)
+
+    for name in ('p50', 'p95'):
+        value = baseline.get('webhook_ms', {}).get(name)
+        if value and results['webhook_ms'][name] > ceiling(value):
+            regressions.append(f"webhook {name} {results['webhook_ms'][name]:.2f}ms > {ceiling(value):.2f}ms")
+    for stage, values in baseline.get('stages_ms', {}).items():
+        value = values.get('p95')
+        current = results['stages_ms'].get(stage, {}).get('p95', 0)
+        if value and current > ceiling(value):
+            regressions.append(f"{stage} p95 {current:.3f}ms > {ceiling(value):.3f}ms")
+    return regressions
+
+
+def print_report(results: dict) -> None:
+    print(f"\n📊 Webhook: {results['updates']} updates ({results['games']} jeux) en {results['elapsed_s']:.2f}s "
+          f"→ {results['updates_per_second']:.1f} updates/s")
+    w = results['webhook_ms']
+    print(f"   webhook   p50={w['p50']:.3f}ms p95={w['p95']:.3f}ms p99={w['p99']:.3f}ms")
+    for stage, values in results['stages_ms'].items():
+        print(f"   {stage:<9} p50={values['p50']:.3f}ms p95={values['p95']:.3f}ms p99={values['p99']:.3f}ms (n={values['count']})")
+    print(f"   appels sortants: {results['outbound_calls']} | prédictions: {results['predictions']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de débit du webhook")
+    parser.add_argument('--games', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency', type=float, default=0.0, help="Latence simulée de l'API Telegram (s)")
+    parser.add_argument('--webhook-mode', choices=['sync', 'queue', 'parallel'], default='sync')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Régression tolérée (0.5 = 50%%)")
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help="Écrit les résultats JSON dans ce fichier")
+    args = parser.parse_args()
+
+    results = run(args.games, args.seed, args.latency, args.webhook_mode)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    problems = check_coverage(results)
+    if problems:
+        # Mesures sans valeur (et baseline refusée) : le moteur n'a pas vu le trafic rejoué
+        print("❌ Le rejeu n'a pas exercé le moteur:")
+        for line in problems:
+            print(f"   - {line}")
+        return 1
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline mise à jour: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("⚠️ Pas de baseline, comparaison ignorée (--update-baseline pour en créer une)")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    for key in ('games', 'webhook_mode', 'mock_latency_s'):
+        if baseline.get(key) != results[key]:
+            print(f"⚠️ Paramètre différent de la baseline: {key}={results[key]} (baseline: {baseline.get(key)})")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("❌ RÉGRESSION par rapport à la baseline:")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+    print("✅ Aucune régression par rapport à la baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
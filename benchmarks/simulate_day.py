@@ -0,0 +1,208 @@
+# benchmarks/simulate_day.py
+
+"""
+Rejoue une journée complète (heure du Bénin) de trafic synthétique du canal
+source en quelques secondes, avec une horloge simulée.
+
+    python benchmarks/simulate_day.py --date 2026-01-15
+    python benchmarks/simulate_day.py --check --output day.json
+
+Le temps n'avance qu'au rythme des updates ; les tâches du calendrier
+(reset 00h59, messages de démarrage 1/9/15/21h, bilans 0/6/12/18h) sont
+exécutées à leur heure exacte. Avec --check, vérifie le comportement
+dépendant de l'heure (code de sortie 1 en cas d'écart).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_source import SyntheticSource, SOURCE_CHANNEL_ID, PREDICTION_CHANNEL_ID  # noqa: E402
+
+DAY_SECONDS = 24 * 3600
+
+
+def _recording_handlers(handlers_cls, tz):
+    class RecordingHandlers(handlers_cls):
+        """Handlers qui notent chaque message sortant avec l'heure simulée."""
+
+        def __init__(self, *args, **kwargs):
+            self.sent = []
+            super().__init__(*args, **kwargs)
+
+        def _post_message(self, chat_id, text, parse_mode='Markdown', message_id=None, edit=False, reply_markup=None):
+            # Point de passage commun de send_message et des envois suivis (journal des envois)
+            self.sent.append((self.clock.now(tz), chat_id, text, bool(message_id or edit)))
+            return super()._post_message(chat_id, text, parse_mode, message_id, edit, reply_markup)
+
+    return RecordingHandlers
+
+
+def _classify(text: str, edit: bool) -> str:
+    if text.startswith('🎬 **LES PRÉDICTIONS REPRENNENT'):
+        return 'startup'
+    if text.startswith('🎬 **BILAN DE SESSION'):
+        return 'report'
+    if text.startswith('🔵'):
+        if not edit:
+            return 'prediction'
+        return 'lost' if '❌' in text else 'won'
+    return 'other'
+
+
+def run(date: str, seed: int) -> dict:
+    from clock import SimulatedClock
+    from mock_telegram import MockTelegramServer
+
+    mock = MockTelegramServer(seed=seed)
+    api_base = mock.start()
+
+    work_dir = tempfile.mkdtemp(prefix='simulate_day_')
+    os.chdir(work_dir)
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    import jobs
+    from card_predictor import BENIN_TZ
+    from handlers import TelegramHandlers
+
+    midnight = BENIN_TZ.localize(datetime.strptime(date, '%Y-%m-%d'))
+    start = midnight.timestamp()
+    # Une seconde avant minuit : les tâches de 00h00 font partie de la journée
+    clock = SimulatedClock(start - 1)
+
+    handlers = _recording_handlers(TelegramHandlers, BENIN_TZ)('123456:simulate', api_base=api_base, clock=clock)
+    predictor = handlers.card_predictor
+    predictor.target_channel_id = SOURCE_CHANNEL_ID
+    predictor.prediction_channel_id = PREDICTION_CHANNEL_ID
+
+    source = SyntheticSource(seed=seed, start_time=start)
+    fired = []
+    updates = games = 0
+    since = clock.now(BENIN_TZ)
+
+    started = time.perf_counter()
+    while True:
+        batch = source.game_updates()
+        first_date = batch[0].get('channel_post', {}).get('date')
+        if first_date >= start + DAY_SECONDS:
+            break
+        games += 1
+        for update in batch:
+            post = update.get('channel_post') or update.get('edited_channel_post')
+            at = datetime.fromtimestamp(post['date'], BENIN_TZ)
+            for run_at, job in jobs.due_jobs(since, at):
+                clock.set(run_at.timestamp())
+                jobs.run_job(job, predictor)
+                fired.append((run_at, job.id))
+            since = at
+            clock.set(post['date'])
+            handlers.handle_update(update)
+            updates += 1
+    # Tâches restantes jusqu'à la fin de la journée
+    end = BENIN_TZ.normalize(midnight + timedelta(days=1)) - timedelta(seconds=1)
+    for run_at, job in jobs.due_jobs(since, end):
+        clock.set(run_at.timestamp())
+        jobs.run_job(job, predictor)
+        fired.append((run_at, job.id))
+    elapsed = time.perf_counter() - started
+    mock.stop()
+
+    hourly = defaultdict(lambda: defaultdict(int))
+    for at, chat_id, text, edit in handlers.sent:
+        hourly[at.hour][_classify(text, edit)] += 1
+    totals = defaultdict(int)
+    for counts in hourly.values():
+        for kind, n in counts.items():
+            totals[kind] += n
+
+    return {
+        'date': date,
+        'seed': seed,
+        'games': games,
+        'updates': updates,
+        'elapsed_s': elapsed,
+        'speedup': DAY_SECONDS / elapsed if elapsed else 0,
+        'jobs': [{'time': at.strftime('%H:%M'), 'job': job_id} for at, job_id in fired],
+        'totals': dict(totals),
+        'hourly': {h: dict(hourly[h]) for h in sorted(hourly)},
+    }
+
+
+def check(results: dict) -> list:
+    """Écarts au comportement attendu sur une journée (vide si conforme)."""
+    from card_predictor import PREDICTION_SESSIONS
+
+    problems = []
+    fired = {(j['time'], j['job']) for j in results['jobs']}
+    expected = {('00:59', 'daily_prediction_reset')}
+    expected |= {(f'{h:02d}:00', f'startup_message_{h}h') for h in (1, 9, 15, 21)}
+    expected |= {(f'{h:02d}:00', f'session_report_{h}h') for h in (0, 6, 12, 18)}
+    for item in sorted(expected - fired):
+        problems.append(f"tâche non exécutée: {item[1]} à {item[0]}")
+    if len(results['jobs']) != len(expected):
+        problems.append(f"{len(results['jobs'])} exécutions de tâches (attendu: {len(expected)})")
+
+    hourly = results['hourly']
+    startups = {h for h, counts in hourly.items() if counts.get('startup')}
+    if startups != {1, 9, 15, 21}:
+        problems.append(f"messages de démarrage aux heures {sorted(startups)}")
+    reports = {h for h, counts in hourly.items() if counts.get('report')}
+    if reports != {0, 6, 12, 18}:
+        problems.append(f"bilans aux heures {sorted(reports)}")
+    for h, counts in hourly.items():
+        in_session = any(start <= h < end for start, end in PREDICTION_SESSIONS)
+        if counts.get('prediction') and not in_session:
+            problems.append(f"{counts['prediction']} prédiction(s) hors session à {h}h")
+    if not results['totals'].get('prediction'):
+        problems.append("aucune prédiction sur la journée")
+    return problems
+
+
+def print_report(results: dict) -> None:
+    print(f"\n🕐 Journée du {results['date']}: {results['games']} jeux, {results['updates']} updates "
+          f"en {results['elapsed_s']:.2f}s (x{results['speedup']:.0f})")
+    print("   tâches: " + ', '.join(f"{j['time']} {j['job']}" for j in results['jobs']))
+    for h, counts in results['hourly'].items():
+        print(f"   {h:02d}h " + ' '.join(f"{k}={v}" for k, v in sorted(counts.items())))
+    print(f"   total: {results['totals']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation accélérée d'une journée (heure du Bénin)")
+    parser.add_argument('--date', default='2026-01-15', help="Journée simulée (AAAA-MM-JJ)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--check', action='store_true', help="Vérifie calendrier, sessions et bilans")
+    parser.add_argument('--output', help="Écrit les résultats JSON dans ce fichier")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    results = run(args.date, args.seed)
+    print_report(results)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.check:
+        problems = check(results)
+        if problems:
+            print("❌ Comportement inattendu:")
+            for line in problems:
+                print(f"   - {line}")
+            return 1
+        print("✅ Journée conforme")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# benchmarks/synthetic_source.py
+
+"""
+Générateur de trafic réaliste du canal SOURCE, sous forme d'updates Telegram.
+
+Formats produits (mêmes variantes que le vrai canal) :
+- en-têtes `#N123.` et `🔵123🔵`
+- brouillons ⏰ / ▶ (channel_post) puis édition finale (edited_channel_post)
+- résultats finalisés ✅ / 🔰, suffixes #T<total> ou 🔵#R
+- groupes de 2/3 et 3/3 cartes (et 3/2)
+"""
+import random
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+VALUES = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+SUITS = ['♠️', '❤️', '♦️', '♣️']
+
+SOURCE_CHANNEL_ID = -1002682552255
+PREDICTION_CHANNEL_ID = -1003329818758
+
+
+class SyntheticSource:
+    """Produit la suite d'updates d'un canal source pour des jeux consécutifs."""
+
+    def __init__(self, chat_id: int = SOURCE_CHANNEL_ID, first_game: int = 1, seed: Optional[int] = None,
+                 draft_ratio: float = 0.7, blue_header_ratio: float = 0.2, start_time: Optional[float] = None):
+        self.chat_id = chat_id
+        self.game = first_game
+        self.draft_ratio = draft_ratio
+        self.blue_header_ratio = blue_header_ratio
+        self.random = random.Random(seed)
+        self.update_id = 1
+        self.message_id = 1
+        self.date = int(start_time if start_time is not None else time.time())
+
+    # --- Construction des textes ---
+    def _card(self) -> str:
+        return f"{self.random.choice(VALUES)}{self.random.choice(SUITS)}"
+
+    def _cards(self, n: int) -> List[str]:
+        return [self._card() for _ in range(n)]
+
+    def _header(self, game: int) -> str:
+        if self.random.random() < self.blue_header_ratio:
+            return f"🔵{game}🔵"
+        return f"#N{game}."
+
+    def draft_text(self, game: int, player: List[str], banker: List[str]) -> str:
+        marker = self.random.choice(['⏰', '▶'])
+        return f"{self._header(game)} {marker}{len(player)}({''.join(player)}) - {len(banker)}({''.join(banker)})"
+
+    def final_text(self, game: int, player: List[str], banker: List[str]) -> str:
+        indicator = self.random.choice(['✅', '✅', '🔰'])
+        suffix = self.random.choice([f"#T{self.random.randint(2, 18)}", "🔵#R", ""])
+        return (f"{self._header(game)} {indicator}{len(player)}({''.join(player)}) - "
+                f"{len(banker)}({''.join(banker)}) {suffix}").strip()
+
+    # --- Construction des updates ---
+    def _update(self, kind: str, message_id: int, text: str) -> Dict[str, Any]:
+        update = {
+            'update_id': self.update_id,
+            kind: {
+                'message_id': message_id,
+                'chat': {'id': self.chat_id, 'type': 'channel', 'title': 'Source'},
+                'date': self.date,
+                'text': text,
+            }
+        }
+        if kind == 'edited_channel_post':
+            update[kind]['edit_date'] = self.date
+        self.update_id += 1
+        return update
+
+    def game_updates(self) -> List[Dict[str, Any]]:
+        """Updates d'un jeu : brouillon puis édition finale, ou résultat final direct."""
+        game = self.game
+        self.game += 1
+        self.date += self.random.randint(20, 40)
+        message_id = self.message_id
+        self.message_id += 1
+
+        # Formats finaux acceptés : 2/3, 3/3, 3/2
+        sizes = self.random.choice([(2, 3), (3, 3), (3, 2)])
+        player = self._cards(sizes[0])
+        banker = self._cards(sizes[1])
+
+        updates = []
+        if self.random.random() < self.draft_ratio:
+            updates.append(self._update('channel_post', message_id, self.draft_text(game, player[:2], banker[:2])))
+            updates.append(self._update('edited_channel_post', message_id, self.final_text(game, player, banker)))
+        else:
+            updates.append(self._update('channel_post', message_id, self.final_text(game, player, banker)))
+        return updates
+
+    def updates(self, games: int) -> Iterator[Dict[str, Any]]:
+        for _ in range(games):
+            yield from self.game_updates()
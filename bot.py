@@ -7,14 +7,19 @@ import os
 import logging
 import requests
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 # Importation des classes de logique métier
 from handlers import TelegramHandlers
 from card_predictor import CardPredictor 
+from update_dedup import UpdateDeduplicator
+from telegram_api import TelegramApi
+from profiler import PROFILER
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+
+# Types d'updates reçus (webhook et getUpdates)
+ALLOWED_UPDATES = ['message', 'edited_message', 'channel_post', 'edited_channel_post', 'callback_query', 'my_chat_member']
 
 class TelegramBot:
     """
@@ -22,13 +27,21 @@ class TelegramBot:
     et déléguer le traitement des mises à jour aux handlers.
     """
 
-    def __init__(self, token: str):
+    def __init__(self, token: str, dedup_window: int = 2000, api_base: Optional[str] = None, clock=None,
+                 name: Optional[str] = None, data_dir: str = '.'):
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{token}"
+        # Nom du bot hébergé (BOTS) ; None pour le bot principal
+        self.name = name
+        self.data_dir = data_dir
+        self.api = TelegramApi(token, api_base)
+        self.base_url = self.api.base_url
         self.deployment_file_path = "deployment.zip" 
         
+        # Fenêtre des derniers update_id traités (Telegram re-livre en cas de lenteur/erreur)
+        self.deduplicator = UpdateDeduplicator(capacity=dedup_window, filename=os.path.join(data_dir, 'processed_updates.json'))
+        
         # Initialize advanced handlers
-        self.handlers = TelegramHandlers(token)
+        self.handlers = TelegramHandlers(token, api_base=api_base, clock=clock, name=name, data_dir=data_dir)
         
         if not self.handlers.card_predictor:
             logger.error("🚨 Le moteur de prédiction n'a pas pu être initialisé.")
@@ -37,26 +50,62 @@ class TelegramBot:
     def handle_update(self, update: Dict[str, Any]) -> None:
         """Handle incoming Telegram update with advanced features for webhook mode"""
         try:
+            # Doublon (re-livraison Telegram) : ignoré avant tout parsing
+            update_id = update.get('update_id')
+            if update_id is not None and not self.deduplicator.claim(update_id):
+                logger.info("♻️ Update %s déjà traité, ignoré", update_id)
+                return
+
             # Log de haut niveau pour les différents types d'updates
             if 'message' in update or 'channel_post' in update:
-                logger.info(f"🔄 Bot traite message normal/post canal via webhook")
+                logger.info("🔄 Bot traite message normal/post canal via webhook")
             elif 'edited_message' in update or 'edited_channel_post' in update:
-                logger.info(f"🔄 Bot traite message édité/post édité via webhook")
+                logger.info("🔄 Bot traite message édité/post édité via webhook")
             elif 'my_chat_member' in update:
-                 logger.info(f"🔄 Bot traite événement d'adhésion au chat (my_chat_member)")
+                 logger.info("🔄 Bot traite événement d'adhésion au chat (my_chat_member)")
             elif 'callback_query' in update:
-                 logger.info(f"🔄 Bot traite clic de bouton (callback_query)")
+                 logger.info("🔄 Bot traite clic de bouton (callback_query)")
 
-            logger.debug(f"Received update: {json.dumps(update, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Received update: %s", json.dumps(update, indent=2))
 
             # Délégation du traitement complet aux handlers
-            self.handlers.handle_update(update)
+            version = self.handlers.state_version()
+            try:
+                PROFILER.profile_once(self.handlers.handle_update, update)
+            except Exception:
+                if update_id is not None:
+                    self.deduplicator.release(update_id)
+                raise
+            # Inscrit comme traité seulement maintenant ; écrit sur disque avec l'état s'il a été sauvegardé
+            if update_id is not None:
+                self.deduplicator.mark_processed(update_id, flush=self.handlers.state_version() != version)
             
-            logger.info(f"✅ Update traité avec succès via webhook")
+            logger.info("✅ Update traité avec succès via webhook")
 
         except Exception as e:
             logger.error(f"❌ Error handling update via webhook: {e}")
 
+    def handle_updates(self, updates: List[Dict[str, Any]]) -> None:
+        """Traite un lot d'updates (mode polling) : doublons filtrés, une seule sauvegarde d'état par lot."""
+        try:
+            fresh = [u for u in updates if u.get('update_id') is None or self.deduplicator.claim(u['update_id'])]
+            if not fresh:
+                return
+            logger.info("🔄 Bot traite un lot de %s updates via polling", len(fresh))
+            ids = [u['update_id'] for u in fresh if u.get('update_id') is not None]
+            try:
+                self.handlers.handle_updates(fresh)
+            except Exception:
+                for update_id in ids:
+                    self.deduplicator.release(update_id)
+                raise
+            # L'état du lot vient d'être sauvegardé en une fois : la fenêtre aussi
+            for i, update_id in enumerate(ids):
+                self.deduplicator.mark_processed(update_id, flush=i == len(ids) - 1)
+        except Exception as e:
+            logger.error(f"❌ Error handling update batch: {e}")
+
     # --- Méthodes API Directes (Pour setWebhook et autres) ---
 
     def send_message(self, chat_id: int, text: str, parse_mode: str = 'Markdown') -> bool:
@@ -67,8 +116,6 @@ class TelegramBot:
     def send_document(self, chat_id: int, file_path: str) -> bool:
         """Send document file to user (Méthode incluse pour respecter le schéma)"""
         try:
-            url = f"{self.base_url}/sendDocument"
-
             if not os.path.exists(file_path):
                 logger.error(f"File not found for sending: {file_path}")
                 return False
@@ -82,7 +129,7 @@ class TelegramBot:
                     'caption': '📦 Deployment Package for render.com'
                 }
 
-                response = requests.post(url, data=data, files=files, timeout=60)
+                response = self.api.post('sendDocument', data=data, files=files, timeout=60)
                 return response.json().get('ok', False)
         except Exception as e:
             logger.error(f"Error sending document: {e}")
@@ -91,14 +138,13 @@ class TelegramBot:
     def set_webhook(self, webhook_url: str) -> bool:
         """Set webhook URL for the bot"""
         try:
-            url = f"{self.base_url}/setWebhook"
             # MISE À JOUR CRITIQUE: Inclure 'callback_query' et 'my_chat_member'
             data = {
                 'url': webhook_url,
-                'allowed_updates': ['message', 'edited_message', 'channel_post', 'edited_channel_post', 'callback_query', 'my_chat_member']
+                'allowed_updates': ALLOWED_UPDATES
             }
 
-            response = requests.post(url, json=data, timeout=10)
+            response = self.api.post('setWebhook', json=data, timeout=10)
             result = response.json()
             if result.get('ok'):
                 logger.info(f"Webhook set successfully: {webhook_url}")
@@ -114,11 +160,24 @@ class TelegramBot:
             logger.error(f"Error setting webhook: {e}")
             return False
 
+    def delete_webhook(self) -> bool:
+        """Supprime le webhook (obligatoire avant d'utiliser getUpdates)"""
+        try:
+            response = self.api.post('deleteWebhook', json={'drop_pending_updates': False}, timeout=10)
+            result = response.json()
+            if result.get('ok'):
+                logger.info("Webhook supprimé (mode polling)")
+                return True
+            logger.error(f"Failed to delete webhook: {result}")
+            return False
+        except Exception as e:
+            logger.error(f"Error deleting webhook: {e}")
+            return False
+
     def get_bot_info(self) -> Dict[str, Any]:
         """Get bot information"""
         try:
-            url = f"{self.base_url}/getMe"
-            response = requests.get(url, timeout=30)
+            response = self.api.get('getMe', timeout=30)
             result = response.json()
             return result.get('result', {}) if result.get('ok') else {}
         except Exception as e:
@@ -2,17 +2,20 @@
 
 import re
 import logging
-import time
 import os
 import json
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Tuple, Any
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 import pytz
 
+from clock import SYSTEM_CLOCK
+from metrics import REGISTRY, STAGE_SECONDS
+from read_model import LOST, PENDING, WON, ReadModel
+
 logger = logging.getLogger(__name__)
-# Mis à jour à DEBUG pour vous aider à tracer la collecte.
-logger.setLevel(logging.DEBUG) 
+# Niveau configurable via LOG_LEVELS (ex: LOG_LEVELS=card_predictor=DEBUG, voir logging_setup.py)
 
 # ================== CONFIG ==================
 BENIN_TZ = pytz.timezone("Africa/Porto-Novo")
@@ -41,16 +44,50 @@ PREDICTION_SESSIONS = [
     (21, 24)
 ]
 
+# Métriques du moteur (exposées sur /metrics)
+PERSIST_BYTES = REGISTRY.counter('bot_persist_bytes_total', "Octets écrits par la sauvegarde de l'état", ('file', 'shard'))
+STATE_SIZE = REGISTRY.gauge('bot_state_size', "Nombre d'éléments des structures d'état du moteur", ('field', 'shard'))
+PREDICTIONS_TOTAL = REGISTRY.counter('bot_predictions_total', "Prédictions émises (made) et résolues (won/lost) par mode", ('mode', 'status', 'shard'))
+STATE_FIELDS = ['inter_data', 'predictions', 'quarantined_rules', 'pending_edits', 'sequential_history', 'smart_rules']
+
+# Fichiers dont la valeur par défaut (fichier absent ou vide) est un dictionnaire
+DICT_DATA_FILES = ['channels_config.json', 'predictions.json', 'sequential_history.json', 'smart_rules.json', 'pending_edits.json',
+                   'quarantined_rules.json', 'last_report_sent.json']
+
+# Prédictions récentes suivies pour /qua
+RECENT_PREDICTIONS = 20
+
 class CardPredictor:
     """Gère la logique de prédiction d'ENSEIGNE (Couleur) et la vérification."""
 
-    def __init__(self, telegram_message_sender=None):
+    def __init__(self, telegram_message_sender=None, clock=None, name: str = 'default', data_dir: str = '.',
+                 source_id: Optional[int] = None, prediction_id: Optional[int] = None):
+        
+        # Source de temps (horloge système ou simulée, voir clock.py)
+        self.clock = clock or SYSTEM_CLOCK
+        
+        # Table suivie (shard, voir shards.py) et répertoire de ses fichiers d'état
+        self.name = name
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
         
         # <<<<<<<<<<<<<<<< ZONE CRITIQUE À MODIFIER PAR L'UTILISATEUR >>>>>>>>>>>>>>>>
         # ⚠️ IDs DE CANAUX CONFIGURÉS
         self.HARDCODED_SOURCE_ID = -1002682552255  # <--- ID du canal SOURCE/DÉCLENCHEUR
         self.HARDCODED_PREDICTION_ID = -1003329818758 # <--- ID du canal PRÉDICTION/RÉSULTAT
         # <<<<<<<<<<<<<<<< FIN ZONE CRITIQUE >>>>>>>>>>>>>>>>
+        # Shards supplémentaires : canaux déclarés dans SHARDS
+        if source_id is not None:
+            self.HARDCODED_SOURCE_ID = source_id
+        if prediction_id is not None:
+            self.HARDCODED_PREDICTION_ID = prediction_id
+        
+        # Sauvegarde différée (traitement par lots, voir deferred_save)
+        self._save_deferred = 0
+        self._save_pending = False
+        
+        # Version de l'état, incrémentée à chaque modification sauvegardée : clé des vues mises en cache (/collect, /qua)
+        self.state_version = 0
         
         # Stockage temporaire du rule_index et trigger pour passer à make_prediction
         self._last_rule_index = 0
@@ -102,17 +139,29 @@ class CardPredictor:
         
         self.prediction_cooldown = 30 
         
+        # Agrégats des vues admin, tenus à jour au fil de l'eau (voir trigger_counts / recent_predictions)
+        self._trigger_counts: Dict[str, Counter] = {}
+        self._trigger_counts_source: Optional[List[Dict]] = None
+        self._trigger_counts_len = 0
+        self._recent_predictions: deque = deque(maxlen=RECENT_PREDICTIONS)
+        self._recent_predictions_source: Optional[Dict] = None
+        # Compteurs des prédictions et rendus des écrans de statut (read_model.py)
+        self.read_model = ReadModel(self, lambda ts: self.session_key(datetime.fromtimestamp(ts, BENIN_TZ)))
+        
         if self.inter_data and not self.is_inter_mode_active and not self.smart_rules:
              self.analyze_and_set_smart_rules(initial_load=True)
 
     # --- Persistance ---
+    def data_path(self, filename: str) -> str:
+        return os.path.join(self.data_dir, filename)
+
     def _load_data(self, filename: str, is_set: bool = False, is_scalar: bool = False) -> Any:
         try:
-            is_dict = filename in ['channels_config.json', 'predictions.json', 'sequential_history.json', 'smart_rules.json', 'pending_edits.json']
+            is_dict = filename in DICT_DATA_FILES
             
-            if not os.path.exists(filename):
+            if not os.path.exists(self.data_path(filename)):
                 return set() if is_set else (None if is_scalar else ({} if is_dict else []))
-            with open(filename, 'r') as f:
+            with open(self.data_path(filename), 'r') as f:
                 content = f.read().strip()
                 if not content: return set() if is_set else (None if is_scalar else ({} if is_dict else []))
                 data = json.loads(content)
@@ -122,7 +171,7 @@ class CardPredictor:
                 return data
         except Exception as e:
             logger.error(f"⚠️ Erreur chargement {filename}: {e}")
-            is_dict = filename in ['channels_config.json', 'predictions.json', 'sequential_history.json', 'smart_rules.json', 'pending_edits.json']
+            is_dict = filename in DICT_DATA_FILES
             return set() if is_set else (None if is_scalar else ({} if is_dict else []))
 
     def _save_data(self, data: Any, filename: str):
@@ -134,32 +183,56 @@ class CardPredictor:
                 if 'prediction_channel_id' in data and data['prediction_channel_id'] is not None:
                     data['prediction_channel_id'] = int(data['prediction_channel_id'])
             
-            with open(filename, 'w') as f: json.dump(data, f, indent=4)
+            with open(self.data_path(filename), 'w') as f:
+                json.dump(data, f, indent=4)
+                PERSIST_BYTES.inc(f.tell(), file=filename, shard=self.name)
         except Exception as e: logger.error(f"❌ Erreur sauvegarde {filename}: {e}")
 
     def _save_all_data(self):
-        self._save_data(self.predictions, 'predictions.json')
-        self._save_data(self.processed_messages, 'processed.json')
-        self._save_data(self.last_prediction_time, 'last_prediction_time.json')
-        self._save_data(self.last_predicted_game_number, 'last_predicted_game_number.json')
-        self._save_data(self.consecutive_fails, 'consecutive_fails.json')
-        self._save_data(self.inter_data, 'inter_data.json')
-        self._save_data(self.sequential_history, 'sequential_history.json')
-        self._save_data(self.is_inter_mode_active, 'inter_mode_status.json')
-        self._save_data(self.smart_rules, 'smart_rules.json')
-        self._save_data(self.active_admin_chat_id, 'active_admin_chat_id.json')
-        self._save_data(self.last_analysis_time, 'last_analysis_time.json')
-        self._save_data(self.pending_edits, 'pending_edits.json')
-        self._save_data(self.collected_games, 'collected_games.json')
-        self._save_data(self.single_trigger_until, 'single_trigger_until.json')
-        self._save_data(self.quarantined_rules, 'quarantined_rules.json')
-        self._save_data(self.wait_until_next_update, 'wait_until_next_update.json')
-        self._save_data(self.last_inter_update_time, 'last_inter_update.json')
-        self._save_data(self.last_report_sent, 'last_report_sent.json')
+        self.state_version += 1
+        if self._save_deferred:
+            self._save_pending = True
+            return
+        with STAGE_SECONDS.time(stage='persist'):
+            self._save_data(self.predictions, 'predictions.json')
+            self._save_data(self.processed_messages, 'processed.json')
+            self._save_data(self.last_prediction_time, 'last_prediction_time.json')
+            self._save_data(self.last_predicted_game_number, 'last_predicted_game_number.json')
+            self._save_data(self.consecutive_fails, 'consecutive_fails.json')
+            self._save_data(self.inter_data, 'inter_data.json')
+            self._save_data(self.sequential_history, 'sequential_history.json')
+            self._save_data(self.is_inter_mode_active, 'inter_mode_status.json')
+            self._save_data(self.smart_rules, 'smart_rules.json')
+            self._save_data(self.active_admin_chat_id, 'active_admin_chat_id.json')
+            self._save_data(self.last_analysis_time, 'last_analysis_time.json')
+            self._save_data(self.pending_edits, 'pending_edits.json')
+            self._save_data(self.collected_games, 'collected_games.json')
+            self._save_data(self.single_trigger_until, 'single_trigger_until.json')
+            self._save_data(self.quarantined_rules, 'quarantined_rules.json')
+            self._save_data(self.wait_until_next_update, 'wait_until_next_update.json')
+            self._save_data(self.last_inter_update_time, 'last_inter_update.json')
+            self._save_data(self.last_report_sent, 'last_report_sent.json')
+
+    def expose_state_sizes(self):
+        """Publie la taille des structures d'état de cette instance sur /metrics (lue à chaque scrape)."""
+        for field in STATE_FIELDS:
+            STATE_SIZE.set_function(lambda field=field: len(getattr(self, field)), field=field, shard=self.name)
+
+    @contextmanager
+    def deferred_save(self):
+        """Regroupe les sauvegardes complètes du bloc en une seule écriture à la sortie."""
+        self._save_deferred += 1
+        try:
+            yield
+        finally:
+            self._save_deferred -= 1
+            if not self._save_deferred and self._save_pending:
+                self._save_pending = False
+                self._save_all_data()
 
     # ======== TEMPS & SESSIONS ========
     def now(self):
-        return datetime.now(BENIN_TZ)
+        return self.clock.now(BENIN_TZ)
     
     def is_in_session(self):
         h = self.now().hour
@@ -172,6 +245,13 @@ class CardPredictor:
                 return f"{start:02d}h00 – {end:02d}h00"
         return "Hors session"
     
+    def session_key(self, dt: datetime) -> Optional[str]:
+        """Session de prédiction contenant `dt` ('AAAA-MM-JJ HHh', heure de début), None hors session."""
+        for start, end in PREDICTION_SESSIONS:
+            if start <= dt.hour < end:
+                return f"{dt.strftime('%Y-%m-%d')} {start:02d}h"
+        return None
+    
     # ======== RAPPORTS ========
     def check_and_send_reports(self):
         """Envoie les rapports de fin de session (appelé régulièrement)."""
@@ -199,54 +279,71 @@ class CardPredictor:
         
         start, end = report_hours[now.hour]
         
-        # Compter les prédictions complétées (won ou lost)
-        session_predictions = {}
-        for game_num, pred in self.predictions.items():
-            status = pred.get('status')
-            if status in ['won', 'lost']:
-                session_predictions[game_num] = pred
-        
-        total = len(session_predictions)
-        wins = sum(1 for p in session_predictions.values() if p.get("status") == 'won')
-        fails = sum(1 for p in session_predictions.values() if p.get("status") == 'lost')
+        # Prédictions complétées (won ou lost), au total et pour la session qui se termine
+        stats = self.read_model.stats()
+        wins, fails = stats[WON], stats[LOST]
+        total = wins + fails
         win_rate = (wins / total * 100) if total > 0 else 0
         fail_rate = (fails / total * 100) if total > 0 else 0
+        ended = self.session_key(now.replace(minute=0, second=0, microsecond=0) - timedelta(minutes=1))
+        session = self.read_model.stats('session', ended)
+        snapshot = self.read_model.snapshot()
         
         # Construire le message
         msg = (f"🎬 **BILAN DE SESSION**\n\n"
                f"⏰ Heure de Bénin : {now.strftime('%H:%M:%S - %d/%m/%Y')}\n"
                f"📅 Session : {start} – {end}\n"
-               f"🧠 Mode : {'✅ INTER ACTIF' if self.is_inter_mode_active else '❌ STATIQUE'}\n"
-               f"🔄 Règles : {self.get_inter_version()}\n\n"
+               f"{self.read_model.render('report_header', self._render_report_header)}"
                f"📊 **RÉSULTATS**\n"
                f"📈 Total : {total}\n"
                f"✅ Succès : {wins} ({win_rate:.1f}%)\n"
-               f"❌ Échecs : {fails} ({fail_rate:.1f}%)\n\n"
+               f"❌ Échecs : {fails} ({fail_rate:.1f}%)\n"
+               f"🎯 Cette session : {session[WON]} ✅ / {session[LOST]} ❌\n"
+               f"{self.read_model.render('mode_breakdown', lambda: self._render_mode_breakdown(snapshot), snapshot.version)}\n"
                f"💖 Merci à tous sur le code promo !\n\n"
                f"👨‍💻 Dev : Sossou Kouamé\n"
                f"🎟️ Code : Koua229")
         
+        # Rapport marqué envoyé avant l'appel (verrou relâché pendant l'envoi) : une tâche planifiée
+        # ou un autre update ne peut pas l'envoyer une seconde fois
+        self.last_report_sent[key] = True
+        self._save_all_data()
         try:
             self.telegram_message_sender(self.prediction_channel_id, msg)
-            self.last_report_sent[key] = True
-            self._save_all_data()
             logger.info(f"✅ Rapport {start}-{end} envoyé: {total} prédictions, {wins} succès")
         except Exception as e:
             logger.error(f"❌ Erreur envoi rapport: {e}")
     
+    def _render_report_header(self) -> str:
+        return (f"🧠 Mode : {'✅ INTER ACTIF' if self.is_inter_mode_active else '❌ STATIQUE'}\n"
+                f"🔄 Règles : {self.get_inter_version()}\n\n")
+    
+    def _render_mode_breakdown(self, snapshot) -> str:
+        """Résultats par mode, et par rang de règle (TOP1-3) pour INTER."""
+        by_mode = snapshot.breakdown['mode']
+        inter, static = by_mode.get('inter', {}), by_mode.get('static', {})
+        line = (f"🧠 INTER : {inter.get(WON, 0)} ✅ / {inter.get(LOST, 0)} ❌ · "
+                f"📋 Statique : {static.get(WON, 0)} ✅ / {static.get(LOST, 0)} ❌\n")
+        by_rule = snapshot.breakdown['rule_index']
+        tops = [f"TOP{idx} {counts[WON]}/{counts[WON] + counts[LOST]}" for idx, counts in sorted(by_rule.items())
+                if idx and counts[WON] + counts[LOST]]
+        if tops:
+            line += f"🏅 Règles INTER : {' · '.join(tops)}\n"
+        return line
+    
     def get_inter_version(self):
         if not self.last_inter_update_time:
             return "Base neuve"
         return datetime.fromtimestamp(self.last_inter_update_time, BENIN_TZ).strftime("%Y-%m-%d | %Hh%M")
     
-    def _get_last_update_display(self):
+    def _get_last_update_display(self, last_inter_update_time):
         """Retourne la date et heure de la dernière mise à jour INTER ou un message par défaut."""
-        if not self.last_inter_update_time:
+        if not last_inter_update_time:
             return "Pas encore de mise à jour"
-        return datetime.fromtimestamp(self.last_inter_update_time, BENIN_TZ).strftime("%d/%m/%Y à %H:%M:%S")
+        return datetime.fromtimestamp(last_inter_update_time, BENIN_TZ).strftime("%d/%m/%Y à %H:%M:%S")
     
-    def get_session_report_preview(self):
-        """Retourne un aperçu du rapport de fin de session avec le temps restant."""
+    def get_session_report_preview(self, snapshot):
+        """Retourne un aperçu du rapport de fin de session avec le temps restant, à partir d'une vue immuable de l'état."""
         now = self.now()
         report_hours = {6: ("01h00", "06h00"), 12: ("09h00", "12h00"), 18: ("15h00", "18h00"), 0: ("21h00", "00h00")}
         
@@ -264,31 +361,33 @@ class CardPredictor:
         hours = minutes_until // 60
         mins = minutes_until % 60
         
-        # Stats de prédictions
-        session_predictions = {k: v for k, v in self.predictions.items() if v.get('status') in ['won', 'lost', 'pending']}
-        total = len(session_predictions)
-        wins = sum(1 for p in session_predictions.values() if str(p.get("status", "")).startswith("✅") or p.get("status") == 'won')
-        fails = sum(1 for p in session_predictions.values() if p.get("status") in ["❌", "lost"])
-        win_rate = (wins / total * 100) if total else 0
-        fail_rate = (fails / total * 100) if total else 0
-        
         start, end = report_hours[next_report_hour]
         
         msg = (f"📋 **APERÇU DU BILAN**\n\n"
                f"⏰ Heure de Bénin : {now.strftime('%H:%M:%S - %d/%m/%Y')}\n"
                f"🎯 Prochain bilan : {start} – {end}\n"
                f"⏳ Temps restant : {hours}h{mins:02d}\n\n"
-               f"🧠 Mode Intelligent : {'✅ ACTIF' if self.is_inter_mode_active else '❌ INACTIF'}\n"
-               f"🔄 Dernière mise à jour IA : {self._get_last_update_display()}\n\n"
-               f"📊 **STATISTIQUES ACTUELLES**\n"
-               f"📈 Prédictions : {total}\n"
-               f"✅ Réussites : {wins} ({win_rate:.1f}%)\n"
-               f"❌ Échecs : {fails} ({fail_rate:.1f}%)\n\n"
+               f"{self.read_model.render('report_preview', lambda: self._render_report_preview(snapshot), snapshot.version)}"
                f"👨‍💻 **Développeur** : Sossou Kouamé\n"
                f"🎟️ **Code Promo** : Koua229")
         
         return msg
     
+    def _render_report_preview(self, snapshot) -> str:
+        """Partie de l'aperçu du bilan qui ne dépend que de l'état (mode, statistiques)."""
+        stats = snapshot.stats
+        total, wins, fails = stats['total'], stats[WON], stats[LOST]
+        win_rate = (wins / total * 100) if total else 0
+        fail_rate = (fails / total * 100) if total else 0
+        return (f"🧠 Mode Intelligent : {'✅ ACTIF' if snapshot.inter_mode_active else '❌ INACTIF'}\n"
+                f"🔄 Dernière mise à jour IA : {self._get_last_update_display(snapshot.last_inter_update_time)}\n\n"
+                f"📊 **STATISTIQUES ACTUELLES**\n"
+                f"📈 Prédictions : {total}\n"
+                f"✅ Réussites : {wins} ({win_rate:.1f}%)\n"
+                f"❌ Échecs : {fails} ({fail_rate:.1f}%)\n"
+                f"⏳ En attente : {stats[PENDING]}\n"
+                f"{self._render_mode_breakdown(snapshot)}\n")
+    
     def set_channel_id(self, channel_id: int, channel_type: str):
         if not isinstance(self.config_data, dict): self.config_data = {}
         if channel_type == 'source':
@@ -297,6 +396,7 @@ class CardPredictor:
         elif channel_type == 'prediction':
             self.prediction_channel_id = channel_id
             self.config_data['prediction_channel_id'] = channel_id
+        self.state_version += 1
         self._save_data(self.config_data, 'channels_config.json')
         return True
 
@@ -358,7 +458,7 @@ class CardPredictor:
         if not match: match = re.search(r'🔵(\d+)🔵', message)
         num = int(match.group(1)) if match else None
         if num:
-            logger.debug(f"🎮 Numéro du jeu extrait: {num}")
+            logger.debug("🎮 Numéro du jeu extrait: %s", num)
         return num
 
     def extract_card_details(self, content: str) -> List[Tuple[str, str]]:
@@ -408,14 +508,16 @@ class CardPredictor:
         if game_number in self.collected_games:
             existing_data = self.sequential_history.get(game_number)
             if existing_data and existing_data.get('carte') == full_card:
-                logger.debug(f"🧠 Jeu {game_number} déjà collecté, ignoré.")
+                logger.debug("🧠 Jeu %s déjà collecté, ignoré.", game_number)
                 return
             else:
                 # Mise à jour de la carte (cas rare mais possible)
-                logger.info(f"🧠 Jeu {game_number} mis à jour: {existing_data.get('carte') if existing_data else 'N/A'} -> {full_card}")
+                logger.info("🧠 Jeu %s mis à jour: %s -> %s", game_number, existing_data.get('carte') if existing_data else 'N/A', full_card)
                 self.inter_data = [e for e in self.inter_data if e.get('numero_resultat') != game_number]
+                # Cas rare : les compteurs seront recalculés à la prochaine lecture
+                self._trigger_counts_source = None
 
-        self.sequential_history[game_number] = {'carte': full_card, 'date': datetime.now().isoformat()}
+        self.sequential_history[game_number] = {'carte': full_card, 'date': self.clock.now().isoformat()}
         self.collected_games.add(game_number)
         
         n_minus_2 = game_number - 2
@@ -428,9 +530,12 @@ class CardPredictor:
                 'declencheur': trigger_card, 
                 'numero_declencheur': n_minus_2,
                 'result_suit': result_suit_normalized, 
-                'date': datetime.now().isoformat()
+                'date': self.clock.now().isoformat()
             })
-            logger.info(f"🧠 Jeu {game_number} collecté pour INTER: {trigger_card} -> {result_suit_normalized}")
+            logger.info("🧠 Jeu %s collecté pour INTER: %s -> %s", game_number, trigger_card, result_suit_normalized)
+            if self._trigger_counts_source is self.inter_data and self._trigger_counts_len == len(self.inter_data) - 1:
+                self._count_trigger(self.inter_data[-1])
+                self._trigger_counts_len += 1
 
         limit = game_number - 50
         self.sequential_history = {k:v for k,v in self.sequential_history.items() if k >= limit}
@@ -438,23 +543,63 @@ class CardPredictor:
         
         self._save_all_data()
 
-    
-    def analyze_and_set_smart_rules(self, chat_id: Optional[int] = None, initial_load: bool = False, force_activate: bool = False):
+    # --- Agrégats des vues admin (/collect, /qua) ---
+    def _count_trigger(self, entry: Dict):
+        result_suit = entry.get('result_suit', '?')
+        trigger = entry.get('declencheur', '?').replace("♥️", "❤️")
+        self._trigger_counts.setdefault(result_suit, Counter())[trigger] += 1
+
+    def trigger_counts(self) -> Dict[str, Counter]:
         """
-        Analyse les données pour trouver les Top 3 déclencheurs par ENSEIGNE DE RÉSULTAT.
-        Crée des règles même avec peu de données (minimum 1 occurrence).
+        Occurrences de chaque déclencheur par enseigne de résultat. Tenu à jour par
+        collect_inter_data ; recalculé seulement si inter_data a été remplacé ailleurs (reset).
+        """
+        if self._trigger_counts_source is not self.inter_data or self._trigger_counts_len != len(self.inter_data):
+            self._trigger_counts = {}
+            for entry in self.inter_data:
+                self._count_trigger(entry)
+            self._trigger_counts_source = self.inter_data
+            self._trigger_counts_len = len(self.inter_data)
+        return self._trigger_counts
+
+    def recent_predictions(self, limit: int = 5) -> List[Tuple[int, Dict]]:
+        """Les `limit` dernières prédictions (les plus récentes d'abord), suivies par make_prediction."""
+        if self._recent_predictions_source is not self.predictions:
+            # Chargement ou remplacement de predictions (reset) : un seul tri, puis suivi incrémental
+            ordered = sorted(
+                [(k, v) for k, v in self.predictions.items() if v.get('timestamp')],
+                key=lambda x: x[1].get('timestamp', 0),
+                reverse=True
+            )[:RECENT_PREDICTIONS]
+            self._recent_predictions.clear()
+            self._recent_predictions.extend(k for k, _ in reversed(ordered))
+            self._recent_predictions_source = self.predictions
+        recent = []
+        for game_num in reversed(self._recent_predictions):
+            pred = self.predictions.get(game_num)
+            if pred and pred.get('timestamp'):
+                recent.append((game_num, pred))
+                if len(recent) == limit:
+                    break
+        return recent
+
+
+    def compute_smart_rules(self, inter_data: List[Dict]) -> List[Dict]:
+        """
+        Top 3 déclencheurs par ENSEIGNE DE RÉSULTAT, même avec peu de données (minimum 1 occurrence).
+        Calcul pur : peut tourner hors du verrou de la logique métier, sur une copie des données collectées.
         """
         # Grouper par enseigne de RÉSULTAT (♠️, ♥️, ♦️, ♣️)
         result_suit_groups = defaultdict(lambda: defaultdict(int))
         
-        for entry in self.inter_data:
+        for entry in inter_data:
             trigger_card = entry['declencheur']  # Ex: 6♦️
             result_suit = entry['result_suit']   # Ex: ♣️
             
             # Compter combien de fois ce déclencheur mène à cette enseigne de résultat
             result_suit_groups[result_suit][trigger_card] += 1
         
-        self.smart_rules = []
+        smart_rules = []
         
         # Pour chaque enseigne de résultat (♠️, ♥️, ♦️, ♣️)
         for result_suit in ['♠️', '♥️', '♦️', '♣️']:
@@ -473,12 +618,21 @@ class CardPredictor:
             )[:3]
             
             for trigger_card, count in top_triggers:
-                self.smart_rules.append({
+                smart_rules.append({
                     'trigger': trigger_card,
                     'predict': result_normalized,
                     'count': count,
                     'result_suit': result_normalized  # Pour affichage
                 })
+        return smart_rules
+
+    def analyze_and_set_smart_rules(self, chat_id: Optional[int] = None, initial_load: bool = False, force_activate: bool = False,
+                                    smart_rules: Optional[List[Dict]] = None):
+        """
+        Analyse les données pour trouver les Top 3 déclencheurs par ENSEIGNE DE RÉSULTAT et applique les règles.
+        `smart_rules` : règles déjà calculées hors du verrou (compute_smart_rules), sinon calculées ici.
+        """
+        self.smart_rules = smart_rules if smart_rules is not None else self.compute_smart_rules(self.inter_data)
         
         # Activer le mode INTER si on a au moins 1 règle
         if force_activate:
@@ -490,19 +644,11 @@ class CardPredictor:
         elif not initial_load:
             self.is_inter_mode_active = False
             
-        self.last_analysis_time = time.time()
+        self.last_analysis_time = self.clock.time()
         self._save_all_data()
 
         logger.info(f"🧠 Analyse terminée. Règles trouvées: {len(self.smart_rules)}. Mode actif: {self.is_inter_mode_active}")
         
-        # Notification si demandée
-        if chat_id is not None and self.telegram_message_sender:
-            if self.smart_rules:
-                msg = f"✅ **Analyse terminée !**\n\n{len(self.smart_rules)} règles créées à partir de {len(self.inter_data)} jeux collectés.\n\n🧠 **Mode INTER activé automatiquement**"
-            else:
-                msg = f"⚠️ **Pas assez de données**\n\n{len(self.inter_data)} jeux collectés. Continuez à jouer pour créer des règles."
-            self.telegram_message_sender(chat_id, msg)
-        
         # SORTIE DE QUARANTAINE (après analyse)
         for key in list(self.quarantined_rules.keys()):
             try:
@@ -513,13 +659,22 @@ class CardPredictor:
                 )
                 if not rule or rule.get("count", 0) > self.quarantined_rules[key]:
                     del self.quarantined_rules[key]
+                    self.state_version += 1
                     logger.info(f"🔓 Quarantaine levée : {key}")
             except Exception as e:
                 logger.error(f"Erreur traitement quarantaine {key}: {e}")
 
+        # Notification si demandée, une fois l'état à jour (verrou relâché pendant l'envoi)
+        if chat_id is not None and self.telegram_message_sender:
+            if self.smart_rules:
+                msg = f"✅ **Analyse terminée !**\n\n{len(self.smart_rules)} règles créées à partir de {len(self.inter_data)} jeux collectés.\n\n🧠 **Mode INTER activé automatiquement**"
+            else:
+                msg = f"⚠️ **Pas assez de données**\n\n{len(self.inter_data)} jeux collectés. Continuez à jouer pour créer des règles."
+            self.telegram_message_sender(chat_id, msg)
+
     def check_and_update_rules(self):
         """Vérification périodique (30 minutes)."""
-        if time.time() - self.last_analysis_time > 1800:
+        if self.clock.time() - self.last_analysis_time > 1800:
             logger.info("🧠 Mise à jour INTER périodique (30 min).")
             # Force l'activation si on a des données
             if len(self.inter_data) >= 3:
@@ -532,24 +687,25 @@ class CardPredictor:
         pass
 
     def get_bot_status(self):
-        total = len(self.predictions)
-        wins = sum(1 for p in self.predictions.values() if str(p.get("status", "")).startswith("✅"))
-        fails = sum(1 for p in self.predictions.values() if p.get("status") == "❌")
+        stats = self.read_model.stats()
         
         return (f"📊 **STATUT DU BOT**\n\n"
                 f"🧠 Mode intelligent : {'ACTIF' if self.is_inter_mode_active else 'INACTIF'}\n"
                 f"🎯 Session : {self.current_session_label()}\n"
-                f"📈 Prédictions : {total}\n"
-                f"✅ Réussites : {wins}\n"
-                f"❌ Échecs : {fails}\n\n"
+                f"📈 Prédictions : {stats['total']}\n"
+                f"✅ Réussites : {stats[WON]}\n"
+                f"❌ Échecs : {stats[LOST]}\n\n"
                 f"🔖 Version IA : {self.get_inter_version()}")
     
-    def get_inter_status(self) -> Tuple[str, Dict]:
-        """Retourne le statut du mode INTER avec message et clavier."""
-        data_count = len(self.inter_data)
+    def get_inter_status(self, snapshot) -> Tuple[str, Dict]:
+        """Retourne le statut du mode INTER avec message et clavier, à partir d'une vue immuable de l'état."""
+        return self.read_model.render('inter_status', lambda: self._render_inter_status(snapshot), snapshot.version)
+    
+    def _render_inter_status(self, snapshot) -> Tuple[str, Dict]:
+        data_count = snapshot.inter_data_count
         
-        if not self.smart_rules:
-            message = f"🧠 **MODE INTER - {'✅ ACTIF' if self.is_inter_mode_active else '❌ INACTIF'}**\n\n"
+        if not snapshot.smart_rules:
+            message = f"🧠 **MODE INTER - {'✅ ACTIF' if snapshot.inter_mode_active else '❌ INACTIF'}**\n\n"
             message += f"📊 **{data_count} jeux collectés**\n"
             message += "⚠️ Pas encore assez de règles créées.\n\n"
             message += "**Cliquez sur 'Analyser' pour générer les règles !**"
@@ -558,17 +714,17 @@ class CardPredictor:
                 [{'text': '🔄 Analyser et Activer', 'callback_data': 'inter_apply'}]
             ]
             
-            if self.is_inter_mode_active:
+            if snapshot.inter_mode_active:
                 keyboard_buttons.append([{'text': '❌ Désactiver', 'callback_data': 'inter_default'}])
             
             keyboard = {'inline_keyboard': keyboard_buttons}
         else:
             rules_by_result = defaultdict(list)
-            for rule in self.smart_rules:
+            for rule in snapshot.smart_rules:
                 rules_by_result[rule['result_suit']].append(rule)
             
-            message = f"🧠 **MODE INTER - {'✅ ACTIF' if self.is_inter_mode_active else '❌ INACTIF'}**\n\n"
-            message += f"📊 **{len(self.smart_rules)} règles** créées ({data_count} jeux analysés):\n\n"
+            message = f"🧠 **MODE INTER - {'✅ ACTIF' if snapshot.inter_mode_active else '❌ INACTIF'}**\n\n"
+            message += f"📊 **{len(snapshot.smart_rules)} règles** créées ({data_count} jeux analysés):\n\n"
             
             for suit in ['♠️', '❤️', '♦️', '♣️']:
                 if suit in rules_by_result:
@@ -577,7 +733,7 @@ class CardPredictor:
                         message += f"  • {rule['trigger']} ({rule['count']}x)\n"
                     message += "\n"
             
-            if self.is_inter_mode_active:
+            if snapshot.inter_mode_active:
                 keyboard = {
                     'inline_keyboard': [
                         [{'text': '🔄 Relancer Analyse', 'callback_data': 'inter_apply'}],
@@ -608,13 +764,13 @@ class CardPredictor:
                 # Enregistrer le TOP en quarantaine avec timestamp expiration
                 self.quarantined_rules[key] = {
                     'count': rule.get('count', 1),
-                    'timestamp': time.time(),
-                    'expires_at': time.time() + 3600  # Expiration après 1 heure
+                    'timestamp': self.clock.time(),
+                    'expires_at': self.clock.time() + 3600  # Expiration après 1 heure
                 }
                 logger.info(f"🔒 Quarantaine appliquée: {key} (expire dans 1h)")
                 break
         
-        self.wait_until_next_update = time.time() + 1800
+        self.wait_until_next_update = self.clock.time() + 1800
         self._save_all_data()
 
 
@@ -627,7 +783,7 @@ class CardPredictor:
                 self.pending_edits[message_id] = {
                     'game_number': game_number,
                     'original_text': text,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': self.clock.now().isoformat()
                 }
                 self._save_data(self.pending_edits, 'pending_edits.json')
             return True
@@ -638,14 +794,14 @@ class CardPredictor:
         self.check_and_update_rules()
 
         if not self.is_in_session():
-            logger.debug(f"⚠️ Hors session. Heure Benin: {self.now().hour}h")
+            logger.debug("⚠️ Hors session. Heure Benin: %sh", self.now().hour)
             return False, None, None, None
 
         if any(p.get('status') == 'pending' for p in self.predictions.values()):
             logger.debug("⚠️ Une prédiction est en attente. Nouvelle prédiction annulée.")
             return False, None, None, None
 
-        if time.time() < self.wait_until_next_update:
+        if self.clock.time() < self.wait_until_next_update:
             logger.debug("⏸️ Cooldown après échec/quarantaine actif")
             return False, None, None, None
 
@@ -655,7 +811,7 @@ class CardPredictor:
             return False, None, None, None
 
         if game_number in self.predictions and self.predictions[game_number].get('status') == 'pending':
-            logger.debug(f"⚠️ Jeu {game_number} déjà prédit, en attente.")
+            logger.debug("⚠️ Jeu %s déjà prédit, en attente.", game_number)
             return False, None, None, None
 
         # 🔍 Vérifier toutes les cartes du 1er groupe
@@ -664,7 +820,7 @@ class CardPredictor:
             logger.debug("❌ Aucune carte dans le 1er groupe")
             return False, None, None, None
 
-        logger.info(f"🎮 Jeu source: {game_number} → Cartes 1er groupe: {cards}")
+        logger.info("🎮 Jeu source: %s → Cartes 1er groupe: %s", game_number, cards)
 
         predicted_suit = None
         trigger_used = None
@@ -690,18 +846,18 @@ class CardPredictor:
                         # Vérifier quarantaine
                         if key in self.quarantined_rules:
                             qua_data = self.quarantined_rules[key]
-                            if isinstance(qua_data, dict) and time.time() < qua_data.get('expires_at', 0):
-                                logger.debug(f"🔒 Règle en quarantaine: {key}")
+                            if isinstance(qua_data, dict) and self.clock.time() < qua_data.get('expires_at', 0):
+                                logger.debug("🔒 Règle en quarantaine: %s", key)
                                 continue
                             elif not isinstance(qua_data, dict) and qua_data >= rule.get("count", 1):
-                                logger.debug(f"🔒 Règle en quarantaine: {key}")
+                                logger.debug("🔒 Règle en quarantaine: %s", key)
                                 continue
 
                         predicted_suit = rule['predict']
                         trigger_used = rule['trigger']
                         is_inter_prediction = True
                         rule_index = idx + 1  # 1, 2 ou 3
-                        logger.info(f"🔮 INTER (TOP{rule_index}): {trigger_used} → {predicted_suit}")
+                        logger.info("🔮 INTER (TOP%s): %s → %s", rule_index, trigger_used, predicted_suit)
                         break
                 
                 if predicted_suit:
@@ -716,7 +872,7 @@ class CardPredictor:
         elif not self.is_inter_mode_active:
             # Vérifier l'écart SEULEMENT pour le mode statique
             if self.last_predicted_game_number and (game_number - self.last_predicted_game_number < 3):
-                logger.debug(f"⏳ Écart insuffisant: {game_number - self.last_predicted_game_number} < 3")
+                logger.debug("⏳ Écart insuffisant: %s < 3", game_number - self.last_predicted_game_number)
                 return False, None, None, None
 
             info = self.get_first_card_info(message)
@@ -732,14 +888,14 @@ class CardPredictor:
                 trigger_used = first_card
                 is_inter_prediction = False
                 rule_index = 0
-                logger.info(f"🔮 STATIQUE: {trigger_used} → {predicted_suit}")
+                logger.info("🔮 STATIQUE: %s → %s", trigger_used, predicted_suit)
             else:
-                logger.debug(f"⚠️ MODE STATIQUE: Carte {first_card} non trouvée dans règles ou 1er groupe")
+                logger.debug("⚠️ MODE STATIQUE: Carte %s non trouvée dans règles ou 1er groupe", first_card)
                 return False, None, None, None
 
         # ✅ Si une prédiction est trouvée (INTER ou STATIQUE), vérifier cooldown et lancer
         if predicted_suit:
-            if self.last_prediction_time and time.time() < self.last_prediction_time + self.prediction_cooldown:
+            if self.last_prediction_time and self.clock.time() < self.last_prediction_time + self.prediction_cooldown:
                 logger.debug("⏸️ Cooldown prédiction actif")
                 return False, None, None, None
 
@@ -752,11 +908,11 @@ class CardPredictor:
     def prepare_prediction_text(self, game_number_source: int, predicted_costume: str) -> str:
         target_game = game_number_source + 2
         text = f"🔵{target_game}🔵:{predicted_costume} statut :⏳"
-        logger.info(f"📝 Prédiction formatée: Jeu {game_number_source} → {target_game}, Costume: {predicted_costume} (Déclencheur: {self._last_trigger_used})")
+        logger.info("📝 Prédiction formatée: Jeu %s → %s, Costume: %s (Déclencheur: %s)", game_number_source, target_game, predicted_costume, self._last_trigger_used)
         return text
 
 
-    def make_prediction(self, game_number_source: int, suit: str, message_id_bot: int, is_inter: bool = False, trigger_used: Optional[str] = None):
+    def make_prediction(self, game_number_source: int, suit: str, message_id_bot: Optional[int], is_inter: bool = False, trigger_used: Optional[str] = None):
         target = game_number_source + 2
         txt = self.prepare_prediction_text(game_number_source, suit)
         
@@ -773,14 +929,45 @@ class CardPredictor:
             'message_id': message_id_bot, 
             'is_inter': is_inter,
             'rule_index': self._last_rule_index,
-            'timestamp': time.time()
+            'timestamp': self.clock.time()
         }
         
-        self.last_prediction_time = time.time()
+        if self._recent_predictions_source is self.predictions:
+            if target in self._recent_predictions:
+                self._recent_predictions.remove(target)
+            self._recent_predictions.append(target)
+        self.read_model.note_prediction(target)
+        PREDICTIONS_TOTAL.inc(mode='inter' if is_inter else 'static', status='made', shard=self.name)
+        self.last_prediction_time = self.clock.time()
         self.last_predicted_game_number = game_number_source
         self.consecutive_fails = 0
         self._save_all_data()
 
+    def attach_message_id(self, game_number_source: int, message_id_bot: int) -> bool:
+        """Rattache le message publié à la prédiction enregistrée avant l'envoi ; False si elle a disparu entre-temps (/reset)."""
+        prediction = self.predictions.get(game_number_source + 2)
+        if not prediction or prediction.get('predicted_from') != game_number_source or prediction.get('message_id'):
+            logger.warning("⚠️ Prédiction du jeu %s publiée mais plus enregistrée (message %s)", game_number_source, message_id_bot)
+            return False
+        prediction['message_id'] = message_id_bot
+        self._save_all_data()
+        return True
+
+    def cancel_prediction(self, game_number_source: int) -> bool:
+        """Retire une prédiction enregistrée mais jamais publiée (envoi abandonné), pour ne pas bloquer les suivantes."""
+        target = game_number_source + 2
+        prediction = self.predictions.get(target)
+        if (not prediction or prediction.get('predicted_from') != game_number_source or prediction.get('message_id')
+                or prediction.get('status') != 'pending'):
+            return False
+        del self.predictions[target]
+        if self._recent_predictions_source is self.predictions and target in self._recent_predictions:
+            self._recent_predictions.remove(target)
+        self.read_model.note_prediction(target)
+        self._save_all_data()
+        logger.info("🗑️ Prédiction jeu %s retirée (jamais publiée)", target)
+        return True
+
     # --- VERIFICATION LOGIQUE ---
 
     def verify_prediction(self, message: str) -> Optional[Dict]:
@@ -803,7 +990,7 @@ class CardPredictor:
         # Normaliser le costume prédit
         normalized_predicted = predicted_costume.replace("❤️", "♥️")
         
-        logger.debug(f"🔍 Vérification costume {normalized_predicted} dans les cartes: {all_cards_in_first_group}")
+        logger.debug("🔍 Vérification costume %s dans les cartes: %s", normalized_predicted, all_cards_in_first_group)
         
         # Vérifier si au moins UNE carte du premier groupe a le costume prédit
         for card in all_cards_in_first_group:
@@ -817,13 +1004,13 @@ class CardPredictor:
             # Normaliser aussi le costume de la carte pour la comparaison
             normalized_card_suit = card_suit.replace("❤️", "♥️") if card_suit else None
             
-            logger.debug(f"  Analyse carte: {card}, enseigne extraite: {card_suit} → normalisée: {normalized_card_suit}")
+            logger.debug("  Analyse carte: %s, enseigne extraite: %s → normalisée: %s", card, card_suit, normalized_card_suit)
             
             if normalized_card_suit == normalized_predicted:
-                logger.info(f"✅ Costume {normalized_predicted} trouvé dans la carte {card} du PREMIER groupe")
+                logger.info("✅ Costume %s trouvé dans la carte %s du PREMIER groupe", normalized_predicted, card)
                 return True
         
-        logger.debug(f"❌ Costume {normalized_predicted} non trouvé dans les cartes du premier groupe: {all_cards_in_first_group}")
+        logger.debug("❌ Costume %s non trouvé dans les cartes du premier groupe: %s", normalized_predicted, all_cards_in_first_group)
         return False
 
     def _verify_prediction_common(self, message: str, is_edited: bool = False) -> Optional[Dict]:
@@ -835,13 +1022,13 @@ class CardPredictor:
             logger.debug("❌ Aucun numéro de jeu trouvé")
             return None
         
-        logger.info(f"🔍 Vérification du jeu {game_number}...")
+        logger.info("🔍 Vérification du jeu %s...", game_number)
         
         # Validation Structurelle
         is_structurally_valid = self.is_final_result_structurally_valid(message)
         
         if not is_structurally_valid: 
-            logger.debug(f"⚠️ Structure invalide pour jeu {game_number}")
+            logger.debug("⚠️ Structure invalide pour jeu %s", game_number)
             return None
 
         if not self.predictions: 
@@ -877,7 +1064,7 @@ class CardPredictor:
                     if costume_found:
                         # ✅ SUCCÈS : costume trouvé au bon offset
                         status_symbol = SYMBOL_MAP.get(offset, f"✅{offset}️⃣")
-                        logger.info(f"✅ SUCCÈS: Jeu {predicted_game} trouvé à +{offset} avec statut {status_symbol}")
+                        logger.info("✅ SUCCÈS: Jeu %s trouvé à +%s avec statut %s", predicted_game, offset, status_symbol)
                         prediction['status'] = 'won'
                         prediction['verification_count'] = offset
                         found = True
@@ -887,7 +1074,7 @@ class CardPredictor:
                         if offset == 2:
                             # Dernier offset sans succès = ÉCHEC TOTAL
                             status_symbol = "❌"
-                            logger.info(f"❌ ÉCHEC: Costume {predicted_costume} non trouvé au jeu {predicted_game}+2")
+                            logger.info("❌ ÉCHEC: Costume %s non trouvé au jeu %s+2", predicted_costume, predicted_game)
                             prediction['status'] = 'lost'
                             found = True
                             break
@@ -897,7 +1084,7 @@ class CardPredictor:
             # Si on a trouvé une correspondance de jeu mais on dépasse N+2, c'est un échec
             if game_number > predicted_game + 2 and prediction.get('status') == 'pending':
                 status_symbol = "❌"
-                logger.info(f"❌ ÉCHEC: Jeu {game_number} dépasse {predicted_game}+2")
+                logger.info("❌ ÉCHEC: Jeu %s dépasse %s+2", game_number, predicted_game)
                 prediction['status'] = 'lost'
                 found = True
             
@@ -905,6 +1092,8 @@ class CardPredictor:
             if found and status_symbol:
                 updated_message = f"🔵{predicted_game}🔵:{predicted_costume} statut :{status_symbol}"
                 prediction['final_message'] = updated_message
+                self.read_model.note_prediction(predicted_game)
+                PREDICTIONS_TOTAL.inc(mode='inter' if prediction.get('is_inter') else 'static', status=prediction['status'], shard=self.name)
                 
                 # 🔒 QUARANTAINE TOUJOURS si is_inter
                 if prediction.get('is_inter'):
@@ -913,13 +1102,13 @@ class CardPredictor:
                         self.is_inter_mode_active = False 
                         logger.info("❌ Échec INTER : Désactivation automatique + quarantaine.")
                     else:
-                        logger.info(f"🔒 Quarantaine appliquée (succès): Déclencheur en quarantaine.")
+                        logger.info("🔒 Quarantaine appliquée (succès): Déclencheur en quarantaine.")
                 
                 # Gérer les échecs statiques
                 if prediction['status'] == 'lost' and not prediction.get('is_inter'):
                     self.consecutive_fails += 1
                     if self.consecutive_fails >= 2:
-                        self.single_trigger_until = time.time() + 3600
+                        self.single_trigger_until = self.clock.time() + 3600
                         self.analyze_and_set_smart_rules(force_activate=True) 
                         logger.info("⚠️ 2 Échecs Statiques : Activation INTER.")
                 else:
@@ -0,0 +1,48 @@
+# clock.py
+
+"""
+Source de temps du bot. CardPredictor, les handlers et le calendrier des
+tâches lisent l'heure via une horloge injectable : l'horloge système en
+production, une horloge simulée pour rejouer une journée en accéléré.
+"""
+import threading
+import time
+from datetime import datetime, tzinfo
+from typing import Optional
+
+
+class SystemClock:
+    """Horloge murale du processus."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self, tz: Optional[tzinfo] = None) -> datetime:
+        return datetime.now(tz)
+
+
+class SimulatedClock:
+    """Horloge manuelle : le temps n'avance que via advance() / set()."""
+
+    def __init__(self, start: float):
+        self._now = float(start)
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self._now
+
+    def now(self, tz: Optional[tzinfo] = None) -> datetime:
+        return datetime.fromtimestamp(self._now, tz)
+
+    def set(self, timestamp: float) -> None:
+        with self._lock:
+            if timestamp < self._now:
+                raise ValueError(f"L'horloge simulée ne recule pas ({timestamp} < {self._now})")
+            self._now = float(timestamp)
+
+    def advance(self, seconds: float) -> None:
+        self.set(self._now + seconds)
+
+
+# Horloge par défaut du processus
+SYSTEM_CLOCK = SystemClock()
@@ -5,9 +5,11 @@ Configuration settings for the Telegram bot
 """
 import os
 import logging
+from typing import List, Optional, Tuple
+
+from shards import parse_shards
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 # --- IDS DE CANAUX PAR DÉFAUT (Supprimés, les vrais IDs sont maintenant dans config.json) ---
 DEFAULT_TARGET_CHANNEL_ID = None 
@@ -18,6 +20,24 @@ CALLBACK_SOURCE = "config_source"
 CALLBACK_PREDICTION = "config_prediction"
 CALLBACK_CANCEL = "config_cancel"
 
+
+def is_valid_token(token: str) -> bool:
+    return ':' in token and token.split(':')[0].isdigit()
+
+
+def parse_bots(spec: str, primary_name: str) -> List[Tuple[str, str]]:
+    """'nom=token,...' → [(nom, token)] : bots hébergés en plus du bot principal ; ValueError si mal formé."""
+    bots = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, token = item.partition('=')
+        name, token = name.strip(), token.strip()
+        if not name.isidentifier() or not is_valid_token(token):
+            raise ValueError(f"Bot invalide dans BOTS: '{name}' (attendu: nom=token)")
+        if name == primary_name or name in (b[0] for b in bots):
+            raise ValueError(f"Nom de bot en double dans BOTS: '{name}'")
+        bots.append((name, token))
+    return bots
+
 class Config:
     """Configuration class for bot settings"""
     
@@ -36,9 +56,67 @@ class Config:
         self.TARGET_CHANNEL_ID = DEFAULT_TARGET_CHANNEL_ID
         self.PREDICTION_CHANNEL_ID = DEFAULT_PREDICTION_CHANNEL_ID
         
+        # Bots hébergés par le même processus : BOT_NAME pour le bot principal (/webhook et /webhook/<BOT_NAME>),
+        # BOTS="nom=token,..." pour les autres (/webhook/<nom>, données sous BOT_DATA_DIR/<nom>/)
+        self.BOT_NAME = os.getenv('BOT_NAME') or 'main'
+        self.BOTS = parse_bots(os.getenv('BOTS', ''), self.BOT_NAME)
+        self.BOT_DATA_DIR = os.getenv('BOT_DATA_DIR') or 'bots'
+        
+        # Tables supplémentaires du bot principal (shards.py) : "nom:id_source:id_prediction,..." ; données sous SHARD_DATA_DIR/<nom>/
+        self.SHARDS = parse_shards(os.getenv('SHARDS', ''))
+        self.SHARD_DATA_DIR = os.getenv('SHARD_DATA_DIR') or 'shards'
+        
+        # Plusieurs workers gunicorn (leader.py) : un leader élu par verrou de fichier possède l'état et le
+        # planificateur, les autres workers lui transmettent les webhooks par une socket Unix
+        self.MULTI_WORKER = os.getenv('MULTI_WORKER', 'False').lower() == 'true'
+        self.LEADER_LOCK_FILE = os.getenv('LEADER_LOCK_FILE') or 'leader.lock'
+        self.LEADER_SOCKET = os.getenv('LEADER_SOCKET') or 'leader.sock'
+        self.LEADER_FORWARD_TIMEOUT = float(os.getenv('LEADER_FORWARD_TIMEOUT') or 60)
+        
+        # Moteur dans un processus enfant (engine_process.py) : /health et les webhooks ne subissent pas ses calculs
+        self.ENGINE_PROCESS = os.getenv('ENGINE_PROCESS', 'False').lower() == 'true'
+        self.ENGINE_QUEUE_SIZE = int(os.getenv('ENGINE_QUEUE_SIZE') or 1000)
+        self.ENGINE_SOCKET = os.getenv('ENGINE_SOCKET') or 'engine.sock'
+        
         # Mode Debug
         self.DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
         
+        # URL de base de l'API Bot (serveur mock ou Bot API locale pour les tests hors ligne)
+        self.TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE') or None
+        
+        # Mode de traitement du webhook: 'sync' (traitement dans la requête), 'queue' (réponse immédiate + file)
+        # ou 'parallel' (réponse immédiate + pool de threads, ordre strict par chat)
+        self.WEBHOOK_MODE = os.getenv('WEBHOOK_MODE', 'sync').lower()
+        self.UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE') or 1000)
+        self.DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS') or 4)
+        # Appels simultanés vers l'API Telegram, servis par priorité (vérification > prédiction > admin)
+        self.SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY') or 2)
+        # Temps max (s) des appels à l'API Telegram pour un même update ; 0 = sans limite
+        self.UPDATE_DEADLINE = float(os.getenv('UPDATE_DEADLINE') or 15)
+        # Disjoncteur de l'API : ouvert après N échecs consécutifs, appel de test après API_RESET_TIMEOUT secondes
+        self.API_FAILURE_THRESHOLD = int(os.getenv('API_FAILURE_THRESHOLD') or 5)
+        self.API_RESET_TIMEOUT = float(os.getenv('API_RESET_TIMEOUT') or 30)
+        # Limiteur de débit des commandes (seau de jetons par clé ; le canal source n'est pas limité)
+        self.RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE') or 30)
+        self.RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST') or 30)
+        self.RATE_LIMIT_KEY = os.getenv('RATE_LIMIT_KEY', 'user').lower()
+        self.RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS') or 10000)
+        # Délestage (modes 'queue' et 'parallel') au-delà de SHED_QUEUE_DEPTH updates en file ; 0 = désactivé
+        self.SHED_QUEUE_DEPTH = int(os.getenv('SHED_QUEUE_DEPTH') or 200)
+        # Prédiction délestée pour un jeu N quand le jeu N + SHED_STALE_GAMES est déjà arrivé
+        self.SHED_STALE_GAMES = int(os.getenv('SHED_STALE_GAMES') or 2)
+        
+        # Ingestion des updates: 'webhook' (par défaut) ou 'polling' (getUpdates, sans webhook)
+        self.INGESTION_MODE = os.getenv('INGESTION_MODE', 'webhook').lower()
+        self.POLLING_LIMIT = int(os.getenv('POLLING_LIMIT') or 100)
+        self.POLLING_TIMEOUT = int(os.getenv('POLLING_TIMEOUT') or 50)
+        
+        # Nombre de derniers update_id mémorisés pour ignorer les re-livraisons
+        self.DEDUP_WINDOW = int(os.getenv('DEDUP_WINDOW') or 2000)
+        
+        # Jeton des routes d'administration (/debug/profile) ; non défini = routes désactivées
+        self.ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') or None
+        
         # Validation finale
         self._validate_config()
     
@@ -66,7 +144,7 @@ class Config:
         
         if not token:
             raise ValueError("BOT_TOKEN not found in secrets_config.json or environment variables.")
-        if ':' not in token or not token.split(':')[0].isdigit():
+        if not is_valid_token(token):
             raise ValueError("Invalid bot token format")
 
         logger.info(f"✅ BOT_TOKEN configuré: {token[:10]}...")
@@ -94,12 +172,45 @@ class Config:
         if self.WEBHOOK_URL and not self.WEBHOOK_URL.startswith('https://'):
             logger.warning("⚠️ L'URL du webhook devrait utiliser HTTPS pour la production.")
         
+        if self.WEBHOOK_MODE not in ('sync', 'queue', 'parallel'):
+            raise ValueError(f"WEBHOOK_MODE invalide: {self.WEBHOOK_MODE} (attendu: sync, queue ou parallel)")
+        if self.INGESTION_MODE not in ('webhook', 'polling'):
+            raise ValueError(f"INGESTION_MODE invalide: {self.INGESTION_MODE} (attendu: webhook ou polling)")
+        if self.UPDATE_QUEUE_SIZE < 1:
+            raise ValueError("UPDATE_QUEUE_SIZE doit être supérieur à 0")
+        if self.DISPATCH_WORKERS < 1:
+            raise ValueError("DISPATCH_WORKERS doit être supérieur à 0")
+        if self.SEND_CONCURRENCY < 1:
+            raise ValueError("SEND_CONCURRENCY doit être supérieur à 0")
+        if self.UPDATE_DEADLINE < 0:
+            raise ValueError("UPDATE_DEADLINE doit être positif (0 = sans limite)")
+        if self.API_FAILURE_THRESHOLD < 1:
+            raise ValueError("API_FAILURE_THRESHOLD doit être supérieur à 0")
+        if self.API_RESET_TIMEOUT <= 0:
+            raise ValueError("API_RESET_TIMEOUT doit être supérieur à 0")
+        if self.RATE_LIMIT_PER_MINUTE <= 0 or self.RATE_LIMIT_BURST < 1 or self.RATE_LIMIT_MAX_KEYS < 1:
+            raise ValueError("RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST et RATE_LIMIT_MAX_KEYS doivent être supérieurs à 0")
+        if self.RATE_LIMIT_KEY not in ('user', 'chat', 'user_chat'):
+            raise ValueError(f"RATE_LIMIT_KEY invalide: {self.RATE_LIMIT_KEY} (attendu: user, chat ou user_chat)")
+        if self.SHED_QUEUE_DEPTH < 0:
+            raise ValueError("SHED_QUEUE_DEPTH doit être positif (0 = délestage désactivé)")
+        if self.SHED_STALE_GAMES < 1:
+            raise ValueError("SHED_STALE_GAMES doit être supérieur à 0")
+        if not self.BOT_NAME.isidentifier():
+            raise ValueError(f"BOT_NAME invalide: {self.BOT_NAME} (lettres, chiffres et _ uniquement)")
+        if self.LEADER_FORWARD_TIMEOUT <= 0:
+            raise ValueError("LEADER_FORWARD_TIMEOUT doit être supérieur à 0")
+        if self.ENGINE_QUEUE_SIZE < 1:
+            raise ValueError("ENGINE_QUEUE_SIZE doit être supérieur à 0")
+        if self.DEDUP_WINDOW < 1:
+            raise ValueError("DEDUP_WINDOW doit être supérieur à 0")
+        
         logger.info("✅ Configuration validée avec succès.")
     
-    def get_webhook_url(self) -> str:
-        """Renvoie l'URL complète du webhook (y compris /webhook)."""
+    def get_webhook_url(self, bot_name: Optional[str] = None) -> str:
+        """Renvoie l'URL complète du webhook (y compris /webhook, ou /webhook/<bot> pour un bot de BOTS)."""
         if self.WEBHOOK_URL:
-            return f"{self.WEBHOOK_URL}/webhook"
+            return f"{self.WEBHOOK_URL}/webhook/{bot_name}" if bot_name else f"{self.WEBHOOK_URL}/webhook"
         return ""
     
     def __str__(self) -> str:
@@ -110,7 +221,11 @@ class Config:
             f"  PORT: {self.PORT},\n"
             f"  TARGET_CHANNEL_ID: {self.TARGET_CHANNEL_ID},\n"
             f"  PREDICTION_CHANNEL_ID: {self.PREDICTION_CHANNEL_ID},\n"
-            f"  DEBUG: {self.DEBUG}\n"
+            f"  DEBUG: {self.DEBUG},\n"
+            f"  WEBHOOK_MODE: {self.WEBHOOK_MODE},\n"
+            f"  INGESTION_MODE: {self.INGESTION_MODE},\n"
+            f"  MULTI_WORKER: {self.MULTI_WORKER},\n"
+            f"  ENGINE_PROCESS: {self.ENGINE_PROCESS}\n"
             f")"
 )
         
@@ -0,0 +1,259 @@
+# dispatcher.py
+
+"""
+Traitement parallèle des updates, ordonné par chat.
+
+Chaque chat a sa propre file FIFO : les updates d'un même chat (le canal
+source en particulier) sont traités strictement dans l'ordre d'arrivée, par
+un seul thread à la fois. Des chats différents avancent en parallèle sur un
+pool de threads, si bien qu'une commande admin lente (/collect, /qua) ne
+retarde pas la prochaine prédiction ; entre chats prêts, la classe de
+priorité de l'update en tête décide (vérification > prédiction > admin).
+
+La logique métier (TelegramHandlers / CardPredictor) d'une même table n'est
+jamais exécutée par deux threads en même temps : elle tourne sous l'EngineGate
+de son shard (shards.py), relâché pendant les appels réseau.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from load_shedding import DEFER, DROP, PROCESS, SKIP_PREDICTION, LoadShedder, predictions_suspended
+from metrics import REGISTRY
+from priority import ADMIN, PRIORITY_RANK, PRIORITY_WAIT, PrioritySlots, priority_class
+from update_queue import QUEUE_DEPTH, QUEUE_ENQUEUED, QUEUE_PROCESSED, QUEUE_REJECTED, QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_CHATS = REGISTRY.gauge('bot_dispatch_active_chats', "Chats ayant des updates en attente ou en cours de traitement", ('queue',))
+
+# Updates traités d'affilée pour un chat avant de rendre la main aux autres chats
+FAIR_BATCH = 32
+
+
+class EngineGate:
+    """
+    Verrou de la logique métier : un seul thread exécute TelegramHandlers/CardPredictor
+    à la fois, mais le verrou est relâché pendant les appels réseau, ce qui laisse
+    les autres chats avancer pendant qu'un envoi est en vol. Parmi les threads en
+    attente, le verrou va à la classe de priorité la plus urgente (priority.py).
+    """
+
+    def __init__(self):
+        self._slots = PrioritySlots(1, layer='engine')
+        self._local = threading.local()
+
+    def held(self) -> bool:
+        return getattr(self._local, 'held', False)
+
+    def __enter__(self):
+        self._slots.acquire()
+        self._local.held = True
+        return self
+
+    def __exit__(self, *exc):
+        self._local.held = False
+        self._slots.release()
+
+    @contextmanager
+    def released(self):
+        """Relâche le verrou pendant le bloc s'il est détenu par le thread courant."""
+        was_held = self.held()
+        if was_held:
+            self.__exit__()
+        try:
+            yield
+        finally:
+            if was_held:
+                self.__enter__()
+
+
+def update_chat_key(update: Dict[str, Any]) -> Any:
+    """Chat concerné par l'update (clé d'ordonnancement)."""
+    for key in ('message', 'channel_post', 'edited_message', 'edited_channel_post', 'my_chat_member'):
+        if key in update:
+            return update[key].get('chat', {}).get('id')
+    if 'callback_query' in update:
+        return update['callback_query'].get('message', {}).get('chat', {}).get('id')
+    return None
+
+
+class ChatDispatcher:
+    """
+    File bornée, FIFO par chat, consommée par un pool de threads (même interface que UpdateQueue).
+    Le prochain chat servi est celui dont l'update en tête a la classe de priorité la plus urgente
+    (`classify`), puis le plus ancien.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], None], workers: int = 4, maxsize: int = 1000,
+                 name: str = 'dispatch', gate: Optional[EngineGate] = None,
+                 classify: Optional[Callable[[Dict[str, Any]], str]] = None, shedder: Optional[LoadShedder] = None):
+        self.name = name
+        self.workers = workers
+        self.maxsize = maxsize
+        self.gate = gate
+        self._handler = handler
+        self._classify = classify or (lambda update: ADMIN)
+        # Un chat est présent tant qu'il a des updates en attente ou en cours : un seul drain à la fois par chat
+        self._chats: Dict[Any, Deque[Tuple[float, str, Dict[str, Any]]]] = {}
+        # Chats prêts à être servis : (rang de priorité de l'update en tête, ordre d'arrivée, chat)
+        self._ready: List[Tuple[int, int, Any]] = []
+        self._seq = itertools.count()
+        # Chats admin mis de côté pendant une surcharge (ordre de mise de côté) et nombre d'updates qu'ils retiennent
+        self.shedder = shedder
+        self._parked: Dict[Any, None] = {}
+        self._parked_size = 0
+        # Chats repris après la surcharge → updates mis de côté encore à traiter sans nouveau report
+        self._released: Dict[Any, int] = {}
+        self._size = 0
+        self._running = False
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        QUEUE_DEPTH.set_function(self.qsize, queue=name)
+        ACTIVE_CHATS.set_function(lambda: len(self._chats), queue=name)
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._threads = [threading.Thread(target=self._run, name=f'{self.name}-worker-{i}', daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"📥 Dispatcher '{self.name}' démarré ({self.workers} threads, capacité {self.maxsize})")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Attend (au plus `timeout`) que les updates en file soient traités, puis arrête les threads."""
+        if not self._running:
+            return
+        with self._lock:
+            self._idle.wait_for(lambda: self._size == 0, timeout)
+            self._running = False
+            self._work.notify_all()
+        self._threads = []
+
+    def put(self, update: Dict[str, Any]) -> bool:
+        """Ajoute un update sans bloquer. Retourne False si la capacité est atteinte."""
+        key = update_chat_key(update)
+        priority = self._classify(update)
+        if self.shedder:
+            self.shedder.note_enqueued(update)
+        with self._lock:
+            if self._size >= self.maxsize:
+                QUEUE_REJECTED.inc(queue=self.name)
+                logger.warning(f"⚠️ Dispatcher '{self.name}' plein ({self.maxsize}), update {update.get('update_id')} refusé")
+                return False
+            self._size += 1
+            chat_queue = self._chats.get(key)
+            if chat_queue is None:
+                chat_queue = self._chats[key] = deque()
+                self._push_ready(key, priority)
+            elif key in self._parked:
+                self._parked_size += 1
+            chat_queue.append((time.monotonic(), priority, update))
+        QUEUE_ENQUEUED.inc(queue=self.name)
+        return True
+
+    def qsize(self) -> int:
+        return self._size
+
+    def join(self) -> None:
+        """Bloque jusqu'à ce que tous les updates en file soient traités."""
+        with self._idle:
+            self._idle.wait_for(lambda: self._size == 0)
+
+    def _push_ready(self, key: Any, priority: str) -> None:
+        # Appelé sous verrou
+        heapq.heappush(self._ready, (PRIORITY_RANK[priority], next(self._seq), key))
+        self._work.notify()
+
+    def _shed_decision(self, key: Any, priority: str, update: Dict[str, Any]) -> str:
+        # Appelé sous verrou ; les updates des chats mis de côté ne comptent pas dans la charge
+        if not self.shedder:
+            return PROCESS
+        self.shedder.update_load(self._size - self._parked_size)
+        action = self.shedder.decide(update, priority)
+        if action == DEFER and self._released.get(key):
+            # Update déjà mis de côté puis repris : traité dans l'ordre, sans nouveau report
+            return PROCESS
+        if action == DEFER:
+            self._parked[key] = None
+            self._parked_size += len(self._chats[key])
+            # Surcharge due aux seuls chats mis de côté : aucun autre update ne viendrait les reprendre
+            self._maybe_unpark()
+        return action
+
+    def _maybe_unpark(self) -> None:
+        # Appelé sous verrou : fin de surcharge, les chats mis de côté repassent dans la file des chats prêts
+        if not self._parked or self.shedder.update_load(self._size - self._parked_size):
+            return
+        for key in self._parked:
+            self._released[key] = len(self._chats[key])
+            self._push_ready(key, self._chats[key][0][1])
+        self._parked.clear()
+        self._parked_size = 0
+
+    def _process(self, priority: str, update: Dict[str, Any], action: str = PROCESS) -> None:
+        with priority_class(priority), (predictions_suspended() if action == SKIP_PREDICTION else nullcontext()):
+            if self.gate is None:
+                self._handler(update)
+                return
+            with self.gate:
+                self._handler(update)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                self._work.wait_for(lambda: self._ready or not self._running)
+                if not self._running:
+                    return
+                _, _, key = heapq.heappop(self._ready)
+            self._drain(key)
+
+    def _drain(self, key: Any) -> None:
+        for _ in range(FAIR_BATCH):
+            with self._lock:
+                enqueued_at, priority, update = self._chats[key][0]
+                action = self._shed_decision(key, priority, update)
+                if action == DEFER:
+                    return
+            waited = time.monotonic() - enqueued_at
+            QUEUE_WAIT.observe(waited, queue=self.name)
+            PRIORITY_WAIT.observe(waited, layer=self.name, priority=priority)
+            if action == DROP:
+                QUEUE_PROCESSED.inc(queue=self.name, result='shed')
+            else:
+                try:
+                    self._process(priority, update, action)
+                    QUEUE_PROCESSED.inc(queue=self.name, result='ok')
+                except Exception as e:
+                    QUEUE_PROCESSED.inc(queue=self.name, result='error')
+                    logger.error(f"❌ Erreur traitement update {update.get('update_id')} (chat {key}): {e}")
+            with self._lock:
+                chat_queue = self._chats[key]
+                chat_queue.popleft()
+                self._size -= 1
+                if self._released.get(key):
+                    self._released[key] -= 1
+                if self.shedder:
+                    self._maybe_unpark()
+                if not chat_queue:
+                    del self._chats[key]
+                    self._released.pop(key, None)
+                    if self._size == 0:
+                        self._idle.notify_all()
+                    return
+                if chat_queue[0][1] != priority:
+                    # L'update suivant change de classe : le chat reprend sa place selon sa nouvelle priorité
+                    self._push_ready(key, chat_queue[0][1])
+                    return
+        # Chat très actif : il repasse dans la file des chats prêts pour laisser passer les autres
+        with self._lock:
+            self._push_ready(key, self._chats[key][0][1])
@@ -0,0 +1,286 @@
+# engine_process.py
+
+"""
+Moteur hors du processus HTTP (ENGINE_PROCESS=true).
+
+L'analyse des messages, les règles INTER et la sérialisation JSON tiennent le
+GIL : dans le processus de Flask, une grosse analyse ou une sauvegarde retarde
+/health et l'accusé de réception des webhooks. Avec ENGINE_PROCESS, les bots
+(TelegramBot, handlers, CardPredictor), l'ingestion et le planificateur
+tournent dans un processus enfant (`python -m engine_process`). Le processus
+HTTP valide l'update, le dépose dans une file bornée et répond tout de suite
+(503 si la file est pleine).
+
+Transport : un tube par sens. Les updates partent en JSON, une ligne par
+update {"seq": n, "bot": nom|null, "update": {...}}, sur l'entrée standard de
+l'enfant. L'enfant acquitte chaque update remis à son bot (traité en mode
+'sync', mis en file sinon) en renvoyant son `seq` sur sa sortie standard (ses
+logs vont sur la sortie d'erreur). Si l'enfant meurt, il est relancé et les
+updates non acquittés lui sont renvoyés ; les doublons éventuels sont écartés
+par l'UpdateDeduplicator. Sur la même sortie, l'enfant envoie chaque seconde
+l'état de ses tables ({"tables": {...}}) : /health le lit dans cette copie,
+sans jamais attendre l'enfant.
+
+Les envois vers Telegram et le journal des envois restent dans l'enfant : il
+a sa propre connexion à l'API.
+
+Contrôle : l'enfant écoute aussi sur une socket Unix (ENGINE_SOCKET), une
+ligne JSON par requête {"op": ...} et par réponse. Le processus HTTP y lit
+les métriques du moteur (fusionnées dans /metrics) et y relaie
+/debug/profile : le profileur échantillonne l'enfant, là où tournent les
+calculs.
+"""
+import importlib
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+from profiler import handle_profile_request
+
+logger = logging.getLogger(__name__)
+
+# Variable d'environnement posée dans l'enfant : main.py y démarre le moteur sur place
+CHILD_ENV = 'ENGINE_PROCESS_CHILD'
+# Chemin de la socket de contrôle, transmis à l'enfant
+CONTROL_SOCKET_ENV = 'ENGINE_CONTROL_SOCKET'
+
+# Période d'envoi de l'état des tables par l'enfant (s)
+TABLES_INTERVAL = 1.0
+
+ENGINE_QUEUE_DEPTH = REGISTRY.gauge('bot_engine_queue_depth', "Updates en attente d'envoi au processus moteur")
+ENGINE_INFLIGHT = REGISTRY.gauge('bot_engine_inflight', "Updates transmis au processus moteur et non acquittés")
+ENGINE_RESTARTS = REGISTRY.counter('bot_engine_restarts_total', "Redémarrages du processus moteur")
+ENGINE_SUBMITTED = REGISTRY.counter('bot_engine_submitted_total', "Updates proposés au processus moteur", ('result',))
+
+
+def is_engine_process() -> bool:
+    return os.getenv(CHILD_ENV) == '1'
+
+
+class EngineProcess:
+    """Côté HTTP : file bornée vers le processus moteur, relancé s'il meurt."""
+
+    def __init__(self, maxsize: int = 1000, app_module: str = 'main', restart_delay: float = 1.0,
+                 control_socket: str = 'engine.sock', control_timeout: float = 5.0):
+        self.app_module = app_module
+        self.restart_delay = restart_delay
+        self.control_socket = os.path.abspath(control_socket)
+        self.control_timeout = control_timeout
+        self._queue: "queue.Queue[Tuple[int, bytes]]" = queue.Queue(maxsize=maxsize)
+        # seq → ligne : transmis, pas encore acquittés (renvoyés à l'enfant suivant s'il meurt)
+        self._inflight: "OrderedDict[int, bytes]" = OrderedDict()
+        self._inflight_lock = threading.Lock()
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._stopping = False
+        # Dernier état des tables envoyé par l'enfant (vidé à chaque relance)
+        self.tables: Dict[str, Any] = {}
+        self._tables_at: Optional[float] = None
+        ENGINE_QUEUE_DEPTH.set_function(self._queue.qsize)
+        ENGINE_INFLIGHT.set_function(lambda: len(self._inflight))
+
+    def start(self) -> 'EngineProcess':
+        threading.Thread(target=self._pump, name='engine-pump', daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stopping = True
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.stdin.close()
+            process.wait(timeout=10)
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process is not None else None
+
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._inflight)
+
+    def tables_age(self) -> Optional[float]:
+        """Âge (s) du dernier état des tables reçu de l'enfant ; None avant le premier envoi."""
+        return time.monotonic() - self._tables_at if self._tables_at is not None else None
+
+    def submit(self, bot_name: Optional[str], update: Dict[str, Any]) -> Tuple[int, Any]:
+        """Dépose l'update pour le moteur sans attendre son traitement ; retourne (code HTTP, corps)."""
+        with self._seq_lock:
+            self._seq += 1
+            seq = self._seq
+        line = json.dumps({'seq': seq, 'bot': bot_name, 'update': update}, ensure_ascii=False).encode() + b'\n'
+        try:
+            self._queue.put_nowait((seq, line))
+        except queue.Full:
+            ENGINE_SUBMITTED.inc(result='busy')
+            return 503, {'status': 'busy'}
+        ENGINE_SUBMITTED.inc(result='queued')
+        return 200, 'OK'
+
+    def request(self, op: str, **params) -> Optional[Dict[str, Any]]:
+        """Requête sur la socket de contrôle de l'enfant ; None s'il ne répond pas (démarrage, relance)."""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.control_timeout)
+                sock.connect(self.control_socket)
+                with sock.makefile('rwb') as stream:
+                    stream.write(json.dumps(dict(params, op=op)).encode() + b'\n')
+                    stream.flush()
+                    line = stream.readline()
+            return json.loads(line) if line else None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Processus moteur injoignable pour '{op}': {e}")
+            return None
+
+    # --- Processus enfant ---
+    def _spawn(self) -> subprocess.Popen:
+        # Le module est trouvé même si le répertoire courant n'est pas celui du code (gunicorn --chdir...)
+        code_dir = os.path.dirname(os.path.abspath(__file__))
+        env = dict(os.environ, **{CHILD_ENV: '1', CONTROL_SOCKET_ENV: self.control_socket, 'PYTHONPATH': os.pathsep.join(filter(None, [code_dir, os.getenv('PYTHONPATH')]))})
+        process = subprocess.Popen([sys.executable, '-m', 'engine_process', self.app_module],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        self.tables, self._tables_at = {}, None
+        threading.Thread(target=self._read_acks, args=(process,), name='engine-acks', daemon=True).start()
+        logger.info(f"⚙️ Processus moteur démarré (pid {process.pid})")
+        return process
+
+    def _read_acks(self, process: subprocess.Popen) -> None:
+        for line in process.stdout:
+            if line.startswith(b'{'):
+                try:
+                    self.tables = json.loads(line)['tables']
+                    self._tables_at = time.monotonic()
+                except (ValueError, KeyError):
+                    pass
+                continue
+            try:
+                seq = int(line)
+            except ValueError:
+                continue
+            with self._inflight_lock:
+                self._inflight.pop(seq, None)
+
+    def _pump(self) -> None:
+        while not self._stopping:
+            process = self._process = self._spawn()
+            try:
+                # Updates non acquittés par l'enfant précédent : renvoyés dans l'ordre
+                with self._inflight_lock:
+                    unacked = list(self._inflight.values())
+                for line in unacked:
+                    process.stdin.write(line)
+                process.stdin.flush()
+                while process.poll() is None and not self._stopping:
+                    try:
+                        seq, line = self._queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    with self._inflight_lock:
+                        self._inflight[seq] = line
+                    # Bloque si l'enfant ne suit pas : la file se remplit et les webhooks reçoivent 503
+                    process.stdin.write(line)
+                    process.stdin.flush()
+            except OSError as e:
+                logger.error(f"❌ Tube vers le processus moteur rompu: {e}")
+            if self._stopping:
+                return
+            code = process.wait()
+            ENGINE_RESTARTS.inc()
+            logger.error(f"🚨 Processus moteur arrêté (code {code}), relance dans {self.restart_delay}s")
+            time.sleep(self.restart_delay)
+
+
+class _ControlRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = _control(self.server.app, json.loads(line))
+            except Exception as e:
+                logger.error(f"❌ Erreur sur la socket de contrôle du moteur: {e}")
+                response = {'error': str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode() + b'\n')
+            self.wfile.flush()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _control(app, request: Dict[str, Any]) -> Dict[str, Any]:
+    op = request.get('op')
+    if op == 'metrics':
+        names = REGISTRY.active_names()
+        return {'names': names, 'text': REGISTRY.render(only=names)}
+    if op == 'profile':
+        status, payload = handle_profile_request(request.get('method', 'GET'), request.get('params') or {})
+        return {'status': status, 'body': payload}
+    return {'error': f"opération inconnue: {op}"}
+
+
+def _serve_control(app, socket_path: str) -> None:
+    # Socket laissée par un enfant mort : un seul processus moteur par processus HTTP, elle peut être remplacée
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = _ThreadingUnixServer(socket_path, _ControlRequestHandler)
+    server.app = app
+    threading.Thread(target=server.serve_forever, name='engine-control', daemon=True).start()
+    logger.info(f"📡 Processus moteur : contrôle sur {socket_path}")
+
+
+def _report_tables(app, write: Callable[[str], None]) -> None:
+    # Vues immuables publiées par les écrivains des tables : lues sans prendre leur verrou
+    while True:
+        try:
+            write(json.dumps({'tables': app.table_health()}, ensure_ascii=False) + '\n')
+        except (OSError, ValueError):
+            return
+        except Exception as e:
+            logger.error(f"❌ État des tables non envoyé: {e}")
+        time.sleep(TABLES_INTERVAL)
+
+
+def run_engine(app_module: str = 'main') -> None:
+    """Côté enfant : démarre le moteur (import de `app_module`) puis traite les updates lus sur l'entrée standard."""
+    os.environ[CHILD_ENV] = '1'
+    # La sortie standard est réservée aux acquittements ; print() et les logs vont sur la sortie d'erreur
+    acks = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    app = importlib.import_module(app_module)
+    if os.getenv(CONTROL_SOCKET_ENV):
+        _serve_control(app, os.environ[CONTROL_SOCKET_ENV])
+    # Acquittements et état des tables partagent la sortie : une ligne entière à la fois
+    acks_lock = threading.Lock()
+
+    def write(line: str) -> None:
+        with acks_lock:
+            acks.write(line)
+
+    threading.Thread(target=_report_tables, args=(app, write), name='engine-tables', daemon=True).start()
+    for line in sys.stdin.buffer:
+        try:
+            item = json.loads(line)
+        except ValueError:
+            logger.warning("⚠️ Ligne illisible ignorée par le processus moteur")
+            continue
+        # File du moteur pleine : on attend (le processus HTTP répondra 503 quand sa propre file sera pleine)
+        while app.deliver_update(item.get('bot'), item.get('update'))[0] == 503:
+            time.sleep(0.05)
+        write(f"{item['seq']}\n")
+    logger.info("⚙️ Processus moteur : fin de l'entrée, arrêt")
+
+
+if __name__ == '__main__':
+    run_engine(sys.argv[1] if len(sys.argv) > 1 else 'main')
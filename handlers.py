@@ -1,15 +1,26 @@
 # handlers.py
 
 import logging
-import time
 import json
-from collections import defaultdict
-from typing import Dict, Any, Optional
+import os
 import requests
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager, nullcontext
+from typing import Dict, Any, Callable, Optional, List, Tuple
 from datetime import datetime
 
+from clock import SYSTEM_CLOCK
+from dispatcher import update_chat_key
+from telegram_api import CircuitOpenError, DeadlineExceeded, TelegramApi, deadline_budget
+from load_shedding import prediction_allowed
+from metrics import REGISTRY, STAGE_SECONDS
+from outbox import EDIT, MAX_ATTEMPTS, PREDICTION, Outbox
+from rate_limiter import RATE_LIMITED, TokenBucketLimiter, rate_limit_key
+from priority import ADMIN, PREDICT, VERIFY, PrioritySlots, priority_class
+from profiler import PROFILER
+from shards import DEFAULT_SHARD, SHARD_UPDATE_SECONDS, Shard, ShardRegistry
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 # Importation Robuste
 try:
@@ -19,7 +30,21 @@ except ImportError:
     logger.error("❌ IMPOSSIBLE D'IMPORTER CARDPREDICTOR")
     CardPredictor = None
 
-user_message_counts = defaultdict(list)
+# Rôle du chat d'où vient un message
+ROLE_SOURCE = 'source'
+ROLE_PREDICTION = 'prediction'
+ROLE_ADMIN = 'admin'
+
+# Commandes dont le gestionnaire reçoit aussi le texte complet (arguments)
+COMMANDS_WITH_TEXT = {'/inter'}
+
+# Commandes portant sur une table (SHARDS) : nom de la table en dernier argument (`/qua <table>`, `/inter status <table>`),
+# sinon la table du chat ('default' pour un chat d'administration)
+COMMANDS_WITH_TABLE = {'/collect', '/qua', '/inter', '/reset', '/bilan'}
+INTER_ACTIONS = ('status', 'activate', 'default')
+
+COMMANDS_TOTAL = REGISTRY.counter('bot_commands_total', "Commandes reçues, par commande et rôle du chat", ('command', 'role'))
+COMMAND_SECONDS = REGISTRY.histogram('bot_command_seconds', "Durée de traitement des commandes", ('command',))
 
 # --- MESSAGES UTILISATEUR NETTOYÉS ---
 WELCOME_MESSAGE = """
@@ -54,6 +79,9 @@ Je prédis la prochaine Enseigne (Couleur) en utilisant :
 • `/qua` - État de la quarantaine et statistiques
 • `/reset` - ⚠️ Réinitialiser COMPLÈTEMENT le bot
 
+**🔹 Plusieurs tables**
+• `/collect`, `/qua`, `/inter`, `/reset`, `/bilan` : nom de la table en dernier argument (ex: `/qua table2`)
+
 ━━━━━━━━━━━━━━━━━━━━━
 **💡 Comment ça marche ?**
 ━━━━━━━━━━━━━━━━━━━━━
@@ -83,25 +111,152 @@ HELP_MESSAGE = """
 """
 
 class TelegramHandlers:
-    def __init__(self, bot_token: str):
+    def __init__(self, bot_token: str, api_base: Optional[str] = None, clock=None,
+                 send_slots: Optional[PrioritySlots] = None, update_budget: Optional[float] = 15.0,
+                 rate_limiter: Optional[TokenBucketLimiter] = None, rate_limit_key_mode: str = 'user',
+                 name: Optional[str] = None, data_dir: str = '.'):
         self.bot_token = bot_token
-        self.base_url = f"https://api.telegram.org/bot{bot_token}"
+        # Nom du bot s'il est hébergé en plus du bot principal (BOTS) : état et canaux propres, sans canaux codés en dur
+        self.bot_name = name
+        self.data_dir = data_dir
+        self.api = TelegramApi(bot_token, api_base)
+        self.base_url = self.api.base_url
+        self.clock = clock or SYSTEM_CLOCK
+        # Appels sortants simultanés, attribués par classe de priorité (vérification > prédiction > admin)
+        self.send_slots = send_slots
+        # Limiteur de débit par utilisateur / chat (le canal source en est exempté)
+        self.rate_limiter = rate_limiter or TokenBucketLimiter(clock=self.clock, name=name or 'main')
+        self.rate_limit_key_mode = rate_limit_key_mode
+        # Temps max (s) de l'ensemble des appels à l'API pendant le traitement d'un update (None = sans limite)
+        self.update_budget = update_budget
+        
+        # Commandes : jeton exact (sans @nom_du_bot) → gestionnaire
+        self.commands: Dict[str, Callable[..., None]] = {
+            '/start': self._handle_command_start,
+            '/stat': self._handle_command_stat,
+            '/config': self._handle_command_config,
+            '/inter': self._handle_command_inter,
+            '/collect': self._handle_command_collect,
+            '/qua': self._handle_command_qua,
+            '/bilan': self._handle_command_bilan,
+            '/reset': self._handle_command_reset,
+            '/deploy': self._handle_command_deploy,
+        }
         
+        # Tables suivies (shards.py) : le shard par défaut, puis ceux de SHARDS (apply_config).
+        # Chaque shard a son verrou de la logique métier (relâché pendant les appels réseau) et son écrivain unique
+        # (actor.py) pour les écritures hors updates
+        self.shards = ShardRegistry()
         if CardPredictor:
-            # On passe la fonction d'envoi pour les notifs INTER
-            self.card_predictor = CardPredictor(telegram_message_sender=self.send_message)
-        else:
-            self.card_predictor = None
+            if name:
+                self.add_shard(DEFAULT_SHARD, data_dir, source_id=0, prediction_id=0)
+            else:
+                self.add_shard(DEFAULT_SHARD, data_dir)
+
+    def add_shard(self, name: str, data_dir: str = '.', source_id: Optional[int] = None,
+                  prediction_id: Optional[int] = None) -> Shard:
+        label = f"{self.bot_name}/{name}" if self.bot_name else name
+        # On passe la fonction d'envoi pour les notifs INTER
+        predictor = CardPredictor(telegram_message_sender=self.send_message, clock=self.clock, name=label, data_dir=data_dir,
+                                  source_id=source_id, prediction_id=prediction_id)
+        predictor.expose_state_sizes()
+        # Journal des envois critiques (prédictions, éditions de résultat) : reprise après crash ou échec
+        outbox = Outbox(os.path.join(data_dir, 'outbox.jsonl'), shard=label)
+        shard = self.shards.add(Shard(name, predictor, outbox, label=label))
+        if name != DEFAULT_SHARD or self.bot_name:
+            logger.info(f"🎲 Table '{label}' : source {predictor.target_channel_id} → prédiction {predictor.prediction_channel_id}")
+        return shard
+
+    def state_version(self) -> int:
+        """Somme des versions d'état des shards : change à chaque sauvegarde de l'un d'eux."""
+        return sum(shard.predictor.state_version for shard in self.shards)
+
+    # --- SHARD DU THREAD COURANT ---
+    @property
+    def card_predictor(self):
+        shard = self.shards.current()
+        return shard.predictor if shard else None
+
+    @property
+    def outbox(self) -> Outbox:
+        return self.shards.current().outbox
+
+    def snapshot(self):
+        """Vue immuable de l'état du shard courant : les écrans de statut sont rendus à partir d'elle."""
+        return self.shards.current().snapshot()
+
+    @contextmanager
+    def _off_gate(self):
+        """Travail d'admin sans l'état vivant (vue immuable, copie) : verrou relâché, repris à la priorité admin."""
+        with priority_class(ADMIN), (self.gate.released() if self.gate else nullcontext()):
+            yield
+
+    def _render_status(self, name: str, build: Callable[[Any], Any]) -> Any:
+        """Écran de statut rendu hors du verrou à partir de la vue immuable (mis en cache par version de la vue)."""
+        snapshot = self.snapshot()
+        read_model = self.card_predictor.read_model
+        with self._off_gate():
+            return read_model.render(name, lambda: build(snapshot), snapshot.version)
+
+    def _analyze_inter(self, chat_id: int):
+        """Analyse INTER calculée hors du verrou sur une copie des données collectées, puis appliquée sous le verrou."""
+        cp = self.card_predictor
+        inter_data = list(cp.inter_data)
+        with self._off_gate():
+            smart_rules = cp.compute_smart_rules(inter_data)
+        cp.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True, smart_rules=smart_rules)
+
+    @property
+    def gate(self):
+        shard = self.shards.current()
+        return shard.gate if shard else None
+
+    def apply_config(self, config):
+        """Réglages issus de Config : envois par priorité, budget par update, limiteur de débit."""
+        self.send_slots = PrioritySlots(config.SEND_CONCURRENCY, layer='send')
+        self.update_budget = config.UPDATE_DEADLINE or None
+        self.rate_limiter = TokenBucketLimiter(rate=config.RATE_LIMIT_PER_MINUTE / 60, burst=config.RATE_LIMIT_BURST,
+                                               max_keys=config.RATE_LIMIT_MAX_KEYS, clock=self.clock,
+                                               name=self.bot_name or config.BOT_NAME)
+        self.rate_limit_key_mode = config.RATE_LIMIT_KEY
+        # Les tables de SHARDS sont celles du bot principal
+        if CardPredictor and not self.bot_name:
+            for name, source_id, prediction_id in config.SHARDS:
+                if self.shards.get(name) is None:
+                    self.add_shard(name, os.path.join(config.SHARD_DATA_DIR, name), source_id, prediction_id)
 
     # --- MESSAGERIE ---
-    def _check_rate_limit(self, user_id):
-        now = time.time()
-        user_message_counts[user_id] = [t for t in user_message_counts[user_id] if now - t < 60]
-        user_message_counts[user_id].append(now)
-        return len(user_message_counts[user_id]) <= 30
+    @contextmanager
+    def _network_call(self):
+        with (self.gate.released() if self.gate else nullcontext()):
+            with (self.send_slots.slot() if self.send_slots else nullcontext()):
+                yield
+
+    def classify_update(self, update: Dict[str, Any]) -> str:
+        """Classe de priorité d'un update : résultat du canal source, jeu du canal source, ou admin."""
+        msg = update.get('message') or update.get('channel_post') or update.get('edited_message') or update.get('edited_channel_post')
+        if not msg or not self.card_predictor:
+            return ADMIN
+        if self.chat_role(msg.get('chat', {}).get('id')) != ROLE_SOURCE:
+            return ADMIN
+        text = msg.get('text', '')
+        if self.card_predictor.has_completion_indicators(text) or '🔰' in text:
+            return VERIFY
+        return PREDICT
+
+    def _check_rate_limit(self, msg: Dict[str, Any], role: str) -> bool:
+        if self.rate_limiter.allow(rate_limit_key(self.rate_limit_key_mode, msg)):
+            return True
+        RATE_LIMITED.inc(role=role)
+        return False
 
     def send_message(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False, reply_markup: Optional[Dict] = None) -> Optional[int]:
-        if not chat_id or not text: return None
+        return self._post_message(chat_id, text, parse_mode, message_id, edit, reply_markup)[0]
+
+    def _post_message(self, chat_id: int, text: str, parse_mode='Markdown', message_id: Optional[int] = None, edit=False,
+                      reply_markup: Optional[Dict] = None) -> Tuple[Optional[int], bool]:
+        """(message_id, issue inconnue) : l'issue est inconnue quand l'appel a pu atteindre Telegram sans réponse lisible (timeout, connexion rompue)."""
+        if not chat_id or not text: return None, False
         
         method = 'editMessageText' if (message_id or edit) else 'sendMessage'
         payload = {'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode}
@@ -111,14 +266,95 @@ class TelegramHandlers:
             payload['reply_markup'] = json.dumps(reply_markup) if isinstance(reply_markup, dict) else reply_markup
 
         try:
-            r = requests.post(f"{self.base_url}/{method}", json=payload, timeout=10)
+            with STAGE_SECONDS.time(stage='send'), self._network_call():
+                r = self.api.post(method, json=payload, timeout=10)
             if r.status_code == 200:
-                return r.json().get('result', {}).get('message_id')
+                return r.json().get('result', {}).get('message_id'), False
+            elif method == 'editMessageText' and 'message is not modified' in r.text:
+                # Édition rejouée (reprise du journal des envois) : le message a déjà ce contenu
+                return message_id, False
             else:
                 logger.error(f"Erreur Telegram {r.status_code}: {r.text}")
-        except Exception as e:
+        except (CircuitOpenError, DeadlineExceeded, requests.ConnectTimeout) as e:
+            # Appel jamais parti : échec certain
             logger.error(f"Exception envoi message: {e}")
-        return None
+        except Exception as e:
+            logger.error(f"Exception envoi message (issue inconnue): {e}")
+            return None, True
+        return None, False
+
+    # --- ENVOIS SUIVIS (JOURNAL DES ENVOIS) ---
+    def _send_tracked(self, kind: str, chat_id: int, text: str, message_id: Optional[int] = None,
+                      meta: Optional[Dict[str, Any]] = None, entry_id: Optional[str] = None) -> Optional[int]:
+        """
+        Envoi inscrit dans l'outbox avant l'appel, acquitté avec le message_id retourné.
+        Seul un échec certain est repris ; une prédiction d'issue inconnue est abandonnée et signalée (pas de doublon).
+        """
+        if entry_id is None:
+            entry_id = self.outbox.record(kind, chat_id, text, message_id=message_id, meta=meta)
+        mid, unknown = self._post_message(chat_id, text, message_id=message_id, edit=bool(message_id))
+        if mid:
+            self.outbox.ack(entry_id, mid)
+        elif unknown and kind == PREDICTION:
+            self.outbox.drop(entry_id, 'issue inconnue')
+            self._flag_unknown_prediction(text)
+        else:
+            # Échec certain, ou édition (rejouable sans effet de bord)
+            self.outbox.fail(entry_id)
+        return mid
+
+    def _flag_unknown_prediction(self, text: str):
+        """Prédiction peut-être publiée sans message_id connu : non renvoyée, l'admin vérifie le canal."""
+        logger.warning(f"⚠️ Prédiction d'issue inconnue, non renvoyée: {text!r}")
+        admin_chat_id = self.card_predictor.active_admin_chat_id
+        if admin_chat_id:
+            self.send_message(admin_chat_id, f"⚠️ Envoi d'une prédiction interrompu (issue inconnue), non renvoyé pour éviter un doublon :\n{text}\n\nVérifiez le canal de prédiction.")
+
+    def retry_outbox(self):
+        """Reprend les envois non acquittés de chaque shard (au démarrage)."""
+        for shard in self.shards:
+            shard.actor.call(self._retry_outbox)
+
+    def _retry_outbox(self):
+        """Reprend les envois non acquittés du shard courant (au démarrage, puis après chaque update)."""
+        if not self.card_predictor: return
+        # API en panne (disjoncteur ouvert) : inutile de consommer des tentatives
+        if self.api.breaker.is_open(): return
+        for entry in self.outbox.to_retry():
+            if entry['kind'] == PREDICTION:
+                self._retry_prediction(entry)
+            elif entry['attempts'] >= MAX_ATTEMPTS:
+                self.outbox.drop(entry['id'], 'tentatives épuisées')
+            else:
+                self._send_tracked(EDIT, entry['chat_id'], entry['text'], message_id=entry['message_id'], entry_id=entry['id'])
+
+    def _retry_prediction(self, entry: Dict[str, Any]):
+        """Prédiction inscrite (sans message_id) avant un envoi en échec certain : renvoyée tant qu'elle reste d'actualité."""
+        meta = entry['meta']
+        game, target = meta['game'], meta['game'] + 2
+        recorded = self.card_predictor.predictions.get(target, {})
+        ours = recorded.get('predicted_from') == game
+        if ours and recorded.get('message_id'):
+            # Envoyée et enregistrée avant l'arrêt, seul l'acquittement manquait
+            self.outbox.ack(entry['id'], recorded['message_id'])
+            return
+        if entry.get('reloaded'):
+            # Arrêt pendant l'envoi : peut-être publiée, jamais repostée
+            self.outbox.drop(entry['id'], 'issue inconnue (redémarrage)')
+            self._flag_unknown_prediction(entry['text'])
+            return
+        if not ours or recorded.get('status') != 'pending':
+            # Effacée (/reset) ou déjà résolue entre-temps
+            self.outbox.drop(entry['id'], 'prédiction obsolète')
+            return
+        last_game = max(self.card_predictor.collected_games, default=0)
+        if last_game >= target or entry['attempts'] >= MAX_ATTEMPTS:
+            self.outbox.drop(entry['id'], 'prédiction obsolète' if last_game >= target else 'tentatives épuisées')
+            self.card_predictor.cancel_prediction(game)
+            return
+        mid = self._send_tracked(PREDICTION, entry['chat_id'], entry['text'], entry_id=entry['id'])
+        if mid:
+            self.card_predictor.attach_message_id(game, mid)
 
     # --- GESTION COMMANDE /deploy ---
     def _handle_command_deploy(self, chat_id: int):
@@ -141,7 +377,6 @@ class TelegramHandlers:
             self.send_message(chat_id, f"📦 **Envoi du nouveau package pack.zip corrigé...**")
             
             # Envoyer le fichier
-            url = f"{self.base_url}/sendDocument"
             with open(zip_filename, 'rb') as f:
                 files = {'document': (zip_filename, f, 'application/zip')}
                 # Compter les données collectées
@@ -153,7 +388,8 @@ class TelegramHandlers:
                     'caption': f'📦 **pack.zip - Nouveau Package Corrigé**\n\n✅ Fichier: pack.zip\n✅ Bilan Auto: Fixé (6h, 12h, 18h, 0h)\n✅ Relance ❌: Fixée (Jeu N+1 avec même costume)\n✅ Vérification: Optimisée\n✅ Port : 10000 (Render.com)\n✅ Délai dépassé: Détecté (N+2)\n\n🎯 **Version du 29/12/2025 - Corrections Finales**\n\n👨‍💻 Développeur: Sossou Kouamé\n🎟️ Code Promo: Koua229',
                     'parse_mode': 'Markdown'
                 }
-                response = requests.post(url, data=data, files=files, timeout=60)
+                with self._network_call():
+                    response = self.api.post('sendDocument', data=data, files=files, timeout=60)
             
             if response.json().get('ok'):
                 logger.info(f"✅ {zip_filename} envoyé avec succès")
@@ -172,9 +408,13 @@ class TelegramHandlers:
             self.send_message(chat_id, "❌ Le moteur de prédiction n'est pas chargé.")
             return
         
+        message, keyboard = self._render_status('collect', self._render_collect)
+        self.send_message(chat_id, message, reply_markup=keyboard)
+
+    def _render_collect(self, snapshot):
         # Récupérer les informations
-        is_active = self.card_predictor.is_inter_mode_active
-        total_collected = len(self.card_predictor.inter_data)
+        is_active = snapshot.inter_mode_active
+        total_collected = snapshot.inter_data_count
         
         # Message d'état
         message = "🧠 **ETAT DU MODE INTELLIGENT**\n\n"
@@ -182,26 +422,16 @@ class TelegramHandlers:
         message += f"Données collectées : {total_collected}\n\n"
         
         # Afficher TOUS les déclencheurs collectés par enseigne
-        if self.card_predictor.inter_data:
-            from collections import defaultdict
-            
-            # Grouper par enseigne de résultat
-            by_result_suit = defaultdict(list)
-            for entry in self.card_predictor.inter_data:
-                result_suit = entry.get('result_suit', '?')
-                trigger = entry.get('declencheur', '?').replace("♥️", "❤️")
-                by_result_suit[result_suit].append(trigger)
+        if total_collected:
+            # Compteurs par enseigne de résultat, tenus à jour par la collecte (du plus fréquent au moins fréquent)
+            by_result_suit = snapshot.trigger_counts
             
             message += "📊 **TOUS LES DÉCLENCHEURS COLLECTÉS:**\n\n"
             
             for suit in ['♠️', '❤️', '♦️', '♣️']:
                 if suit in by_result_suit:
-                    triggers = by_result_suit[suit]
                     message += f"**Pour enseigne {suit}:**\n"
-                    # Compter les occurrences
-                    from collections import Counter
-                    trigger_counts = Counter(triggers)
-                    for trigger, count in trigger_counts.most_common():
+                    for trigger, count in by_result_suit[suit]:
                         message += f"  • {trigger} ({count}x)\n"
                     message += "\n"
         else:
@@ -229,7 +459,7 @@ class TelegramHandlers:
                 {'text': '🔄 Analyser les données', 'callback_data': 'inter_apply'}
             ])
         
-        self.send_message(chat_id, message, reply_markup=keyboard)
+        return message, keyboard
 
     # --- GESTION COMMANDE /bilan (APERÇU DU RAPPORT) ---
     def _handle_command_bilan(self, chat_id: int):
@@ -239,7 +469,9 @@ class TelegramHandlers:
             return
         
         try:
-            msg = self.card_predictor.get_session_report_preview()
+            snapshot = self.snapshot()
+            with self._off_gate():
+                msg = self.card_predictor.get_session_report_preview(snapshot)
             self.send_message(chat_id, msg)
         except Exception as e:
             logger.error(f"❌ Erreur aperçu bilan: {e}")
@@ -253,50 +485,10 @@ class TelegramHandlers:
             return
         
         try:
-            cp = self.card_predictor
-            now = cp.now()
-            
-            message = "🔒 ÉTAT ET INFORMATIQUE SECRET DU BOT\n\n"
-            
-            # TOP en quarantaine
-            qua_list = cp.quarantined_rules if cp.quarantined_rules else {}
-            if qua_list:
-                message += "🔒 TOP EN QUARANTAINE:\n"
-                for key in qua_list.keys():
-                    try:
-                        trigger, suit = key.split("_", 1)
-                        message += f"  • {trigger} → {suit}\n"
-                    except:
-                        message += f"  • {key}\n"
-                message += "\n"
-            else:
-                message += "✅ Aucun TOP en quarantaine\n\n"
-            
-            # Les 5 dernières prédictions
-            recent_preds = sorted(
-                [(k, v) for k, v in cp.predictions.items() if v.get('timestamp')],
-                key=lambda x: x[1].get('timestamp', 0),
-                reverse=True
-            )[:5]
+            now = self.card_predictor.now()
+            head, tail = self._render_status('qua', self._render_qua)
             
-            message += "📊 Les 5 dernières prédictions envoyées\n"
-            if recent_preds:
-                for game_num, pred in recent_preds:
-                    trigger = pred.get('predicted_from_trigger', '?')
-                    suit = pred.get('predicted_costume', '?')
-                    status = pred.get('status', 'pending')
-                    is_inter = "🧠 INTER" if pred.get('is_inter') else "📋 STATIQUE"
-                    status_display = {
-                        'pending': '⏳',
-                        'won': '✅',
-                        'lost': '❌'
-                    }.get(status, '?')
-                    message += f"  • Jeu {game_num}: {suit} ({status_display}) - Déclencheur: {trigger} [{is_inter}]\n"
-            else:
-                message += "  Aucune prédiction\n"
-            message += "\n"
-            
-            # Prochain bilan
+            # Prochain bilan (dépend de l'heure : jamais mis en cache)
             next_report_hour = None
             report_hours = [6, 12, 18, 0]
             for h in report_hours:
@@ -308,37 +500,77 @@ class TelegramHandlers:
             minutes_until = ((next_report_hour - now.hour) * 60 - now.minute) % (24 * 60)
             hours = minutes_until // 60
             mins = minutes_until % 60
-            message += f"⏰ Prochain bilan dans: {hours}h{mins:02d}\n\n"
-            
-            # Mode INTER
-            message += f"🧠 Mode INTER: {'✅ ACTIF' if cp.is_inter_mode_active else '❌ INACTIF'}\n\n"
-            
-            # Données collectées
-            message += f"📈 Donnees collectees: {len(cp.inter_data)} jeux\n"
             
-            # Règles INTER complètes
-            if cp.smart_rules:
-                message += "📋 Regles UTILISER INTELLIGENT :\n\n"
-                rules_by_suit = defaultdict(list)
-                for rule in cp.smart_rules:
-                    rules_by_suit[rule.get('predict', rule.get('result_suit'))].append(rule)
-                
-                for suit in ['♠️', '❤️', '♦️', '♣️']:
-                    if suit in rules_by_suit:
-                        message += f"Pour predire {suit}:\n"
-                        for rule in rules_by_suit[suit]:
-                            trigger = rule.get('trigger', '?')
-                            count = rule.get('count', 0)
-                            message += f"  • {trigger} ({count}x)\n"
-                        message += "\n"
-            else:
-                message += "📋 Pas encore de regles INTER\n"
-            
-            self.send_message(chat_id, message)
+            self.send_message(chat_id, f"{head}⏰ Prochain bilan dans: {hours}h{mins:02d}\n\n{tail}")
         except Exception as e:
             logger.error(f"Erreur /qua : {e}")
             self.send_message(chat_id, f"❌ Erreur : {str(e)}")
 
+    def _render_qua(self, snapshot):
+        """Parties de /qua qui ne dépendent que de l'état : (avant, après) la ligne du prochain bilan."""
+        message = "🔒 ÉTAT ET INFORMATIQUE SECRET DU BOT\n\n"
+        
+        # TOP en quarantaine
+        qua_list = snapshot.quarantined_rules
+        if qua_list:
+            message += "🔒 TOP EN QUARANTAINE:\n"
+            for key in qua_list.keys():
+                try:
+                    trigger, suit = key.split("_", 1)
+                    message += f"  • {trigger} → {suit}\n"
+                except:
+                    message += f"  • {key}\n"
+            message += "\n"
+        else:
+            message += "✅ Aucun TOP en quarantaine\n\n"
+        
+        # Les 5 dernières prédictions
+        recent_preds = snapshot.recent_predictions[:5]
+        
+        message += "📊 Les 5 dernières prédictions envoyées\n"
+        if recent_preds:
+            for game_num, pred in recent_preds:
+                trigger = pred.get('predicted_from_trigger', '?')
+                suit = pred.get('predicted_costume', '?')
+                status = pred.get('status', 'pending')
+                is_inter = "🧠 INTER" if pred.get('is_inter') else "📋 STATIQUE"
+                status_display = {
+                    'pending': '⏳',
+                    'won': '✅',
+                    'lost': '❌'
+                }.get(status, '?')
+                message += f"  • Jeu {game_num}: {suit} ({status_display}) - Déclencheur: {trigger} [{is_inter}]\n"
+        else:
+            message += "  Aucune prédiction\n"
+        message += "\n"
+        head = message
+        
+        # Mode INTER
+        message = f"🧠 Mode INTER: {'✅ ACTIF' if snapshot.inter_mode_active else '❌ INACTIF'}\n\n"
+        
+        # Données collectées
+        message += f"📈 Donnees collectees: {snapshot.inter_data_count} jeux\n"
+        
+        # Règles INTER complètes
+        if snapshot.smart_rules:
+            message += "📋 Regles UTILISER INTELLIGENT :\n\n"
+            rules_by_suit = defaultdict(list)
+            for rule in snapshot.smart_rules:
+                rules_by_suit[rule.get('predict', rule.get('result_suit'))].append(rule)
+            
+            for suit in ['♠️', '❤️', '♦️', '♣️']:
+                if suit in rules_by_suit:
+                    message += f"Pour predire {suit}:\n"
+                    for rule in rules_by_suit[suit]:
+                        trigger = rule.get('trigger', '?')
+                        count = rule.get('count', 0)
+                        message += f"  • {trigger} ({count}x)\n"
+                    message += "\n"
+        else:
+            message += "📋 Pas encore de regles INTER\n"
+        
+        return head, message
+
     # --- GESTION COMMANDE /reset ---
     def _handle_command_reset(self, chat_id: int):
         """⚠️ RÉINITIALISE COMPLÈTEMENT LE BOT - efface TOUT sauf les IDs des canaux."""
@@ -411,7 +643,7 @@ class TelegramHandlers:
         action = parts[1] if len(parts) > 1 else 'status'
         
         if action == 'activate':
-            self.card_predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
+            self._analyze_inter(chat_id)
             self.send_message(chat_id, "✅ **MODE INTER ACTIVÉ**\nL'analyse Top 2 par enseigne est en cours...")
         
         elif action == 'default':
@@ -420,7 +652,9 @@ class TelegramHandlers:
             self.send_message(chat_id, "❌ **MODE INTER DÉSACTIVÉ**\nRetour aux règles statiques.")
             
         elif action == 'status':
-            msg, kb = self.card_predictor.get_inter_status()
+            snapshot = self.snapshot()
+            with self._off_gate():
+                msg, kb = self.card_predictor.get_inter_status(snapshot)
             self.send_message(chat_id, msg, reply_markup=kb)
         
         else:
@@ -436,16 +670,16 @@ class TelegramHandlers:
 
         # Actions INTER
         if data == 'inter_apply':
-            self.card_predictor.analyze_and_set_smart_rules(chat_id=chat_id, force_activate=True)
+            self._analyze_inter(chat_id)
             # Mise à jour du message pour confirmer l'action
-            msg, kb = self.card_predictor.get_inter_status()
+            msg, kb = self.card_predictor.get_inter_status(self.snapshot())
             self.send_message(chat_id, msg, message_id=msg_id, edit=True, reply_markup=kb)
         
         elif data == 'inter_default':
             self.card_predictor.is_inter_mode_active = False
             self.card_predictor._save_all_data()
             # Mise à jour du message pour confirmer l'action
-            msg, kb = self.card_predictor.get_inter_status()
+            msg, kb = self.card_predictor.get_inter_status(self.snapshot())
             self.send_message(chat_id, msg, message_id=msg_id, edit=True, reply_markup=kb)
             
         # Actions CONFIG
@@ -455,10 +689,151 @@ class TelegramHandlers:
             else:
                 type_c = 'source' if 'source' in data else 'prediction'
                 self.card_predictor.set_channel_id(chat_id, type_c)
+                self.shards.reindex()
                 self.send_message(chat_id, f"✅ Ce canal est maintenant défini comme **{type_c.upper()}**.\n(L'ID forcé dans le code sera utilisé si le bot redémarre sans ce fichier de config)", message_id=msg_id, edit=True)
 
+    # --- ROUTAGE DES COMMANDES ---
+    def chat_role(self, chat_id: int) -> str:
+        """Rôle du chat pour le shard qui le suit : canal source, canal de prédiction ou chat d'administration."""
+        predictor = self.shards.for_chat(chat_id).predictor
+        if str(chat_id) == str(predictor.target_channel_id):
+            return ROLE_SOURCE
+        if str(chat_id) == str(predictor.prediction_channel_id):
+            return ROLE_PREDICTION
+        return ROLE_ADMIN
+
+    def _route_command(self, chat_id: int, text: str, role: str):
+        """Commande exacte (/stat n'attrape plus /status) : le jeton est extrait une fois puis cherché dans self.commands."""
+        if not text.startswith('/'):
+            return
+        command = text.split(maxsplit=1)[0].split('@', 1)[0].lower()
+        handler = self.commands.get(command)
+        if handler is None:
+            COMMANDS_TOTAL.inc(command='unknown', role=role)
+            return
+        COMMANDS_TOTAL.inc(command=command, role=role)
+        with COMMAND_SECONDS.time(command=command):
+            shard = self.shards.current()
+            if command in COMMANDS_WITH_TABLE:
+                text, shard = self._select_table(command, text)
+                if shard is None:
+                    self.send_message(chat_id, f"❌ Table inconnue. Tables suivies : {', '.join(s.name for s in self.shards)}")
+                    return
+            with self._on_shard(shard):
+                if command in COMMANDS_WITH_TEXT:
+                    handler(chat_id, text)
+                else:
+                    handler(chat_id)
+
+    def _select_table(self, command: str, text: str) -> Tuple[str, Optional[Shard]]:
+        """Table désignée par le dernier argument, retirée du texte ; la table courante sans argument ; (texte, None) si inconnue."""
+        parts = text.split()
+        args = parts[1:]
+        # /inter : l'action (status, activate, default) précède la table ; `/inter <table>` vaut `/inter status <table>`
+        # (un argument unique qui n'est ni une action ni une table reste une action, l'aide est affichée)
+        kept = 0
+        if command == '/inter' and not (len(args) == 1 and args[0].lower() not in INTER_ACTIONS and self.shards.get(args[0])):
+            kept = 1
+        if len(args) <= kept:
+            return text, self.shards.current()
+        return ' '.join(parts[:1 + kept]), self.shards.get(args[-1])
+
+    @contextmanager
+    def _on_shard(self, shard: Shard):
+        """Commande sur une autre table que celle du chat : son contexte et son verrou, à la place de ceux de la table courante."""
+        if shard is self.shards.current():
+            yield
+            return
+        with (self.gate.released() if self.gate else nullcontext()), self.shards.using(shard), shard.gate:
+            try:
+                yield
+            finally:
+                # Écrivain de cette table le temps de la commande : il republie sa vue immuable
+                shard.publish_snapshot()
+
+    def _handle_command_config(self, chat_id: int):
+        kb = {'inline_keyboard': [[{'text': 'Source', 'callback_data': 'config_source'}, {'text': 'Prediction', 'callback_data': 'config_prediction'}, {'text': 'Annuler', 'callback_data': 'config_cancel'}]]}
+        self.send_message(chat_id, "⚙️ **CONFIGURATION**\nQuel est le rôle de ce canal ?", reply_markup=kb)
+
+    def _handle_command_start(self, chat_id: int):
+        self.send_message(chat_id, WELCOME_MESSAGE)
+
+    def _handle_command_stat(self, chat_id: int):
+        self.send_message(chat_id, self._render_status('stat', self._render_stat))
+
+    def _render_stat(self, snapshot) -> str:
+        sid = snapshot.target_channel_id or self.card_predictor.HARDCODED_SOURCE_ID or "Non défini"
+        pid = snapshot.prediction_channel_id or self.card_predictor.HARDCODED_PREDICTION_ID or "Non défini"
+        mode = "IA" if snapshot.inter_mode_active else "Statique"
+        return f"📊 **STATUS**\nSource (Input): `{sid}`\nPrédiction (Output): `{pid}`\nMode: {mode}"
+
+    # --- CANAL SOURCE (CHEMIN RAPIDE) ---
+    def _handle_source_message(self, text: str):
+        """Message du canal source : collecte, vérification puis prédiction."""
+        # A. Collecter TOUJOURS (même messages temporaires ⏰)
+        with STAGE_SECONDS.time(stage='parse'):
+            game_num = self.card_predictor.extract_game_number(text)
+        if game_num:
+            with STAGE_SECONDS.time(stage='collect'):
+                self.card_predictor.collect_inter_data(game_num, text)
+        
+        # B. Vérifier UNIQUEMENT sur messages finalisés (✅ ou 🔰)
+        if self.card_predictor.has_completion_indicators(text) or '🔰' in text:
+            with priority_class(VERIFY):
+                with STAGE_SECONDS.time(stage='verify'):
+                    res = self.card_predictor._verify_prediction_common(text)
+                
+                if res and res['type'] == 'edit_message':
+                    mid_to_edit = res.get('message_id_to_edit')
+                    pred_channel = self.card_predictor.prediction_channel_id
+                    
+                    if mid_to_edit and pred_channel: 
+                        self._send_tracked(EDIT, pred_channel, res['new_message'], message_id=mid_to_edit)
+        
+        # C. Prédire (même sur messages temporaires ⏰), sauf délestage en surcharge (jeu déjà dépassé)
+        if prediction_allowed():
+            with priority_class(PREDICT):
+                with STAGE_SECONDS.time(stage='predict'):
+                    ok, num, val, is_inter = self.card_predictor.should_predict(text)
+                if ok and num and val:
+                    txt = self.card_predictor.prepare_prediction_text(num, val)
+                    pred_channel = self.card_predictor.prediction_channel_id
+                    if pred_channel:
+                        trigger = self.card_predictor._last_trigger_used or '?'  # ✅ Assurer str, jamais None
+                        meta = {'game': num, 'suit': val, 'is_inter': is_inter or False, 'trigger': trigger,
+                                'rule_index': self.card_predictor._last_rule_index}
+                        # Intention puis prédiction (sans message_id) enregistrées avant l'envoi : un arrêt ou un
+                        # timeout pendant l'appel ne conduit jamais à reposter
+                        entry_id = self.outbox.record(PREDICTION, pred_channel, txt, meta=meta)
+                        self.card_predictor.make_prediction(num, val, None, is_inter=is_inter or False, trigger_used=trigger)
+                        mid = self._send_tracked(PREDICTION, pred_channel, txt, meta=meta, entry_id=entry_id)
+                        if mid:
+                            self.card_predictor.attach_message_id(num, mid)
+
+    # --- LOTS D'UPDATES (MODE POLLING) ---
+    def handle_updates(self, updates: List[Dict[str, Any]]):
+        """Traite un lot d'updates dans l'ordre avec une seule sauvegarde de l'état à la fin du lot."""
+        if not self.card_predictor: return
+        with ExitStack() as stack:
+            for shard in self.shards:
+                stack.enter_context(shard.predictor.deferred_save())
+            for update in updates:
+                PROFILER.profile_once(self.handle_update, update)
+
     # --- UPDATES (PARTIE CORRIGÉE) ---
     def handle_update(self, update: Dict[str, Any]):
+        # Shard du chat (verrou propre à cette table en mode parallèle), puis budget de temps commun
+        # à tous les appels sortants de cet update
+        shard = self.shards.for_chat(update_chat_key(update))
+        name = shard.label if shard else DEFAULT_SHARD
+        with self.shards.using(shard), ((shard and shard.gate) or nullcontext()), SHARD_UPDATE_SECONDS.time(shard=name):
+            with deadline_budget(self.update_budget):
+                self._handle_update(update)
+            # Toujours sous le verrou : vue immuable republiée si l'update a modifié l'état
+            if shard:
+                shard.publish_snapshot()
+
+    def _handle_update(self, update: Dict[str, Any]):
         try:
             if not self.card_predictor: return
 
@@ -468,64 +843,15 @@ class TelegramHandlers:
                 if not msg: return
                 chat_id = msg.get('chat', {}).get('id')
                 text = msg.get('text', '')
-                user_id = msg.get('from', {}).get('id', 0)
                 if not chat_id or not text: return
-
-                if not self._check_rate_limit(user_id): return
                 
-                # Commandes (le code des commandes reste inchangé)
-                if text.startswith('/inter'):
-                    self._handle_command_inter(chat_id, text)
-                elif text.startswith('/config'):
-                    kb = {'inline_keyboard': [[{'text': 'Source', 'callback_data': 'config_source'}, {'text': 'Prediction', 'callback_data': 'config_prediction'}, {'text': 'Annuler', 'callback_data': 'config_cancel'}]]}
-                    self.send_message(chat_id, "⚙️ **CONFIGURATION**\nQuel est le rôle de ce canal ?", reply_markup=kb)
-                elif text.startswith('/start'):
-                    self.send_message(chat_id, WELCOME_MESSAGE)
-                elif text.startswith('/stat'):
-                    sid = self.card_predictor.target_channel_id or self.card_predictor.HARDCODED_SOURCE_ID or "Non défini"
-                    pid = self.card_predictor.prediction_channel_id or self.card_predictor.HARDCODED_PREDICTION_ID or "Non défini"
-                    mode = "IA" if self.card_predictor.is_inter_mode_active else "Statique"
-                    self.send_message(chat_id, f"📊 **STATUS**\nSource (Input): `{sid}`\nPrédiction (Output): `{pid}`\nMode: {mode}")
-                elif text.startswith('/deploy'):
-                    self._handle_command_deploy(chat_id)
-                elif text.startswith('/collect'):
-                    self._handle_command_collect(chat_id)
-                elif text.startswith('/qua'):
-                    self._handle_command_qua(chat_id)
-                elif text.startswith('/reset'):
-                    self._handle_command_reset(chat_id)
-                elif text.startswith('/bilan'):
-                    self._handle_command_bilan(chat_id)
-                
-                # Traitement Canal Source
-                elif str(chat_id) == str(self.card_predictor.target_channel_id):
-                    
-                    # A. Collecter TOUJOURS (même messages temporaires ⏰)
-                    game_num = self.card_predictor.extract_game_number(text)
-                    if game_num:
-                        self.card_predictor.collect_inter_data(game_num, text)
-                    
-                    # B. Vérifier UNIQUEMENT sur messages finalisés (✅ ou 🔰)
-                    if self.card_predictor.has_completion_indicators(text) or '🔰' in text:
-                        res = self.card_predictor._verify_prediction_common(text)
-                        
-                        if res and res['type'] == 'edit_message':
-                            mid_to_edit = res.get('message_id_to_edit')
-                            pred_channel = self.card_predictor.prediction_channel_id
-                            
-                            if mid_to_edit and pred_channel: 
-                                self.send_message(pred_channel, res['new_message'], message_id=mid_to_edit, edit=True)
-                    
-                    # C. Prédire (même sur messages temporaires ⏰)
-                    ok, num, val, is_inter = self.card_predictor.should_predict(text)
-                    if ok and num and val:
-                        txt = self.card_predictor.prepare_prediction_text(num, val)
-                        pred_channel = self.card_predictor.prediction_channel_id
-                        if pred_channel:
-                            mid = self.send_message(pred_channel, txt)
-                            if mid:
-                                trigger = self.card_predictor._last_trigger_used or '?'  # ✅ Assurer str, jamais None
-                                self.card_predictor.make_prediction(num, val, mid, is_inter=is_inter or False, trigger_used=trigger)
+                # Rôle du chat d'abord : le canal source ne passe ni par le limiteur de débit ni par la
+                # recherche de commande (sauf message commençant par '/', ex: /config pour reconfigurer le canal)
+                role = self.chat_role(chat_id)
+                if role == ROLE_SOURCE and not text.startswith('/'):
+                    self._handle_source_message(text)
+                elif role == ROLE_SOURCE or self._check_rate_limit(msg, role):
+                    self._route_command(chat_id, text, role)
 
             # 2. Messages édités (CRITIQUE pour vérification)
             elif ('edited_message' in update and 'text' in update['edited_message']) or ('edited_channel_post' in update and 'text' in update['edited_channel_post']):
@@ -537,22 +863,26 @@ class TelegramHandlers:
                 if not chat_id or not text: return
                 
                 # Traitement Canal Source - Vérification sur messages édités
-                if str(chat_id) == str(self.card_predictor.target_channel_id):
+                if self.chat_role(chat_id) == ROLE_SOURCE:
                     # Collecter TOUJOURS
-                    game_num = self.card_predictor.extract_game_number(text)
+                    with STAGE_SECONDS.time(stage='parse'):
+                        game_num = self.card_predictor.extract_game_number(text)
                     if game_num:
-                        self.card_predictor.collect_inter_data(game_num, text)
+                        with STAGE_SECONDS.time(stage='collect'):
+                            self.card_predictor.collect_inter_data(game_num, text)
                     
                     # Vérifier UNIQUEMENT sur messages finalisés (✅ ou 🔰)
                     if self.card_predictor.has_completion_indicators(text) or '🔰' in text:
-                        res = self.card_predictor.verify_prediction_from_edit(text)
-                        
-                        if res and res['type'] == 'edit_message':
-                            mid_to_edit = res.get('message_id_to_edit')
-                            pred_channel = self.card_predictor.prediction_channel_id
+                        with priority_class(VERIFY):
+                            with STAGE_SECONDS.time(stage='verify'):
+                                res = self.card_predictor.verify_prediction_from_edit(text)
                             
-                            if mid_to_edit and pred_channel:
-                                self.send_message(pred_channel, res['new_message'], message_id=mid_to_edit, edit=True)
+                            if res and res['type'] == 'edit_message':
+                                mid_to_edit = res.get('message_id_to_edit')
+                                pred_channel = self.card_predictor.prediction_channel_id
+                                
+                                if mid_to_edit and pred_channel:
+                                    self._send_tracked(EDIT, pred_channel, res['new_message'], message_id=mid_to_edit)
 
             # 3. Callbacks
             elif 'callback_query' in update:
@@ -567,5 +897,9 @@ class TelegramHandlers:
                          self.send_message(m['chat']['id'], "✨ Merci de m'avoir ajouté ! Veuillez utiliser `/config` pour définir mon rôle (Source ou Prédiction).")
 
 
+            # Reprise des envois en échec (prédictions, éditions de résultat)
+            if self.outbox.has_retry_due():
+                self._retry_outbox()
+
         except Exception as e:
             logger.error(f"Update error: {e}")
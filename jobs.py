@@ -0,0 +1,192 @@
+# jobs.py
+
+"""
+Tâches planifiées du bot (heure du Bénin) : reset quotidien, messages de
+démarrage de session et bilans. Partagées par main.py (APScheduler) et
+les autres points d'entrée.
+"""
+import logging
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Tuple
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from card_predictor import BENIN_TZ
+
+logger = logging.getLogger(__name__)
+
+# Fichiers à EFFACER COMPLÈTEMENT lors du reset quotidien
+FILES_TO_CLEAR = [
+    'predictions.json',
+    'inter_data.json',
+    'smart_rules.json',
+    'collected_games.json',
+    'sequential_history.json',
+    'pending_edits.json',
+    'quarantined_rules.json',
+    'last_prediction_time.json',
+    'last_predicted_game_number.json',
+    'consecutive_fails.json',
+    'single_trigger_until.json',
+    'inter_mode_status.json',
+    'last_analysis_time.json',
+    'last_inter_update.json',
+    'last_report_sent.json',
+    'wait_until_next_update.json'
+]
+
+STARTUP_HOURS = [1, 9, 15, 21]
+REPORT_HOURS = [6, 12, 18, 0]
+
+
+def reset_all_data(predictor):
+    """
+    Reset complet à 00h59 heure du Bénin:
+    - EFFACE TOUT (prédictions, INTER, smart rules, collecte, etc.)
+    - GARDE SEULEMENT les IDs canaux
+    - RÉACTIVE le mode INTER automatiquement
+    - RÉINITIALISE la collecte à zéro
+    """
+    try:
+        # Effacer tous les fichiers
+        for file in FILES_TO_CLEAR:
+            path = predictor.data_path(file)
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"🗑️ Supprimé: {path}")
+
+        # Forcer la réinitialisation complète
+        predictor.predictions = {}
+        predictor.inter_data = []
+        predictor.smart_rules = []
+        predictor.collected_games = set()
+        predictor.sequential_history = {}
+        predictor.pending_edits = {}
+        predictor.quarantined_rules = {}
+        predictor.last_prediction_time = 0
+        predictor.last_predicted_game_number = 0
+        predictor.consecutive_fails = 0
+        predictor.single_trigger_until = 0
+        predictor.last_analysis_time = 0
+        predictor.last_inter_update_time = 0
+        predictor.last_report_sent = {}
+        predictor.wait_until_next_update = 0
+
+        # ✅ RÉACTIVER le mode INTER automatiquement
+        predictor.is_inter_mode_active = True
+        predictor._save_all_data()
+
+        logger.info("🔄 RESET COMPLET EFFECTUÉ À 00h59 (BÉNIN):")
+        logger.info("   ✅ TOUT EFFACÉ (prédictions, INTER, smart rules, collecte, etc.)")
+        logger.info("   ✅ CONSERVÉ: IDs canaux (channels_config.json)")
+        logger.info("   ✅ MODE INTER: RÉACTIVÉ automatiquement")
+        logger.info("   ✅ COLLECTE: Réinitialisée à zéro")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors du reset complet: {e}")
+
+
+def _render_startup_state(predictor) -> str:
+    inter_active = "✅ ACTIF" if predictor.is_inter_mode_active else "❌ INACTIF"
+    return (f"🧠 Mode Intelligent : {inter_active}\n"
+            f"🔄 Mise à jour des règles : {predictor.get_inter_version()}\n\n")
+
+
+def send_startup_message(predictor):
+    """Envoie un message de démarrage de session avec la dernière mise à jour INTER."""
+    try:
+        if not predictor.telegram_message_sender or not predictor.prediction_channel_id:
+            return
+
+        now = predictor.now()
+        session_label = predictor.current_session_label()
+
+        msg = (f"🎬 **LES PRÉDICTIONS REPRENNENT !**\n\n"
+               f"⏰ Heure de Bénin : {now.strftime('%H:%M:%S - %d/%m/%Y')}\n"
+               f"📅 Session : {session_label}\n"
+               f"{predictor.read_model.render('startup', lambda: _render_startup_state(predictor))}"
+               f"👨‍💻 **Développeur** : Sossou Kouamé\n"
+               f"🎟️ **Code Promo** : Koua229")
+
+        predictor.telegram_message_sender(predictor.prediction_channel_id, msg)
+        logger.info("📢 Message de démarrage de session envoyé")
+    except Exception as e:
+        logger.error(f"❌ Erreur envoi message démarrage: {e}")
+
+
+def send_session_reports(predictor):
+    """Envoie les rapports de session à 6h, 12h, 18h, 00h (heure du Bénin)."""
+    try:
+        predictor.check_and_send_reports()
+    except Exception as e:
+        logger.error(f"❌ Erreur envoi rapport: {e}")
+
+
+# --- CALENDRIER ---
+
+ScheduledJob = namedtuple('ScheduledJob', ['id', 'name', 'hour', 'minute', 'func'])
+
+SCHEDULE = (
+    [ScheduledJob('daily_prediction_reset', 'Réinitialisation quotidienne des prédictions automatiques', 0, 59, reset_all_data)]
+    + [ScheduledJob(f'startup_message_{h}h', f'Message redémarrage à {h}h00', h, 0, send_startup_message) for h in STARTUP_HOURS]
+    + [ScheduledJob(f'session_report_{h}h', f'Rapport de session à {h}h00', h, 0, send_session_reports) for h in REPORT_HOURS]
+)
+
+
+def run_job(job: ScheduledJob, predictor) -> None:
+    if predictor is None:
+        logger.error(f"❌ card_predictor non initialisé ({job.id})")
+        return
+    job.func(predictor)
+
+
+def next_run_time(job: ScheduledJob, now: datetime) -> datetime:
+    """Prochaine exécution de la tâche strictement après `now` (datetime aware)."""
+    local_now = now.astimezone(BENIN_TZ)
+    candidate = local_now.replace(hour=job.hour, minute=job.minute, second=0, microsecond=0)
+    if candidate <= local_now:
+        candidate += timedelta(days=1)
+    return BENIN_TZ.normalize(candidate)
+
+
+def due_jobs(since: datetime, until: datetime) -> List[Tuple[datetime, ScheduledJob]]:
+    """Exécutions prévues dans l'intervalle ]since, until], dans l'ordre chronologique."""
+    due = []
+    for job in SCHEDULE:
+        run_at = next_run_time(job, since)
+        while run_at <= until:
+            due.append((run_at, job))
+            run_at = next_run_time(job, run_at)
+    due.sort(key=lambda item: (item[0], SCHEDULE.index(item[1])))
+    return due
+
+
+def run_job_on_shards(job: ScheduledJob, shards: Iterable, wait: bool = True) -> None:
+    """
+    Dépose la tâche dans la file de l'écrivain unique de chaque table (actor.py) : elle s'exécute sous
+    le verrou de la logique métier du shard, jamais en même temps que les updates de cette table.
+    Les tables avancent en parallèle ; avec wait=False, le thread appelant n'attend pas la fin.
+    """
+    futures = [shard.actor.submit(run_job, job, shard.predictor) for shard in shards]
+    if wait:
+        for future in futures:
+            future.exception()
+
+
+def create_background_scheduler(get_shards: Callable[[], Iterable]):
+    """Planificateur APScheduler (thread) ; les shards sont résolus à chaque exécution."""
+    def execute(job):
+        run_job_on_shards(job, get_shards(), wait=False)
+
+    scheduler = BackgroundScheduler()
+    for job in SCHEDULE:
+        scheduler.add_job(
+            lambda job=job: execute(job),
+            trigger=CronTrigger(hour=job.hour, minute=job.minute, timezone=BENIN_TZ),
+            id=job.id,
+            name=job.name,
+            replace_existing=True
+        )
+    return scheduler
@@ -0,0 +1,198 @@
+# leader.py
+
+"""
+Mode multi-workers (gunicorn --workers N, MULTI_WORKER=true).
+
+Un seul processus, le leader, possède l'état : bots, moteurs (CardPredictor),
+fichiers JSON, planificateur et ingestion (setWebhook ou getUpdates). Les
+autres workers (followers) ne font qu'accepter les requêtes HTTP : le corps de
+chaque webhook est transmis au leader sur une socket Unix locale, et la
+réponse du leader (200, 503 si sa file est pleine...) est renvoyée telle
+quelle à Telegram.
+
+Élection : verrou exclusif fcntl.flock sur LEADER_LOCK_FILE. Le noyau le
+relâche à la mort du processus ; les followers retentent de le prendre toutes
+les `retry_interval` secondes et le premier qui y parvient devient leader
+(rechargement de l'état depuis les fichiers JSON, reprise du journal des
+envois). Pendant la bascule, les followers répondent 503 : Telegram re-livre.
+Si le démarrage du leader échoue, le worker relâche le verrou et s'arrête
+(état à moitié démarré) : gunicorn le remplace et un autre worker est élu.
+
+Protocole : une ligne JSON par requête {"bot": nom|null, "update": {...}},
+une ligne JSON par réponse {"status": code, "body": ...}, sur une connexion
+persistante par thread de follower.
+"""
+import fcntl
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+WORKER_LEADER = REGISTRY.gauge('bot_worker_leader', "1 si ce worker est le leader (mode multi-workers)")
+FORWARDED = REGISTRY.counter('bot_leader_forwarded_total', "Webhooks transmis au leader par ce worker, par code de réponse", ('status',))
+FORWARD_SECONDS = REGISTRY.histogram('bot_leader_forward_seconds', "Durée d'un aller-retour webhook follower → leader")
+
+# Réponse d'un follower quand aucun leader n'est joignable (bascule en cours)
+UNAVAILABLE = (503, {'status': 'no leader'})
+
+# Code de sortie d'un worker dont le démarrage en leader a échoué (gunicorn relance les workers sortis ainsi)
+LEADER_START_FAILED = 1
+
+
+class LeaderElection:
+    """Verrou exclusif sur un fichier : le détenteur est le leader ; les autres retentent en arrière-plan."""
+
+    def __init__(self, lock_file: str, on_elected: Callable[[], None], retry_interval: float = 1.0):
+        self.lock_file = lock_file
+        self.on_elected = on_elected
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._fd: Optional[int] = None
+        WORKER_LEADER.set_function(lambda: 1 if self.is_leader else 0)
+
+    def start(self) -> bool:
+        """Tente l'élection ; en cas d'échec, un thread surveille le verrou. Retourne True si leader."""
+        if self._try_acquire():
+            self._elected()
+            return True
+        logger.info(f"👥 Worker {os.getpid()} follower : webhooks transmis au leader")
+        threading.Thread(target=self._watch, name='leader-election', daemon=True).start()
+        return False
+
+    def _try_acquire(self) -> bool:
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # Descripteur gardé ouvert toute la vie du processus : le verrou tombe avec lui
+        self._fd = fd
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        return True
+
+    def _watch(self) -> None:
+        while not self._try_acquire():
+            time.sleep(self.retry_interval)
+        logger.warning(f"👑 Worker {os.getpid()} prend la relève du leader")
+        self._elected()
+
+    def _elected(self) -> None:
+        self.is_leader = True
+        logger.info(f"👑 Worker {os.getpid()} leader : état, planificateur et ingestion")
+        try:
+            self.on_elected()
+        except Exception as e:
+            # Bots, planificateur... peut-être à moitié démarrés : le worker ne garde pas le verrou sans servir
+            logger.critical(f"🚨 Erreur au démarrage du leader: {e} : verrou relâché, worker {os.getpid()} arrêté")
+            self.release()
+            os._exit(LEADER_START_FAILED)
+
+    def release(self) -> None:
+        """Relâche le verrou : ce worker n'est plus leader."""
+        self.is_leader = False
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class _UpdateRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                status, body = self.server.deliver(request.get('bot'), request.get('update'))
+            except Exception as e:
+                logger.error(f"❌ Erreur traitement d'un webhook transmis: {e}")
+                status, body = 500, 'Error'
+            self.wfile.write(json.dumps({'status': status, 'body': body}).encode() + b'\n')
+            self.wfile.flush()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class UpdateServer:
+    """Côté leader : reçoit les webhooks des followers et les livre via `deliver(bot, update) -> (status, body)`."""
+
+    def __init__(self, socket_path: str, deliver: Callable[[Optional[str], Dict[str, Any]], Tuple[int, Any]]):
+        self.socket_path = socket_path
+        self.deliver = deliver
+        self._server: Optional[_ThreadingUnixServer] = None
+
+    def start(self) -> None:
+        # Socket laissée par un leader mort : le verrou est à nous, elle peut être remplacée
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = _ThreadingUnixServer(self.socket_path, _UpdateRequestHandler)
+        self._server.deliver = self.deliver
+        threading.Thread(target=self._server.serve_forever, name='leader-ipc', daemon=True).start()
+        logger.info(f"📡 Leader à l'écoute des followers sur {self.socket_path}")
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class UpdateForwarder:
+    """Côté follower : transmet un webhook au leader et rend sa réponse (status, body)."""
+
+    def __init__(self, socket_path: str, timeout: float = 60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def forward(self, bot_name: Optional[str], update: Dict[str, Any]) -> Tuple[int, Any]:
+        payload = json.dumps({'bot': bot_name, 'update': update}).encode() + b'\n'
+        start = time.perf_counter()
+        # Deux essais : la connexion persistante peut dater d'un leader disparu
+        for attempt in range(2):
+            try:
+                stream = self._stream()
+                stream.write(payload)
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("connexion fermée par le leader")
+                response = json.loads(line)
+                FORWARD_SECONDS.observe(time.perf_counter() - start)
+                FORWARDED.inc(status=str(response['status']))
+                return response['status'], response['body']
+            except (OSError, ValueError) as e:
+                self._close()
+                if attempt:
+                    logger.warning(f"⚠️ Leader injoignable ({e}) : webhook refusé (503)")
+        FORWARDED.inc(status=str(UNAVAILABLE[0]))
+        return UNAVAILABLE
+
+    def _stream(self):
+        stream = getattr(self._local, 'stream', None)
+        if stream is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            stream = sock.makefile('rwb')
+            self._local.sock, self._local.stream = sock, stream
+        return stream
+
+    def _close(self) -> None:
+        for name in ('stream', 'sock'):
+            resource = getattr(self._local, name, None)
+            if resource is not None:
+                try:
+                    resource.close()
+                except OSError:
+                    pass
+            setattr(self._local, name, None)
@@ -0,0 +1,133 @@
+# load_shedding.py
+
+"""
+Délestage quand la file d'updates déborde (rafale après une panne, re-livraisons).
+
+Au-delà de SHED_QUEUE_DEPTH updates en attente (et jusqu'à ce que la file
+redescende sous la moitié de ce seuil), les files (UpdateQueue, ChatDispatcher)
+appliquent trois politiques :
+
+- superseded_draft : un brouillon ⏰ du canal source dont une version plus
+  récente (édition du même message) est déjà en file est ignoré ; la version
+  récente fera la collecte et la vérification ;
+- stale_prediction : un jeu N alors qu'un jeu >= N + SHED_STALE_GAMES est déjà
+  arrivé est traité sans prédiction (collecte et vérification inchangées) ;
+  la prédiction viserait un jeu déjà joué ;
+- deferred_admin : commandes et callbacks sont mis de côté, puis traités dans
+  l'ordre une fois la file revenue à la normale.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+from priority import ADMIN, PREDICT
+
+logger = logging.getLogger(__name__)
+
+SHED_TOTAL = REGISTRY.counter('bot_shed_total', "Updates délestés ou dégradés en surcharge, par politique", ('queue', 'policy'))
+OVERLOADED = REGISTRY.gauge('bot_overloaded', "1 si la file est en surcharge (délestage actif)", ('queue',))
+
+# Décisions de LoadShedder.decide
+PROCESS = 'process'
+DROP = 'drop'
+DEFER = 'defer'
+SKIP_PREDICTION = 'skip_prediction'
+
+_local = threading.local()
+
+
+def prediction_allowed() -> bool:
+    """False pendant le traitement d'un update dont la prédiction a été délestée."""
+    return not getattr(_local, 'suspended', False)
+
+
+@contextmanager
+def predictions_suspended(active: bool = True):
+    previous = getattr(_local, 'suspended', False)
+    _local.suspended = active or previous
+    try:
+        yield
+    finally:
+        _local.suspended = previous
+
+
+def _source_message(update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return update.get('channel_post') or update.get('edited_channel_post') or update.get('message') or update.get('edited_message')
+
+
+def _message_key(update: Dict[str, Any]) -> Optional[Tuple[Any, Any]]:
+    msg = _source_message(update)
+    if not msg or 'message_id' not in msg:
+        return None
+    return msg.get('chat', {}).get('id'), msg['message_id']
+
+
+class LoadShedder:
+    """Suit la charge d'une file et décide, update par update, du traitement à appliquer."""
+
+    def __init__(self, threshold: int, classify: Callable[[Dict[str, Any]], str],
+                 extract_game_number: Callable[[str], Optional[int]], stale_games: int = 2, name: str = 'webhook'):
+        self.threshold = threshold
+        self.resume_below = threshold // 2
+        self.stale_games = stale_games
+        self.name = name
+        self.overloaded = False
+        self._classify = classify
+        self._extract_game_number = extract_game_number
+        # Dernier update_id mis en file par message (chat, message_id) et plus grand numéro de jeu reçu
+        self._latest: Dict[Tuple[Any, Any], int] = {}
+        self._max_game = 0
+        self._lock = threading.Lock()
+        OVERLOADED.set_function(lambda: 1 if self.overloaded else 0, queue=name)
+
+    def note_enqueued(self, update: Dict[str, Any]) -> None:
+        """
+        À appeler à la mise en file. Un update refusé (file pleine) reste noté :
+        Telegram le re-livrera, la version plus récente finira donc par être traitée.
+        """
+        key = _message_key(update)
+        msg = _source_message(update)
+        game = self._extract_game_number(msg.get('text', '')) if msg and msg.get('text') else None
+        with self._lock:
+            if key is not None:
+                self._latest[key] = max(self._latest.get(key, 0), update.get('update_id', 0))
+            if game and game > self._max_game:
+                self._max_game = game
+
+    def update_load(self, depth: int) -> bool:
+        """Met à jour l'état de surcharge (avec hystérésis) selon la profondeur de file ; retourne l'état."""
+        if not self.overloaded and depth >= self.threshold:
+            self.overloaded = True
+            logger.warning(f"🚦 File '{self.name}' en surcharge ({depth} updates) : délestage activé")
+        elif self.overloaded and depth <= self.resume_below:
+            self.overloaded = False
+            logger.info(f"🚦 File '{self.name}' revenue à {depth} updates : délestage désactivé")
+        return self.overloaded
+
+    def decide(self, update: Dict[str, Any], priority: Optional[str] = None) -> str:
+        """Décision pour un update sur le point d'être traité (PROCESS, DROP, DEFER ou SKIP_PREDICTION)."""
+        key = _message_key(update)
+        update_id = update.get('update_id', 0)
+        with self._lock:
+            latest = self._latest.get(key, 0) if key is not None else 0
+            if key is not None and latest <= update_id:
+                self._latest.pop(key, None)
+            max_game = self._max_game
+
+        if not self.overloaded:
+            return PROCESS
+        priority = priority or self._classify(update)
+        if priority == ADMIN:
+            SHED_TOTAL.inc(queue=self.name, policy='deferred_admin')
+            return DEFER
+        if priority == PREDICT and latest > update_id:
+            SHED_TOTAL.inc(queue=self.name, policy='superseded_draft')
+            return DROP
+        msg = _source_message(update)
+        game = self._extract_game_number(msg.get('text', '')) if msg and msg.get('text') else None
+        if game and max_game >= game + self.stale_games:
+            SHED_TOTAL.inc(queue=self.name, policy='stale_prediction')
+            return SKIP_PREDICTION
+        return PROCESS
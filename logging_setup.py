@@ -0,0 +1,90 @@
+# logging_setup.py
+
+"""
+Configuration des logs du processus.
+
+- LOG_LEVEL : niveau global (INFO par défaut)
+- LOG_LEVELS : niveaux par module, ex: "card_predictor=DEBUG,handlers=WARNING"
+- LOG_QUEUE : "true" (défaut) pour passer les enregistrements par une file ;
+  l'écriture sur stderr se fait alors dans le thread du QueueListener et
+  jamais dans le thread qui traite le webhook.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from typing import IO, Dict, Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_module_names = set()
+
+
+def parse_level(value: str) -> int:
+    level = logging.getLevelName(value.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Niveau de log invalide: {value}")
+    return level
+
+
+def parse_module_levels(spec: str) -> Dict[str, int]:
+    """"mod=NIVEAU,mod2=NIVEAU" → {mod: niveau}."""
+    levels = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, sep, value = item.partition('=')
+        if not sep or not name.strip():
+            raise ValueError(f"LOG_LEVELS invalide: '{item}' (attendu: module=NIVEAU)")
+        levels[name.strip()] = parse_level(value)
+    return levels
+
+
+def configure_logging(level: Optional[str] = None, module_levels: Optional[str] = None, use_queue: Optional[bool] = None,
+                      stream: Optional[IO[str]] = None) -> None:
+    """Installe le handler racine (via une file si demandé) et les niveaux par module. Idempotent."""
+    global _listener
+
+    level = parse_level(level or os.getenv('LOG_LEVEL') or 'INFO')
+    modules = parse_module_levels(module_levels if module_levels is not None else os.getenv('LOG_LEVELS', ''))
+    if use_queue is None:
+        use_queue = os.getenv('LOG_QUEUE', 'true').lower() != 'false'
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+    else:
+        root.addHandler(output)
+
+    root.setLevel(level)
+    # Les niveaux d'une configuration précédente ne doivent pas survivre
+    for name in _module_names - set(modules):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    for name, module_level in modules.items():
+        logging.getLogger(name).setLevel(module_level)
+    _module_names.clear()
+    _module_names.update(modules)
+
+
+def stop_logging() -> None:
+    """Vide la file et arrête le thread d'écriture (appelé à la sortie du processus)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -6,21 +6,28 @@ Main entry point for the Telegram bot deployment on render.com
 import os
 import json
 import logging
-from flask import Flask, request, jsonify
+import time
+from typing import Any, Dict, Optional, Tuple
+from flask import Flask, request, jsonify, Response
 import requests
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-import pytz
 
 # Importe la configuration et le bot
 from config import Config
 from bot import TelegramBot 
+from update_queue import UpdateQueue
+from load_shedding import LoadShedder
+from dispatcher import ChatDispatcher
+from telegram_api import configure_breaker
+from poller import UpdatePoller
+from leader import UNAVAILABLE, LeaderElection, UpdateForwarder, UpdateServer
+from engine_process import EngineProcess, is_engine_process
+import jobs
+from logging_setup import configure_logging
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, WEBHOOK_SECONDS
+from profiler import handle_profile_request, is_authorized
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize bot and config
@@ -30,8 +37,52 @@ except ValueError as e:
     logger.error(f"❌ Erreur d'initialisation de la configuration: {e}")
     exit(1) 
 
-# 'bot' est l'instance de la classe TelegramBot
-bot = TelegramBot(config.BOT_TOKEN) 
+# Disjoncteur de l'API Telegram (partagé par tous les clients de cette URL)
+configure_breaker(config.TELEGRAM_API_BASE, config.API_FAILURE_THRESHOLD, config.API_RESET_TIMEOUT)
+
+
+def create_hosted_bot(name: Optional[str], token: str, data_dir: str = '.') -> Tuple[TelegramBot, Any]:
+    """
+    Un bot hébergé et sa file d'updates. `name` est None pour le bot principal ; les bots de BOTS ont
+    leur état (JSON, outbox, doublons, offset) sous BOT_DATA_DIR/<nom>/ et leur propre limiteur de débit.
+    Pool HTTP, planificateur, métriques et disjoncteur de l'API sont partagés.
+    """
+    hosted = TelegramBot(token, dedup_window=config.DEDUP_WINDOW, api_base=config.TELEGRAM_API_BASE, name=name, data_dir=data_dir)
+    # Envois par priorité, budget de temps par update, limiteur de débit, tables supplémentaires (voir TelegramHandlers.apply_config)
+    hosted.handlers.apply_config(config)
+    # Reprise des prédictions / éditions inscrites dans le journal des envois mais non acquittées avant l'arrêt
+    hosted.handlers.retry_outbox()
+
+    # File d'updates (modes 'queue' et 'parallel') : le webhook répond tout de suite.
+    # 'queue' : un worker traite tout dans l'ordre ; 'parallel' : ordre strict par chat, chats en parallèle
+    # En surcharge (rafale après une panne), un LoadShedder allège le traitement (voir load_shedding.py)
+    suffix = f"-{name}" if name else ''
+    queue = None
+    shed = None
+    if config.WEBHOOK_MODE in ('queue', 'parallel') and config.SHED_QUEUE_DEPTH and hosted.handlers.card_predictor:
+        shed = LoadShedder(config.SHED_QUEUE_DEPTH, hosted.handlers.classify_update, hosted.handlers.card_predictor.extract_game_number,
+                           stale_games=config.SHED_STALE_GAMES, name=('webhook' if config.WEBHOOK_MODE == 'queue' else 'dispatch') + suffix)
+    if config.WEBHOOK_MODE == 'queue':
+        queue = UpdateQueue(hosted.handle_update, maxsize=config.UPDATE_QUEUE_SIZE, name=f'webhook{suffix}', shedder=shed)
+        queue.start()
+    elif config.WEBHOOK_MODE == 'parallel':
+        queue = ChatDispatcher(hosted.handle_update, workers=config.DISPATCH_WORKERS, maxsize=config.UPDATE_QUEUE_SIZE,
+                               name=f'dispatch{suffix}', classify=hosted.handlers.classify_update, shedder=shed)
+        queue.start()
+    return hosted, queue
+
+
+# 'bot' est le bot principal (BOT_TOKEN), 'update_queue' sa file d'updates ; créés par start_engine (au chargement,
+# ou à l'élection du leader en mode MULTI_WORKER : ils restent à None dans les followers)
+bot: Optional[TelegramBot] = None
+update_queue = None
+# Bots hébergés par nom (/webhook/<nom>) : le principal sous BOT_NAME, puis ceux de BOTS
+hosted_bots: Dict[str, Tuple[TelegramBot, Any]] = {}
+# Mode MULTI_WORKER : transmission des webhooks au leader (followers), élection
+forwarder: Optional[UpdateForwarder] = None
+election: Optional[LeaderElection] = None
+# Mode ENGINE_PROCESS : le moteur tourne dans un processus enfant (engine_process.py), ce processus ne fait que du HTTP
+engine: Optional[EngineProcess] = None
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -42,24 +93,113 @@ app = Flask(__name__)
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Handle incoming webhook from Telegram"""
+    return _handle_webhook(None)
+
+@app.route('/webhook/<bot_name>', methods=['POST'])
+def hosted_webhook(bot_name):
+    """Webhook d'un bot hébergé (BOT_NAME ou un nom de BOTS)"""
+    return _handle_webhook(bot_name)
+
+def _handle_webhook(bot_name):
+    start = time.perf_counter()
+    update = request.get_json(silent=True)
+    if not update:
+        status, body = 200, {'status': 'ok'}
+    elif forwarder is None or hosted_bots or engine is not None:
+        # Bots ou processus moteur dans ce worker (leader en mode MULTI_WORKER) : livraison locale
+        status, body = deliver_update(bot_name, update)
+    elif election is not None and election.is_leader:
+        # Leader en cours de démarrage : ne pas se transmettre le webhook à soi-même, Telegram re-livrera
+        status, body = UNAVAILABLE
+    else:
+        # Follower (MULTI_WORKER) : le leader traite, sa réponse est renvoyée telle quelle
+        status, body = forwarder.forward(bot_name, update)
+    WEBHOOK_SECONDS.observe(time.perf_counter() - start, status=status)
+    return (jsonify(body) if isinstance(body, dict) else body), status
+
+def deliver_update(bot_name: Optional[str], update: Any) -> Tuple[int, Any]:
+    """Livre un update au bot `bot_name` (None = bot principal) ; retourne (code HTTP, corps)."""
     try:
-        update = request.get_json(silent=True)
-        if not update:
-            return jsonify({'status': 'ok'}), 200
+        if engine is not None:
+            if (bot_name or config.BOT_NAME) not in engine_bot_names:
+                return 404, {'status': 'not found'}
+            if not isinstance(update, dict) or not isinstance(update.get('update_id'), int):
+                return 400, {'status': 'invalid update'}
+            # Réponse immédiate : le processus moteur traite l'update à son rythme
+            return engine.submit(bot_name, update)
+
+        hosted = hosted_bots.get(bot_name or config.BOT_NAME)
+        if hosted is None:
+            return 404, {'status': 'not found'}
+        bot, update_queue = hosted
+
+        if update_queue is not None:
+            if not isinstance(update, dict) or not isinstance(update.get('update_id'), int):
+                return 400, {'status': 'invalid update'}
+            # File pleine : 503 pour que Telegram re-livre plus tard
+            if not update_queue.put(update):
+                return 503, {'status': 'busy'}
+            return 200, 'OK'
 
         # Délégation du traitement complet à bot.handle_update
         if update:
             bot.handle_update(update)
         
-        return 'OK', 200
+        return 200, 'OK'
     except Exception as e:
         logger.error(f"Error handling webhook: {e}")
-        return 'Error', 500
+        return 500, 'Error'
+
+def table_health():
+    """État des tables, lu dans les vues immuables publiées par leur écrivain (appelé aussi par engine_process)"""
+    tables = {}
+    for hosted, _ in hosted_bots.values():
+        for shard in hosted.handlers.shards:
+            snapshot = shard.snapshot()
+            tables[shard.label] = {'version': snapshot.version, 'predictions': snapshot.stats['total'],
+                                   'pending': snapshot.stats['pending']}
+    return tables
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint for render.com"""
-    return {'status': 'healthy', 'service': 'telegram-bot'}, 200
+    """Health check endpoint for render.com (+ état des tables ; avec ENGINE_PROCESS, dernier état envoyé par le processus moteur)"""
+    # Jamais d'attente du processus moteur : la sonde reste rapide quoi qu'il fasse
+    tables = engine.tables if engine is not None else table_health()
+    health = {'status': 'healthy', 'service': 'telegram-bot', 'tables': tables}
+    if election is not None:
+        health['role'] = 'leader' if election.is_leader else 'follower'
+    if engine is not None:
+        age = engine.tables_age()
+        health['engine'] = {'alive': engine.is_alive(), 'pid': engine.pid, 'pending': engine.pending(),
+                            'tables_age_s': round(age, 1) if age is not None else None}
+    return health, 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métriques au format Prometheus (latences par étape, API Telegram, files, taille de l'état)"""
+    child = engine.request('metrics') if engine is not None else None
+    if not child or 'text' not in child:
+        return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+    # Métriques du moteur alimentées par l'enfant : les siennes remplacent les familles vides de ce processus
+    text = REGISTRY.render(exclude=child['names']) + child['text']
+    return Response(text, content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """Profilage à chaud (admin) : POST démarre l'échantillonnage ou cProfile, GET récupère le résultat"""
+    if not is_authorized(config.ADMIN_TOKEN, request.headers.get('X-Admin-Token')):
+        return jsonify({'status': 'not found'}), 404
+    if engine is not None:
+        # Le moteur tourne dans l'enfant : c'est lui qu'on profile
+        response = engine.request('profile', method=request.method, params=request.args.to_dict())
+        if not response or 'status' not in response:
+            return jsonify({'status': 'engine unavailable'}), 503
+        status, payload = response['status'], response['body']
+    else:
+        status, payload = handle_profile_request(request.method, request.args.to_dict())
+    if isinstance(payload, dict):
+        return jsonify(payload), status
+    return Response(payload, status=status, content_type='text/plain; charset=utf-8')
 
 @app.route('/', methods=['GET'])
 def home():
@@ -68,10 +208,10 @@ def home():
 
 # --- CONFIGURATION WEBHOOK ---
 
-def setup_webhook():
+def setup_webhook(bot, bot_name=None):
     """Set up webhook on startup"""
     try:
-        full_webhook_url = config.get_webhook_url()
+        full_webhook_url = config.get_webhook_url(bot_name)
         
         # Log de diagnostic
         logger.info(f"🔍 Environnement détecté:")
@@ -98,165 +238,87 @@ def setup_webhook():
     except Exception as e:
         logger.error(f"❌ Erreur critique lors du setup du webhook: {e}")
 
-# --- RÉINITIALISATION PROGRAMMÉE DES PRÉDICTIONS ---
+# --- MODE POLLING (SANS WEBHOOK) ---
 
-def reset_non_inter_predictions():
-    """
-    Reset complet à 00h59 heure du Bénin:
-    - EFFACE TOUT (prédictions, INTER, smart rules, collecte, etc.)
-    - GARDE SEULEMENT les IDs canaux
-    - RÉACTIVE le mode INTER automatiquement
-    - RÉINITIALISE la collecte à zéro
-    """
+def start_polling(bot):
+    """Supprime le webhook et lance la boucle getUpdates dans un thread dédié."""
     try:
-        # Fichiers à EFFACER COMPLÈTEMENT
-        files_to_clear = [
-            'predictions.json',
-            'inter_data.json',
-            'smart_rules.json',
-            'collected_games.json',
-            'sequential_history.json',
-            'pending_edits.json',
-            'quarantined_rules.json',
-            'last_prediction_time.json',
-            'last_predicted_game_number.json',
-            'consecutive_fails.json',
-            'single_trigger_until.json',
-            'inter_mode_status.json',
-            'last_analysis_time.json',
-            'last_inter_update.json',
-            'last_report_sent.json',
-            'wait_until_next_update.json'
-        ]
-        
-        # Effacer tous les fichiers
-        for file in files_to_clear:
-            if os.path.exists(file):
-                os.remove(file)
-                logger.info(f"🗑️ Supprimé: {file}")
-        
-        # Recharger le bot predictor pour réinitialiser TOUTES les données
-        if bot.handlers.card_predictor:
-            predictor = bot.handlers.card_predictor
-            
-            # Forcer la réinitialisation complète
-            predictor.predictions = {}
-            predictor.inter_data = []
-            predictor.smart_rules = []
-            predictor.collected_games = set()
-            predictor.sequential_history = {}
-            predictor.pending_edits = {}
-            predictor.quarantined_rules = {}
-            predictor.last_prediction_time = 0
-            predictor.last_predicted_game_number = 0
-            predictor.consecutive_fails = 0
-            predictor.single_trigger_until = 0
-            predictor.last_analysis_time = 0
-            predictor.last_inter_update_time = 0
-            predictor.last_report_sent = {}
-            predictor.wait_until_next_update = 0
-            
-            # ✅ RÉACTIVER le mode INTER automatiquement
-            predictor.is_inter_mode_active = True
-            predictor._save_all_data()
-            
-            logger.info("🔄 RESET COMPLET EFFECTUÉ À 00h59 (BÉNIN):")
-            logger.info("   ✅ TOUT EFFACÉ (prédictions, INTER, smart rules, collecte, etc.)")
-            logger.info("   ✅ CONSERVÉ: IDs canaux (channels_config.json)")
-            logger.info("   ✅ MODE INTER: RÉACTIVÉ automatiquement")
-            logger.info("   ✅ COLLECTE: Réinitialisée à zéro")
-        else:
-            logger.error("❌ card_predictor non initialisé")
-        
+        bot.delete_webhook()
+        poller = UpdatePoller(bot, limit=config.POLLING_LIMIT, timeout=config.POLLING_TIMEOUT,
+                              offset_file=os.path.join(bot.data_dir, 'polling_offset.json'))
+        poller.start()
+        logger.info("📡 Mode POLLING actif : le webhook n'est pas utilisé")
+        return poller
     except Exception as e:
-        logger.error(f"❌ Erreur lors du reset complet: {e}")
-
-def send_startup_message():
-    """Envoie un message de démarrage de session avec la dernière mise à jour INTER."""
-    try:
-        if bot.handlers.card_predictor:
-            predictor = bot.handlers.card_predictor
-            if not predictor.telegram_message_sender or not predictor.prediction_channel_id:
-                return
-            
-            now = predictor.now()
-            last_update = predictor.get_inter_version()
-            session_label = predictor.current_session_label()
-            inter_active = "✅ ACTIF" if predictor.is_inter_mode_active else "❌ INACTIF"
-            
-            msg = (f"🎬 **LES PRÉDICTIONS REPRENNENT !**\n\n"
-                   f"⏰ Heure de Bénin : {now.strftime('%H:%M:%S - %d/%m/%Y')}\n"
-                   f"📅 Session : {session_label}\n"
-                   f"🧠 Mode Intelligent : {inter_active}\n"
-                   f"🔄 Mise à jour des règles : {last_update}\n\n"
-                   f"👨‍💻 **Développeur** : Sossou Kouamé\n"
-                   f"🎟️ **Code Promo** : Koua229")
-            
-            predictor.telegram_message_sender(predictor.prediction_channel_id, msg)
-            logger.info("📢 Message de démarrage de session envoyé")
-    except Exception as e:
-        logger.error(f"❌ Erreur envoi message démarrage: {e}")
+        logger.error(f"❌ Erreur démarrage du polling: {e}")
+        return None
 
-def send_session_reports():
-    """Envoie les rapports de session à 5h, 17h, 22h (heure du Bénin)."""
-    try:
-        if bot.handlers.card_predictor:
-            bot.handlers.card_predictor.check_and_send_reports()
-    except Exception as e:
-        logger.error(f"❌ Erreur envoi rapport: {e}")
+# --- TÂCHES PROGRAMMÉES (voir jobs.py) ---
 
 def setup_scheduler():
     """Configure le planificateur pour la réinitialisation quotidienne et les rapports."""
     try:
-        scheduler = BackgroundScheduler()
-        benin_tz = pytz.timezone('Africa/Porto-Novo')
-        
-        # Réinitialisation quotidienne à 00h59
-        trigger_reset = CronTrigger(hour=0, minute=59, timezone=benin_tz)
-        scheduler.add_job(
-            reset_non_inter_predictions,
-            trigger=trigger_reset,
-            id='daily_prediction_reset',
-            name='Réinitialisation quotidienne des prédictions automatiques',
-            replace_existing=True
-        )
-        
-        # Message de redémarrage à 1h, 9h, 15h, 21h
-        for hour in [1, 9, 15, 21]:
-            trigger_startup = CronTrigger(hour=hour, minute=0, timezone=benin_tz)
-            scheduler.add_job(
-                send_startup_message,
-                trigger=trigger_startup,
-                id=f'startup_message_{hour}h',
-                name=f'Message redémarrage à {hour}h00',
-                replace_existing=True
-            )
-        
-        # Rapports automatiques à 6h, 12h, 18h, 00h
-        for hour in [6, 12, 18, 0]:
-            trigger_report = CronTrigger(hour=hour, minute=0, timezone=benin_tz)
-            scheduler.add_job(
-                send_session_reports,
-                trigger=trigger_report,
-                id=f'session_report_{hour}h',
-                name=f'Rapport de session à {hour}h00',
-                replace_existing=True
-            )
-        
+        # Un seul planificateur : chaque tâche passe sur toutes les tables de tous les bots hébergés
+        scheduler = jobs.create_background_scheduler(
+            lambda: [shard for hosted, _ in hosted_bots.values() for shard in hosted.handlers.shards])
         scheduler.start()
         logger.info("⏰ Planificateur configuré:")
         logger.info("   - Réinitialisation à 00h59 (heure du Bénin)")
-        logger.info("   - Rapports à 5h00, 17h00, 22h00 (heure du Bénin)")
+        logger.info("   - Messages de démarrage à 1h00, 9h00, 15h00, 21h00 (heure du Bénin)")
+        logger.info("   - Rapports à 6h00, 12h00, 18h00, 00h00 (heure du Bénin)")
         
         return scheduler
     except Exception as e:
         logger.error(f"❌ Erreur configuration planificateur: {e}")
         return None
 
-# Configure webhook au démarrage (fonctionne avec Gunicorn)
-setup_webhook()
+# --- DÉMARRAGE DU MOTEUR ---
+
+poller = None
+pollers = []
+scheduler = None
+
+def start_engine():
+    """Bots, ingestion (webhook ou polling) et planificateur ; dans le seul leader en mode MULTI_WORKER."""
+    global bot, update_queue, hosted_bots, poller, pollers, scheduler, engine
+    if config.ENGINE_PROCESS and not is_engine_process():
+        # Tout cela se passe dans le processus moteur, qui importe ce module avec ENGINE_PROCESS_CHILD=1
+        engine = EngineProcess(maxsize=config.ENGINE_QUEUE_SIZE, control_socket=config.ENGINE_SOCKET).start()
+        return
+    bot, update_queue = create_hosted_bot(None, config.BOT_TOKEN)
+    bots = {config.BOT_NAME: (bot, update_queue)}
+    for extra_name, extra_token in config.BOTS:
+        bots[extra_name] = create_hosted_bot(extra_name, extra_token, os.path.join(config.BOT_DATA_DIR, extra_name))
+        logger.info(f"🤖 Bot '{extra_name}' hébergé : /webhook/{extra_name}")
+    # Publié en une fois : les routes servent localement dès que le dictionnaire est rempli
+    hosted_bots = bots
+
+    # Configure l'ingestion au démarrage (fonctionne avec Gunicorn) : webhook ou polling
+    if config.INGESTION_MODE == 'polling':
+        poller = start_polling(bot)
+        pollers = [poller] + [start_polling(hosted) for hosted, _ in list(hosted_bots.values())[1:]]
+    else:
+        setup_webhook(bot)
+        for extra_name, _ in config.BOTS:
+            setup_webhook(hosted_bots[extra_name][0], extra_name)
+
+    scheduler = setup_scheduler()
+
+def start_leader():
+    """Élu leader : démarre le moteur puis accepte les webhooks transmis par les followers."""
+    start_engine()
+    UpdateServer(config.LEADER_SOCKET, deliver_update).start()
+
+# Noms des bots servis (/webhook/<nom>), connus sans démarrer le moteur
+engine_bot_names = {config.BOT_NAME} | {name for name, _ in config.BOTS}
 
-scheduler = setup_scheduler()
+if config.MULTI_WORKER and not is_engine_process():
+    # gunicorn --workers N : un seul worker (le leader) possède l'état, les autres lui transmettent les webhooks
+    forwarder = UpdateForwarder(config.LEADER_SOCKET, timeout=config.LEADER_FORWARD_TIMEOUT)
+    election = LeaderElection(config.LEADER_LOCK_FILE, start_leader)
+    election.start()
+else:
+    start_engine()
 
 if __name__ == '__main__':
     # Get port from environment (10000 pour Render.com, 5000 pour Replit)
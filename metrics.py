@@ -0,0 +1,265 @@
+# metrics.py
+
+"""
+Registre de métriques en mémoire (compteurs, jauges, histogrammes)
+exposé au format texte Prometheus.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Bornes (en secondes) adaptées aux temps de traitement du bot et aux appels Telegram
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Nombre d'observations récentes conservées par série pour le calcul des quantiles
+SAMPLE_WINDOW = 4096
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape_label(v)}"' for n, v in pairs) + '}'
+
+
+class _Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Labels attendus pour {self.name}: {self.labelnames}, reçus: {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Compteur monotone."""
+    metric_type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [('', _format_labels(self.labelnames, k), v) for k, v in items]
+
+
+class Gauge(_Metric):
+    """Valeur instantanée, fixée directement ou calculée au moment de la lecture."""
+    metric_type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        """Enregistre une fonction évaluée à chaque lecture (ex: taille d'une file)."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        fn = self._functions.get(key)
+        return fn() if fn else self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+            functions = list(self._functions.items())
+        result = [('', _format_labels(self.labelnames, k), v) for k, v in items]
+        for key, fn in functions:
+            try:
+                result.append(('', _format_labels(self.labelnames, key), float(fn())))
+            except Exception:
+                continue
+        return result
+
+
+class _HistogramSeries:
+    __slots__ = ('bucket_counts', 'sum', 'count', 'recent')
+
+    def __init__(self, nb_buckets: int):
+        self.bucket_counts = [0] * nb_buckets
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=SAMPLE_WINDOW)
+
+
+class Histogram(_Metric):
+    """Distribution de valeurs par intervalles, avec une fenêtre d'observations récentes pour les quantiles."""
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series: Dict[Tuple[str, ...], _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets))
+            series.bucket_counts[index] += 1
+            series.sum += value
+            series.count += 1
+            series.recent.append(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Mesure la durée du bloc `with` et l'enregistre."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series.count if series else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Quantile (0-1) calculé sur les observations récentes de la série."""
+        series = self._series.get(self._key(labels))
+        if not series or not series.recent:
+            return None
+        with self._lock:
+            values = sorted(series.recent)
+        index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+        return values[index]
+
+    def series_labels(self) -> List[Dict[str, str]]:
+        with self._lock:
+            keys = list(self._series.keys())
+        return [dict(zip(self.labelnames, k)) for k in keys]
+
+    def samples(self):
+        result = []
+        with self._lock:
+            items = [(k, list(s.bucket_counts), s.sum, s.count) for k, s in self._series.items()]
+        for key, bucket_counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                result.append(('_bucket', _format_labels(self.labelnames, key, ('le', _format_value(bound))), cumulative))
+            result.append(('_sum', _format_labels(self.labelnames, key), total))
+            result.append(('_count', _format_labels(self.labelnames, key), count))
+        return result
+
+
+class MetricsRegistry:
+    """Ensemble nommé de métriques ; la création est idempotente (get-or-create)."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Tuple[str, ...], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, tuple(labelnames), **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"La métrique {name} existe déjà avec un autre type")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def active_names(self) -> List[str]:
+        """Métriques ayant au moins un échantillon (fusion avec le registre d'un autre processus)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [metric.name for metric in metrics if metric.samples()]
+
+    def render(self, only: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()) -> str:
+        """Texte au format d'exposition Prometheus (version 0.0.4), restreint à `only` et privé de `exclude`."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        only = set(only) if only is not None else None
+        exclude = set(exclude)
+        lines = []
+        for metric in metrics:
+            if (only is None or metric.name in only) and metric.name not in exclude:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Registre global du processus
+REGISTRY = MetricsRegistry()
+
+# Durée des étapes du traitement d'un update source. Les étapes s'imbriquent :
+# 'persist' est aussi compté dans 'collect' / 'verify' qui sauvegardent l'état ;
+# 'predict' correspond à should_predict.
+STAGE_SECONDS = REGISTRY.histogram('bot_stage_seconds', "Durée des étapes du traitement (parse, collect, verify, predict, persist, send)", ('stage',))
+
+# Durée de la requête webhook complète, par code de réponse HTTP
+WEBHOOK_SECONDS = REGISTRY.histogram('bot_webhook_seconds', "Durée de traitement d'une requête webhook", ('status',))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
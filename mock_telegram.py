@@ -0,0 +1,265 @@
+# mock_telegram.py
+
+"""
+Serveur local imitant l'API Bot Telegram, pour les tests de charge et de
+latence hors ligne (CI, machines de dev sans réseau).
+
+    python mock_telegram.py --port 8081 --latency 0.05 --error-rate 0.01 --rate-limit-rate 0.02
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 python main.py
+
+Méthodes : sendMessage, editMessageText, sendDocument, setWebhook,
+deleteWebhook, getMe, getUpdates. Chaque appel est enregistré (méthode,
+payload, statut, horodatage, durée) ; les routes /_mock/* permettent de
+consulter les appels et d'injecter des updates depuis un autre processus.
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+MockCall = namedtuple('MockCall', ['method', 'token', 'payload', 'status', 'received_at', 'duration'])
+
+# Durée maximale d'un long-polling getUpdates côté mock (secondes)
+MAX_POLL_WAIT = 5.0
+
+
+class MockTelegramServer:
+    """API Bot factice avec latence, erreurs et 429 configurables."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: int = 1, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._updates_available = threading.Condition(self._lock)
+        self._calls: List[MockCall] = []
+        self._updates: List[Dict[str, Any]] = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self.webhook_url = ''
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-telegram', daemon=True)
+        self._thread.start()
+        logger.info(f"🧪 Mock Telegram API démarrée sur {self.base_url}")
+        return self.base_url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    # --- Enregistrement des appels ---
+    @property
+    def calls(self) -> List[MockCall]:
+        with self._lock:
+            return list(self._calls)
+
+    def count(self, method: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(1 for c in self._calls if method is None or c.method == method)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls.clear()
+            self._updates.clear()
+
+    # --- Updates pour getUpdates ---
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """Ajoute un update (update_id attribué s'il manque) ; retourne son update_id."""
+        with self._updates_available:
+            update = dict(update)
+            if 'update_id' not in update:
+                update['update_id'] = self._next_update_id
+            self._next_update_id = max(self._next_update_id, update['update_id']) + 1
+            self._updates.append(update)
+            self._updates_available.notify_all()
+            return update['update_id']
+
+    def _get_updates(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(payload.get('offset') or 0)
+        limit = int(payload.get('limit') or 100)
+        wait = min(float(payload.get('timeout') or 0), MAX_POLL_WAIT)
+        deadline = time.monotonic() + wait
+        with self._updates_available:
+            # Comme Telegram : un offset confirme (et oublie) tous les updates précédents
+            self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._updates_available.wait(deadline - time.monotonic())
+            return self._updates[:limit]
+
+    # --- Réponses de l'API ---
+    def _message_result(self, payload: Dict[str, Any], message_id: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            if message_id is None:
+                message_id = self._next_message_id
+                self._next_message_id += 1
+        chat_id = payload.get('chat_id')
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        return {'message_id': message_id, 'date': int(time.time()), 'chat': {'id': chat_id},
+                'text': payload.get('text') or payload.get('caption', '')}
+
+    def _dispatch(self, method: str, token: str, payload: Dict[str, Any]):
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self._get_updates(payload)}
+
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429, {'ok': False, 'error_code': 429,
+                         'description': f'Too Many Requests: retry after {self.retry_after}',
+                         'parameters': {'retry_after': self.retry_after}}
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+
+        if method in ('sendMessage', 'sendDocument'):
+            return 200, {'ok': True, 'result': self._message_result(payload)}
+        if method == 'editMessageText':
+            message_id = payload.get('message_id')
+            if not message_id:
+                return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message to edit not found'}
+            return 200, {'ok': True, 'result': self._message_result(payload, int(message_id))}
+        if method == 'setWebhook':
+            self.webhook_url = payload.get('url', '')
+            return 200, {'ok': True, 'result': True, 'description': 'Webhook was set'}
+        if method == 'deleteWebhook':
+            self.webhook_url = ''
+            return 200, {'ok': True, 'result': True, 'description': 'Webhook was deleted'}
+        if method == 'getMe':
+            bot_id = int(token.split(':')[0]) if token.split(':')[0].isdigit() else 0
+            return 200, {'ok': True, 'result': {'id': bot_id, 'is_bot': True, 'first_name': 'MockBot', 'username': 'mock_bot'}}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+
+    def _record(self, method: str, token: str, payload: Dict[str, Any], status: int, received_at: float, duration: float) -> None:
+        with self._lock:
+            self._calls.append(MockCall(method, token, payload, status, received_at, duration))
+
+    def _handle_api_call(self, method: str, token: str, payload: Dict[str, Any]):
+        received_at = time.time()
+        start = time.perf_counter()
+        if method != 'getUpdates' and (self.latency or self.jitter):
+            time.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        status, body = self._dispatch(method, token, payload)
+        self._record(method, token, payload, status, received_at, time.perf_counter() - start)
+        return status, body
+
+    # --- Serveur HTTP ---
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # En-têtes et corps envoyés en une seule écriture, sans Nagle (sinon ~40 ms d'ACK retardé par appel)
+            disable_nagle_algorithm = True
+            wbufsize = 64 * 1024
+
+            def log_message(self, format, *args):
+                return
+
+            def _payload(self) -> Dict[str, Any]:
+                parsed = urlparse(self.path)
+                payload = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                content_type = self.headers.get('Content-Type', '')
+                if not raw:
+                    return payload
+                if 'application/json' in content_type:
+                    payload.update(json.loads(raw))
+                elif 'application/x-www-form-urlencoded' in content_type:
+                    payload.update({k: v[-1] for k, v in parse_qs(raw.decode()).items()})
+                elif 'multipart/form-data' in content_type:
+                    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                        f"Content-Type: {content_type}\r\n\r\n".encode() + raw)
+                    for part in message.iter_parts():
+                        name = part.get_param('name', header='content-disposition')
+                        if part.get_filename():
+                            payload[name] = {'filename': part.get_filename(), 'size': len(part.get_payload(decode=True) or b'')}
+                        elif name:
+                            payload[name] = (part.get_payload(decode=True) or b'').decode('utf-8', 'replace')
+                return payload
+
+            def _send_json(self, status: int, body: Any) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self):
+                path = urlparse(self.path).path
+                payload = self._payload()
+                if path == '/_mock/calls':
+                    calls = [c._asdict() for c in server.calls]
+                    return self._send_json(200, {'count': len(calls), 'calls': calls})
+                if path == '/_mock/updates' and self.command == 'POST':
+                    updates = payload.get('updates', [payload])
+                    return self._send_json(200, {'update_ids': [server.push_update(u) for u in updates]})
+                if path == '/_mock/reset' and self.command == 'POST':
+                    server.reset()
+                    return self._send_json(200, {'ok': True})
+
+                parts = path.strip('/').split('/')
+                if len(parts) != 2 or not parts[0].startswith('bot'):
+                    return self._send_json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+                status, body = server._handle_api_call(parts[1], parts[0][3:], payload)
+                self._send_json(status, body)
+
+            def do_GET(self):
+                self._route()
+
+            def do_POST(self):
+                self._route()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur mock de l'API Bot Telegram")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="Latence ajoutée à chaque appel (s)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Variation aléatoire ± de la latence (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Proportion d'appels en erreur 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Proportion d'appels en 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after renvoyé avec les 429 (s)")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = MockTelegramServer(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed)
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+# outbox.py
+
+"""
+Journal des envois critiques (prédictions, éditions de résultat).
+
+Chaque envoi est inscrit dans outbox.jsonl AVANT l'appel à Telegram, puis
+acquitté avec le message_id retourné. Après un échec certain (réponse d'erreur
+de Telegram, appel jamais parti), l'envoi est repris par
+TelegramHandlers.retry_outbox(). Une prédiction dont l'issue est inconnue
+(timeout, ou intention relue du journal au démarrage : l'arrêt a pu survenir
+après la publication) n'est jamais repostée : elle est abandonnée et signalée
+à l'admin. Les éditions, rejouables sans effet de bord, sont toujours reprises.
+
+Fichier en ajout seul, une ligne JSON par événement :
+    {"op": "intent", "id": ..., "kind": "prediction"|"edit", "chat_id": ..., "text": ..., "message_id": ..., "meta": {...}}
+    {"op": "ack", "id": ..., "message_id": ...}
+    {"op": "drop", "id": ..., "reason": ...}
+
+Les acquittements des éditions (rejouables sans effet de bord) sont écrits par
+lots ; celui d'une prédiction est écrit tout de suite : sans lui, une reprise
+reposterait la prédiction. Le fichier est compacté (intentions en cours
+seulement) au chargement et lorsqu'il dépasse `compact_after` lignes.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PREDICTION = 'prediction'
+EDIT = 'edit'
+
+# Nombre max de tentatives d'un envoi avant abandon, délai avant de reprendre un envoi en échec (secondes)
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 5.0
+
+OUTBOX_EVENTS = REGISTRY.counter('bot_outbox_events_total', "Événements du journal des envois", ('kind', 'event', 'shard'))
+OUTBOX_PENDING = REGISTRY.gauge('bot_outbox_pending', "Envois inscrits et non acquittés", ('shard',))
+
+
+class Outbox:
+    """Intentions d'envoi en attente (mémoire) adossées à un journal JSONL en ajout seul."""
+
+    def __init__(self, filename: str = 'outbox.jsonl', ack_batch: int = 20, compact_after: int = 1000, fsync: bool = False,
+                 shard: str = 'default'):
+        self.filename = filename
+        self.shard = shard
+        self.ack_batch = max(1, ack_batch)
+        self.compact_after = compact_after
+        self.fsync = fsync
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._buffer: List[Dict[str, Any]] = []
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._load()
+        OUTBOX_PENDING.set_function(lambda: len(self._pending), shard=shard)
+        atexit.register(self.flush)
+
+    # --- Cycle de vie d'un envoi ---
+    def record(self, kind: str, chat_id: int, text: str, message_id: Optional[int] = None,
+               meta: Optional[Dict[str, Any]] = None) -> str:
+        """Inscrit l'intention (écrite immédiatement, avec les acquittements en attente) ; retourne son id."""
+        entry = {'op': 'intent', 'id': uuid.uuid4().hex, 'kind': kind, 'chat_id': chat_id, 'text': text,
+                 'message_id': message_id, 'meta': meta or {}}
+        with self._lock:
+            self._pending[entry['id']] = dict(entry, attempts=0, retry_at=None)
+            self._buffer.append(entry)
+            self._write_buffer()
+        OUTBOX_EVENTS.inc(kind=kind, event='recorded', shard=self.shard)
+        return entry['id']
+
+    def ack(self, entry_id: str, message_id: Optional[int]) -> None:
+        with self._lock:
+            entry = self._pending.pop(entry_id, None)
+            if entry is None:
+                return
+            self._buffer.append({'op': 'ack', 'id': entry_id, 'message_id': message_id})
+            if entry['kind'] == PREDICTION or len(self._buffer) >= self.ack_batch:
+                self._write_buffer()
+        OUTBOX_EVENTS.inc(kind=entry['kind'], event='acked', shard=self.shard)
+
+    def fail(self, entry_id: str) -> None:
+        """Échec certain de l'envoi : l'intention reste en attente et sera reprise."""
+        with self._lock:
+            entry = self._pending.get(entry_id)
+            if entry is None:
+                return
+            entry['attempts'] += 1
+            entry['retry_at'] = time.monotonic() + RETRY_DELAY
+        OUTBOX_EVENTS.inc(kind=entry['kind'], event='failed', shard=self.shard)
+
+    def drop(self, entry_id: str, reason: str) -> None:
+        """Abandonne définitivement une intention (obsolète ou trop de tentatives)."""
+        with self._lock:
+            entry = self._pending.pop(entry_id, None)
+            if entry is None:
+                return
+            self._buffer.append({'op': 'drop', 'id': entry_id, 'reason': reason})
+            self._write_buffer()
+        OUTBOX_EVENTS.inc(kind=entry['kind'], event='dropped', shard=self.shard)
+        logger.warning(f"📭 Envoi abandonné ({entry['kind']}, {reason}): {entry['text'][:60]!r}")
+
+    def to_retry(self) -> List[Dict[str, Any]]:
+        """Intentions à reprendre (en échec depuis RETRY_DELAY, ou relues du journal), dans l'ordre d'inscription ; les envois en vol sont exclus."""
+        now = time.monotonic()
+        with self._lock:
+            return [dict(entry) for entry in self._pending.values() if entry['retry_at'] is not None and entry['retry_at'] <= now]
+
+    def has_retry_due(self) -> bool:
+        now = time.monotonic()
+        return any(entry['retry_at'] is not None and entry['retry_at'] <= now for entry in list(self._pending.values()))
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._buffer:
+                self._write_buffer()
+
+    # --- Persistance ---
+    def _write_buffer(self) -> None:
+        # Appelé sous verrou
+        try:
+            with open(self.filename, 'a') as f:
+                for event in self._buffer:
+                    f.write(json.dumps(event, ensure_ascii=False) + '\n')
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._lines += len(self._buffer)
+            self._buffer = []
+        except Exception as e:
+            logger.error(f"❌ Erreur écriture {self.filename}: {e}")
+            return
+        if self._lines > self.compact_after and len(self._pending) * 2 < self._lines:
+            self._compact()
+
+    def _compact(self) -> None:
+        # Appelé sous verrou : réécrit le journal avec les seules intentions en attente
+        tmp = f"{self.filename}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                for entry in self._pending.values():
+                    intent = {k: v for k, v in entry.items() if k not in ('attempts', 'retry_at', 'reloaded')}
+                    f.write(json.dumps(intent, ensure_ascii=False) + '\n')
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp, self.filename)
+            self._lines = len(self._pending)
+        except Exception as e:
+            logger.error(f"❌ Erreur compactage {self.filename}: {e}")
+
+    def _load(self) -> None:
+        try:
+            if not os.path.exists(self.filename):
+                return
+            with open(self.filename, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        logger.warning(f"⚠️ Ligne illisible ignorée dans {self.filename}")
+                        continue
+                    if event.get('op') == 'intent':
+                        # Envoi interrompu par l'arrêt : issue inconnue (voir TelegramHandlers._retry_prediction)
+                        self._pending[event['id']] = dict(event, attempts=0, retry_at=0.0, reloaded=True)
+                    else:
+                        self._pending.pop(event.get('id'), None)
+            with self._lock:
+                self._compact()
+            if self._pending:
+                logger.info(f"📬 Journal des envois: {len(self._pending)} envoi(s) à reprendre")
+        except Exception as e:
+            logger.error(f"⚠️ Erreur chargement {self.filename}: {e}")
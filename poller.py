@@ -0,0 +1,99 @@
+# poller.py
+
+"""
+Mode d'ingestion par long-polling (getUpdates), alternative au webhook
+pour le développement local ou en cas d'indisponibilité du webhook.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+from bot import ALLOWED_UPDATES
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+POLL_BATCH_SIZE = REGISTRY.histogram('bot_polling_batch_size', "Nombre d'updates reçus par appel getUpdates", buckets=(0, 1, 5, 10, 25, 50, 100))
+POLL_ERRORS = REGISTRY.counter('bot_polling_errors_total', "Appels getUpdates en échec")
+
+
+class UpdatePoller:
+    """Boucle getUpdates qui transmet des lots entiers au bot et persiste l'offset."""
+
+    def __init__(self, bot, limit: int = 100, timeout: int = 50, offset_file: str = 'polling_offset.json'):
+        self.bot = bot
+        self.limit = max(1, min(limit, 100))  # Maximum accepté par Telegram
+        self.timeout = timeout
+        self.offset_file = offset_file
+        self.offset: Optional[int] = self._load_offset()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Offset durable ---
+    def _load_offset(self) -> Optional[int]:
+        try:
+            if os.path.exists(self.offset_file):
+                with open(self.offset_file, 'r') as f:
+                    content = f.read().strip()
+                    return int(json.loads(content)) if content else None
+        except Exception as e:
+            logger.error(f"⚠️ Erreur chargement {self.offset_file}: {e}")
+        return None
+
+    def _save_offset(self) -> None:
+        try:
+            tmp_file = f"{self.offset_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(self.offset, f)
+            os.replace(tmp_file, self.offset_file)
+        except Exception as e:
+            logger.error(f"❌ Erreur sauvegarde {self.offset_file}: {e}")
+
+    # --- Boucle ---
+    def poll_once(self) -> int:
+        """Un appel getUpdates ; traite le lot reçu et retourne sa taille."""
+        payload = {'limit': self.limit, 'timeout': self.timeout, 'allowed_updates': ALLOWED_UPDATES}
+        if self.offset is not None:
+            payload['offset'] = self.offset
+
+        response = self.bot.api.post('getUpdates', json=payload, timeout=self.timeout + 10)
+        result = response.json()
+        if not result.get('ok'):
+            raise RuntimeError(f"getUpdates: {result.get('description', response.status_code)}")
+
+        updates = result.get('result', [])
+        POLL_BATCH_SIZE.observe(len(updates))
+        if not updates:
+            return 0
+
+        self.bot.handle_updates(updates)
+
+        # L'offset n'avance qu'après traitement du lot (les doublons éventuels sont filtrés par update_id)
+        self.offset = max(u['update_id'] for u in updates) + 1
+        self._save_offset()
+        return len(updates)
+
+    def run(self) -> None:
+        logger.info(f"📡 Polling démarré (limit={self.limit}, timeout={self.timeout}s, offset={self.offset})")
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+                backoff = 1
+            except Exception as e:
+                POLL_ERRORS.inc()
+                logger.error(f"❌ Erreur polling: {e} (nouvel essai dans {backoff}s)")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+        logger.info("📡 Polling arrêté")
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, name='telegram-poller', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
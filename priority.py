@@ -0,0 +1,95 @@
+# priority.py
+
+"""
+Classes de priorité du travail du bot, de la plus urgente à la moins urgente :
+
+- verify  : édition du résultat d'une prédiction (_verify_prediction_common)
+- predict : nouvelle prédiction (should_predict / make_prediction)
+- admin   : rapports, messages de bienvenue, réponses aux commandes
+
+La classe courante est portée par le thread (priority_class) : le code métier
+la déclare autour de l'étape concernée, et les points de contention (verrou
+de la logique métier, envois vers Telegram, file du dispatcher) servent les
+threads en attente par classe puis par ordre d'arrivée.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from metrics import REGISTRY
+
+VERIFY = 'verify'
+PREDICT = 'predict'
+ADMIN = 'admin'
+PRIORITY_CLASSES = (VERIFY, PREDICT, ADMIN)
+PRIORITY_RANK = {name: rank for rank, name in enumerate(PRIORITY_CLASSES)}
+
+PRIORITY_WAIT = REGISTRY.histogram('bot_priority_wait_seconds', "Attente par classe de priorité, par point de contention",
+                                   ('layer', 'priority'))
+
+_local = threading.local()
+
+
+def current_class() -> str:
+    """Classe du travail en cours dans ce thread (admin par défaut)."""
+    return getattr(_local, 'priority', ADMIN)
+
+
+@contextmanager
+def priority_class(name: str):
+    if name not in PRIORITY_RANK:
+        raise ValueError(f"Classe de priorité inconnue: {name}")
+    previous = current_class()
+    _local.priority = name
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class PrioritySlots:
+    """
+    Sémaphore à `slots` places : quand tout est occupé, la place libérée va au
+    thread en attente de plus haute priorité (puis au plus ancien).
+    """
+
+    def __init__(self, slots: int = 1, layer: str = 'send'):
+        if slots < 1:
+            raise ValueError("PrioritySlots: au moins une place")
+        self.layer = layer
+        self._free = slots
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, name: Optional[str] = None) -> None:
+        name = name or current_class()
+        start = time.monotonic()
+        with self._cond:
+            if self._free > 0 and not self._waiting:
+                self._free -= 1
+            else:
+                ticket = (PRIORITY_RANK[name], next(self._seq))
+                heapq.heappush(self._waiting, ticket)
+                self._cond.wait_for(lambda: self._free > 0 and self._waiting[0] == ticket)
+                heapq.heappop(self._waiting)
+                self._free -= 1
+                if self._free > 0 and self._waiting:
+                    self._cond.notify_all()
+        PRIORITY_WAIT.observe(time.monotonic() - start, layer=self.layer, priority=name)
+
+    def release(self) -> None:
+        with self._cond:
+            self._free += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, name: Optional[str] = None):
+        self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release()
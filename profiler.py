@@ -0,0 +1,200 @@
+# profiler.py
+
+"""
+Profilage en production, dans le processus (aucun outil externe à attacher) :
+
+- échantillonneur de piles : toutes les `interval` secondes, relève la pile
+  de chaque thread (webhook, worker, planificateur...) via sys._current_frames()
+  et compte les piles repliées (format « collapsed » de flamegraph.pl / speedscope) ;
+- cProfile ponctuel : profile exactement le prochain appel de handle_update
+  et renvoie les statistiques triées.
+
+Les deux modes tournent en arrière-plan : la requête qui les démarre répond
+tout de suite, le résultat est récupéré ensuite (voir main.py, /debug/profile).
+"""
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_SAMPLE_SECONDS = 120
+MIN_INTERVAL = 0.001
+# Durée max d'attente d'un update quand cProfile est armé (secondes)
+CPROFILE_ARM_TIMEOUT = 300
+PSTATS_SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls', 'time')
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def collapse_stack(frame, thread_name: str) -> str:
+    """Pile d'un thread, de la racine vers la feuille, séparée par des ';'."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ';'.join(reversed(labels))
+
+
+def render_collapsed(stacks: Dict[str, int]) -> str:
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+class StackSampler:
+    """Relève périodiquement les piles de tous les threads du processus (sauf le sien)."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = max(MIN_INTERVAL, interval)
+        self.samples = 0
+
+    def sample(self, seconds: float) -> Dict[str, int]:
+        stacks = Counter()
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stacks[collapse_stack(frame, names.get(thread_id, f'thread-{thread_id}'))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        return dict(stacks)
+
+
+class ProfilerService:
+    """Une session de profilage à la fois ; le résultat reste disponible jusqu'à la suivante."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.mode: Optional[str] = None
+        self.running = False
+        self.started_at = 0.0
+        self.seconds = 0.0
+        self.result: Optional[str] = None
+        self._armed = False
+        self._sort = 'cumulative'
+        self._limit = 50
+
+    # --- Démarrage ---
+    def start_sampling(self, seconds: float, interval: float = 0.005) -> bool:
+        """Lance l'échantillonneur en arrière-plan ; False si une session est déjà en cours."""
+        seconds = min(max(seconds, 0.1), MAX_SAMPLE_SECONDS)
+        with self._lock:
+            self._expire_stale_arm()
+            if self.running:
+                return False
+            self.mode, self.running, self.result = 'sample', True, None
+            self.started_at, self.seconds = time.time(), seconds
+        threading.Thread(target=self._run_sampler, args=(seconds, interval), name='profiler-sampler', daemon=True).start()
+        logger.info(f"🔬 Échantillonnage des piles pendant {seconds:.0f}s (intervalle {interval * 1000:.0f}ms)")
+        return True
+
+    def arm_cprofile(self, sort: str = 'cumulative', limit: int = 50) -> bool:
+        """Le prochain handle_update sera profilé avec cProfile ; False si une session est déjà en cours."""
+        if sort not in PSTATS_SORT_KEYS:
+            raise ValueError(f"Tri cProfile invalide: {sort} (attendu: {', '.join(PSTATS_SORT_KEYS)})")
+        with self._lock:
+            self._expire_stale_arm()
+            if self.running:
+                return False
+            self.mode, self.running, self.result = 'cprofile', True, None
+            self.started_at, self.seconds = time.time(), 0.0
+            self._sort, self._limit = sort, limit
+            self._armed = True
+        logger.info("🔬 cProfile armé pour le prochain update")
+        return True
+
+    def _expire_stale_arm(self) -> None:
+        # cProfile armé sans aucun update reçu : la session est abandonnée (appelé sous verrou)
+        if self.mode == 'cprofile' and self.running and time.time() - self.started_at > CPROFILE_ARM_TIMEOUT:
+            self._armed = False
+            self.running = False
+
+    # --- Exécution ---
+    def _run_sampler(self, seconds: float, interval: float) -> None:
+        sampler = StackSampler(interval)
+        try:
+            text = render_collapsed(sampler.sample(seconds))
+        except Exception as e:
+            logger.error(f"❌ Erreur échantillonnage: {e}")
+            text = ''
+        with self._lock:
+            self.result, self.running = text, False
+        logger.info(f"🔬 Échantillonnage terminé: {sampler.samples} relevés")
+
+    def profile_once(self, fn, *args, **kwargs):
+        """Appelle fn ; si cProfile est armé, cet appel (et lui seul) est profilé."""
+        if not self._armed:
+            return fn(*args, **kwargs)
+        with self._lock:
+            armed, self._armed = self._armed, False
+        if not armed:
+            return fn(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats(self._sort).print_stats(self._limit)
+            with self._lock:
+                self.result, self.running = out.getvalue(), False
+            logger.info("🔬 cProfile terminé")
+
+    # --- Lecture ---
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            self._expire_stale_arm()
+            remaining = max(0.0, self.started_at + self.seconds - time.time()) if self.mode == 'sample' else None
+            return {'mode': self.mode, 'running': self.running, 'remaining_s': remaining,
+                    'result_available': self.result is not None}
+
+
+# Service global du processus (les points d'entrée y font passer handle_update)
+PROFILER = ProfilerService()
+
+
+def handle_profile_request(method: str, params: Dict[str, str]) -> Tuple[int, object]:
+    """
+    Logique commune des routes /debug/profile (Flask et ASGI).
+    POST ?seconds=10&interval=0.005     → échantillonnage des piles
+    POST ?mode=cprofile&sort=tottime    → profile le prochain update
+    GET                                 → résultat (texte) ou état de la session
+    """
+    if method == 'POST':
+        try:
+            if params.get('mode', 'sample') == 'cprofile':
+                started = PROFILER.arm_cprofile(params.get('sort', 'cumulative'), int(params.get('limit', 50)))
+            else:
+                started = PROFILER.start_sampling(float(params.get('seconds', 10)), float(params.get('interval', 0.005)))
+        except ValueError as e:
+            return 400, {'status': 'invalid', 'error': str(e)}
+        if not started:
+            return 409, dict(PROFILER.status(), status='busy')
+        return 202, dict(PROFILER.status(), status='started')
+
+    status = PROFILER.status()
+    if status['running']:
+        return 202, dict(status, status='running')
+    if not status['result_available']:
+        return 404, dict(status, status='idle')
+    return 200, PROFILER.result
+
+
+def is_authorized(admin_token: Optional[str], provided: Optional[str]) -> bool:
+    """Jeton admin requis ; sans ADMIN_TOKEN configuré, les routes de debug sont désactivées."""
+    # Comparaison en octets : compare_digest refuse les chaînes non ASCII (TypeError)
+    return bool(admin_token) and bool(provided) and hmac.compare_digest(admin_token.encode(), provided.encode())
@@ -0,0 +1,82 @@
+# rate_limiter.py
+
+"""
+Limiteur de débit à seau de jetons, mémoire bornée.
+
+Un seau par clé (utilisateur, chat, ou le couple) : deux nombres (jetons,
+dernière mise à jour), recalculés en O(1) à chaque message. Les clés sont
+rangées par dernier accès (OrderedDict) : au-delà de `max_keys`, la moins
+récemment vue est évincée, ainsi que toute clé inactive depuis `idle_ttl`.
+Par défaut `idle_ttl` est le temps de remplissage complet d'un seau : une clé
+évincée aurait de toute façon retrouvé tous ses jetons, l'éviction ne change
+aucune décision.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from clock import SYSTEM_CLOCK
+from metrics import REGISTRY
+
+RATE_LIMITED = REGISTRY.counter('bot_rate_limited_total', "Messages ignorés par le limiteur de débit", ('role',))
+RATE_LIMITER_KEYS = REGISTRY.gauge('bot_rate_limiter_keys', "Clés suivies par le limiteur de débit, par bot", ('bot',))
+
+# Clé du seau : par utilisateur, par chat, ou par utilisateur dans un chat
+KEY_MODES = ('user', 'chat', 'user_chat')
+
+
+def rate_limit_key(mode: str, msg: Dict[str, Any]) -> Hashable:
+    user_id = msg.get('from', {}).get('id', 0)
+    chat_id = msg.get('chat', {}).get('id')
+    if mode == 'chat':
+        return chat_id
+    if mode == 'user_chat':
+        return (user_id, chat_id)
+    # Posts de canal (sans 'from') : le chat tient lieu d'utilisateur
+    return user_id or ('chat', chat_id)
+
+
+class TokenBucketLimiter:
+    """`burst` messages d'affilée, puis `rate` messages par seconde, par clé.
+
+    `name` étiquette la jauge des clés suivies : un limiteur par bot hébergé, le dernier créé remplace le précédent.
+    """
+
+    def __init__(self, rate: float = 0.5, burst: int = 30, max_keys: int = 10000, idle_ttl: Optional[float] = None,
+                 clock=None, name: str = 'main'):
+        if rate <= 0 or burst < 1 or max_keys < 1:
+            raise ValueError("TokenBucketLimiter: rate > 0, burst >= 1 et max_keys >= 1 attendus")
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl if idle_ttl is not None else burst / rate
+        self.clock = clock or SYSTEM_CLOCK
+        self.name = name
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        RATE_LIMITER_KEYS.set_function(lambda: len(self._buckets), bot=name)
+
+    def allow(self, key: Hashable) -> bool:
+        now = self.clock.time()
+        with self._lock:
+            self._evict_idle(now)
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + max(0.0, now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict_idle(self, now: float) -> None:
+        # Appelé sous verrou ; les clés les plus anciennes sont en tête
+        while self._buckets:
+            key, (_, last) = next(iter(self._buckets.items()))
+            if now - last < self.idle_ttl:
+                return
+            del self._buckets[key]
@@ -0,0 +1,156 @@
+# read_model.py
+
+"""
+Modèle de lecture des écrans de statut (/bilan, /inter status, /stat, /collect,
+/qua, rapports et messages de session).
+
+Deux rôles :
+
+- compteurs agrégés des prédictions (total, gagnées, perdues, en attente) au
+  total, par mode (inter/static), par session et par rule_index. Chaque
+  prédiction y contribue une fois ; CardPredictor signale les changements
+  (note_prediction) à l'émission et à la vérification. Si le dictionnaire des
+  prédictions est remplacé (reset), tout est recompté à la lecture suivante ;
+- rendus mis en cache : un texte déjà construit est resservi tant que la
+  version de l'état (CardPredictor.state_version, ou celle de la vue rendue)
+  n'a pas changé ;
+- vues immuables (snapshot) de l'état, reconstruites par l'écrivain de la
+  table après chaque update ou commande qui l'a modifié (Shard.publish_snapshot)
+  et lisibles sans verrou depuis les autres threads : les écrans de statut
+  sont rendus à partir de ces vues.
+
+Les statuts hérités ('✅…', '❌') sont ramenés à 'won' / 'lost'.
+"""
+from collections import Counter, namedtuple
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+VIEW_RENDERS = REGISTRY.counter('bot_view_renders_total', "Rendus des écrans de statut : servis du cache (hit) ou recalculés (miss)", ('view', 'result'))
+
+WON = 'won'
+LOST = 'lost'
+PENDING = 'pending'
+
+# Dimensions de ventilation des compteurs
+DIMENSIONS = ('all', 'mode', 'session', 'rule_index')
+
+# Dernières prédictions retenues dans une vue immuable (/qua en affiche 5)
+RECENT_IN_SNAPSHOT = 5
+
+# Vue immuable de l'état d'un moteur : prédictions (jeu → prédiction, en lecture seule), compteurs et ventilations,
+# et ce que lisent les écrans de statut (règles INTER, quarantaine, déclencheurs collectés, dernières prédictions)
+PredictorSnapshot = namedtuple('PredictorSnapshot', 'version target_channel_id prediction_channel_id inter_mode_active '
+                                                    'predictions stats breakdown smart_rules quarantined_rules '
+                                                    'inter_data_count trigger_counts recent_predictions last_inter_update_time')
+
+
+def normalize_status(status: Any) -> str:
+    status = str(status or PENDING)
+    if status == WON or status.startswith('✅'):
+        return WON
+    if status == LOST or status.startswith('❌'):
+        return LOST
+    return PENDING
+
+
+class ReadModel:
+    """Compteurs des prédictions et rendus mis en cache d'un CardPredictor."""
+
+    def __init__(self, predictor, session_of: Callable[[float], Optional[str]]):
+        self._predictor = predictor
+        self._session_of = session_of
+        self._source: Optional[Dict] = None
+        # Contribution de chaque prédiction : jeu → (mode, session, rule_index, statut)
+        self._entries: Dict[int, Tuple[str, Optional[str], Any, str]] = {}
+        # (dimension, valeur) → Counter({'total': n, 'won': n, 'lost': n, 'pending': n})
+        self._counters: Dict[Tuple[str, Any], Counter] = {}
+        self._renders: Dict[str, Tuple[int, Any]] = {}
+
+    # --- Compteurs ---
+    def note_prediction(self, game_number: int) -> None:
+        """Prédiction émise, remplacée ou résolue : met à jour sa contribution."""
+        if self._source is not self._predictor.predictions:
+            # Le recomptage à la prochaine lecture l'inclura
+            return
+        self._apply(game_number, self._predictor.predictions.get(game_number))
+
+    def stats(self, dimension: str = 'all', value: Any = None) -> Counter:
+        self._sync()
+        return Counter(self._counters.get((dimension, value), ()))
+
+    def breakdown(self, dimension: str) -> Dict[Any, Counter]:
+        """Compteurs par valeur de la dimension ('mode', 'session' ou 'rule_index')."""
+        self._sync()
+        return {value: Counter(counts) for (dim, value), counts in self._counters.items() if dim == dimension}
+
+    def _sync(self) -> None:
+        predictions = self._predictor.predictions
+        if self._source is predictions:
+            return
+        self._entries = {}
+        self._counters = {}
+        self._source = predictions
+        for game_number, prediction in predictions.items():
+            self._apply(game_number, prediction)
+
+    def _apply(self, game_number: int, prediction: Optional[Dict]) -> None:
+        previous = self._entries.pop(game_number, None)
+        if previous is not None:
+            self._count(previous, -1)
+        if prediction is None:
+            return
+        entry = ('inter' if prediction.get('is_inter') else 'static',
+                 self._session_of(prediction['timestamp']) if prediction.get('timestamp') else None,
+                 prediction.get('rule_index', 0),
+                 normalize_status(prediction.get('status')))
+        self._entries[game_number] = entry
+        self._count(entry, 1)
+
+    def _count(self, entry: Tuple[str, Optional[str], Any, str], delta: int) -> None:
+        mode, session, rule_index, status = entry
+        for key in (('all', None), ('mode', mode), ('session', session), ('rule_index', rule_index)):
+            counts = self._counters.setdefault(key, Counter())
+            counts['total'] += delta
+            counts[status] += delta
+
+    # --- Vues immuables ---
+    def snapshot(self) -> PredictorSnapshot:
+        """Vue immuable de l'état, reconstruite seulement si la version a changé (à appeler par l'écrivain)."""
+        return self.render('snapshot', self._build_snapshot)
+
+    def _build_snapshot(self) -> PredictorSnapshot:
+        predictor = self._predictor
+        predictions = {game: MappingProxyType(dict(prediction)) for game, prediction in predictor.predictions.items()}
+        # Compteurs en lecture seule (un statut absent vaut 0)
+        breakdown = {dimension: MappingProxyType({value: MappingProxyType(counts) for value, counts in self.breakdown(dimension).items()})
+                     for dimension in DIMENSIONS[1:]}
+        # Déclencheurs par enseigne de résultat, du plus fréquent au moins fréquent
+        trigger_counts = {suit: tuple(counts.most_common()) for suit, counts in predictor.trigger_counts().items()}
+        return PredictorSnapshot(predictor.state_version, predictor.target_channel_id, predictor.prediction_channel_id,
+                                 bool(predictor.is_inter_mode_active), MappingProxyType(predictions),
+                                 MappingProxyType(self.stats()), MappingProxyType(breakdown),
+                                 tuple(MappingProxyType(dict(rule)) for rule in predictor.smart_rules),
+                                 MappingProxyType(dict(predictor.quarantined_rules)), len(predictor.inter_data),
+                                 MappingProxyType(trigger_counts),
+                                 tuple((game, predictions[game]) for game, _ in predictor.recent_predictions(RECENT_IN_SNAPSHOT)
+                                       if game in predictions),
+                                 predictor.last_inter_update_time)
+
+    # --- Rendus ---
+    def render(self, name: str, build: Callable[[], Any], version: Optional[int] = None) -> Any:
+        """
+        Rendu `name`, reconstruit par `build` seulement si l'état a changé depuis le dernier appel.
+        `version` : celle de la vue immuable rendue par `build` (par défaut, la version courante de l'état).
+        """
+        if version is None:
+            version = self._predictor.state_version
+        cached = self._renders.get(name)
+        if cached and cached[0] == version:
+            VIEW_RENDERS.inc(view=name, result='hit')
+            return cached[1]
+        VIEW_RENDERS.inc(view=name, result='miss')
+        rendered = build()
+        self._renders[name] = (version, rendered)
+        return rendered
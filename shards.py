@@ -0,0 +1,141 @@
+# shards.py
+
+"""
+Plusieurs tables de jeu suivies en même temps : une instance du moteur (shard)
+par couple canal source / canal de prédiction. Chaque bot hébergé (BOTS) a
+son propre registre de shards.
+
+Chaque shard a son propre CardPredictor, son répertoire de données (fichiers
+JSON, outbox.jsonl), son verrou de la logique métier (EngineGate) et son
+écrivain unique (actor.StateActor) : une table lente ou très active ne retient
+pas les autres. Le shard 'default' est celui d'origine (canaux codés en dur ou
+/config, données dans le répertoire courant) ; les autres sont déclarés par
+SHARDS="nom:source:prediction,..." et rangés sous SHARD_DATA_DIR/<nom>/.
+
+Les updates sont routés par chat : canal source ou de prédiction d'un shard →
+ce shard ; tout autre chat (admin) → le shard par défaut, sauf pour les
+commandes qui nomment leur table en dernier argument (`/qua <table>`, voir
+handlers.COMMANDS_WITH_TABLE). Le shard en cours est porté par le thread
+(ShardRegistry.using).
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from actor import StateActor
+from dispatcher import EngineGate
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD = 'default'
+
+SHARD_UPDATE_SECONDS = REGISTRY.histogram('bot_shard_update_seconds', "Durée de traitement des updates, par table (shard)", ('shard',))
+
+
+def parse_shards(spec: str) -> List[Tuple[str, int, int]]:
+    """'nom:source:prediction,...' → [(nom, source, prediction)] ; ValueError si mal formé."""
+    shards = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        parts = item.split(':')
+        if len(parts) != 3 or not parts[0].isidentifier():
+            raise ValueError(f"Shard invalide: '{item}' (attendu: nom:id_source:id_prediction)")
+        name, source, prediction = parts
+        if name == DEFAULT_SHARD or name in (s[0] for s in shards):
+            raise ValueError(f"Nom de shard réservé ou en double: '{name}'")
+        try:
+            shards.append((name, int(source), int(prediction)))
+        except ValueError:
+            raise ValueError(f"Shard invalide: '{item}' (ids de canaux entiers attendus)")
+    return shards
+
+
+class Shard:
+    """Une table suivie : moteur, journal des envois, verrou de la logique métier et écrivain unique."""
+
+    def __init__(self, name: str, predictor, outbox, gate: Optional[EngineGate] = None, label: Optional[str] = None):
+        self.name = name
+        self.predictor = predictor
+        self.outbox = outbox
+        self.gate = gate
+        self.actor: Optional[StateActor] = None
+        # Étiquette 'shard' des métriques : préfixée du nom du bot quand plusieurs bots partagent le processus
+        self.label = label or name
+        self._snapshot = None
+
+    def snapshot(self):
+        """
+        Vue immuable de l'état (ReadModel.snapshot) : la dernière publiée par l'écrivain pour les autres threads,
+        une vue à jour pour l'écrivain lui-même (thread de l'acteur ou détenteur du verrou).
+        """
+        if self._snapshot is None or self.actor is None or self.actor.is_writer():
+            return self.publish_snapshot()
+        return self._snapshot
+
+    def publish_snapshot(self):
+        """Appelé par l'écrivain après chaque update ou commande : reconstruit la vue si l'état a changé."""
+        self._snapshot = self.predictor.read_model.snapshot()
+        return self._snapshot
+
+
+class ShardRegistry:
+    """Shards indexés par canal (source et prédiction) ; le premier ajouté est le shard par défaut."""
+
+    def __init__(self):
+        self._shards: Dict[str, Shard] = {}
+        self._by_chat: Dict[str, Shard] = {}
+        self._local = threading.local()
+
+    def add(self, shard: Shard) -> Shard:
+        if shard.name in self._shards:
+            raise ValueError(f"Shard déjà enregistré: {shard.name}")
+        if shard.gate is None:
+            shard.gate = EngineGate()
+        if shard.actor is None:
+            shard.actor = StateActor(shard.label, shard.gate, context=lambda: self.using(shard),
+                                     after=shard.publish_snapshot).start()
+        self._shards[shard.name] = shard
+        self.reindex()
+        shard.publish_snapshot()
+        return shard
+
+    def reindex(self) -> None:
+        """Recalcule l'index par chat (après ajout d'un shard ou /config)."""
+        by_chat = {}
+        # Ordre inverse : en cas de canal partagé, le shard ajouté en premier l'emporte
+        for shard in reversed(list(self._shards.values())):
+            for chat_id in (shard.predictor.target_channel_id, shard.predictor.prediction_channel_id):
+                if chat_id:
+                    by_chat[str(chat_id)] = shard
+        self._by_chat = by_chat
+
+    @property
+    def default(self) -> Optional[Shard]:
+        return next(iter(self._shards.values()), None)
+
+    def get(self, name: str) -> Optional[Shard]:
+        return self._shards.get(name)
+
+    def for_chat(self, chat_id: Any) -> Optional[Shard]:
+        """Shard dont `chat_id` est le canal source ou de prédiction, sinon le shard par défaut."""
+        return self._by_chat.get(str(chat_id)) or self.default
+
+    def __iter__(self) -> Iterator[Shard]:
+        return iter(list(self._shards.values()))
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    # --- Shard du thread courant ---
+    def current(self) -> Optional[Shard]:
+        return getattr(self._local, 'shard', None) or self.default
+
+    @contextmanager
+    def using(self, shard: Optional[Shard]):
+        previous = getattr(self._local, 'shard', None)
+        self._local.shard = shard
+        try:
+            yield shard
+        finally:
+            self._local.shard = previous
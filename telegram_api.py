@@ -0,0 +1,216 @@
+# telegram_api.py
+
+"""
+Accès HTTP à l'API Bot Telegram : URL de base injectable (serveur mock,
+Bot API locale) et session requests commune à tout le processus (un seul
+pool de connexions pour tous les bots hébergés et toutes les tables).
+
+Deux protections contre une API lente ou en panne :
+- disjoncteur (CircuitBreaker), partagé par tous les clients d'une même URL
+  de base : ouvert après `failure_threshold` échecs consécutifs (erreur
+  réseau, 5xx), il fait échouer les appels immédiatement, puis laisse passer
+  un seul appel de test après `reset_timeout` secondes ;
+- budget par update (deadline_budget) : le temps total des appels sortants
+  d'un même update est plafonné ; le timeout de chaque appel est réduit au
+  temps restant.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import requests
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_BASE = "https://api.telegram.org"
+
+API_SECONDS = REGISTRY.histogram('bot_telegram_api_seconds', "Durée des appels à l'API Bot Telegram", ('method', 'status'))
+API_FAST_FAILS = REGISTRY.counter('bot_telegram_api_fast_fail_total', "Appels refusés sans contacter l'API", ('reason',))
+CIRCUIT_STATE = REGISTRY.gauge('bot_telegram_circuit_state', "État du disjoncteur de l'API (0 fermé, 1 ouvert, 2 test)", ('api',))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+_STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Disjoncteur ouvert : l'appel n'a pas été envoyé."""
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Budget de l'update épuisé : l'appel n'a pas été envoyé."""
+
+
+class CircuitBreaker:
+    """Disjoncteur fermé / ouvert / test (un seul appel de test à la fois)."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = 'telegram'):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set_function(lambda: _STATE_VALUES[self.state], api=name)
+
+    def is_open(self) -> bool:
+        """True si un appel serait refusé maintenant."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            return self.state == HALF_OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                logger.info(f"🔌 API {self.name}: appel de test")
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"🔌 API {self.name}: disjoncteur refermé")
+            self.state = CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    logger.warning(f"🔌 API {self.name}: {self._failures} échecs consécutifs, disjoncteur ouvert "
+                                   f"({self.reset_timeout:g}s)")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def record_neutral(self) -> None:
+        """Appel interrompu sans verdict sur l'API (budget de l'update) : un appel de test est de nouveau permis."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(api_base: Optional[str] = None) -> CircuitBreaker:
+    """Disjoncteur partagé par tous les clients d'une même URL de base."""
+    api_base = (api_base or DEFAULT_API_BASE).rstrip('/')
+    with _breakers_lock:
+        if api_base not in _breakers:
+            _breakers[api_base] = CircuitBreaker(name=api_base.split('://')[-1])
+        return _breakers[api_base]
+
+
+def configure_breaker(api_base: Optional[str], failure_threshold: int, reset_timeout: float) -> CircuitBreaker:
+    breaker = breaker_for(api_base)
+    breaker.failure_threshold = failure_threshold
+    breaker.reset_timeout = reset_timeout
+    return breaker
+
+
+# Taille du pool de connexions par hôte de la session commune
+POOL_MAXSIZE = 32
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def shared_session() -> requests.Session:
+    """Session requests du processus : connexions réutilisées par tous les clients TelegramApi."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+# --- Budget par update ---
+_local = threading.local()
+
+
+@contextmanager
+def deadline_budget(seconds: Optional[float]):
+    """Plafonne le temps total des appels à l'API dans le bloc (imbrication : le plus court l'emporte)."""
+    previous = getattr(_local, 'deadline', None)
+    if seconds:
+        deadline = time.monotonic() + seconds
+        _local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def remaining_budget() -> Optional[float]:
+    """Secondes restantes du budget courant (None hors budget)."""
+    deadline = getattr(_local, 'deadline', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class TelegramApi:
+    """Point unique des appels sortants vers l'API Bot Telegram."""
+
+    def __init__(self, token: str, api_base: Optional[str] = None, session: Optional[requests.Session] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.api_base = (api_base or DEFAULT_API_BASE).rstrip('/')
+        self.base_url = f"{self.api_base}/bot{token}"
+        self.session = session or shared_session()
+        self.breaker = breaker or breaker_for(self.api_base)
+
+    def _request(self, http_method: str, method: str, **kwargs) -> requests.Response:
+        remaining = remaining_budget()
+        budget_bound = False
+        if remaining is not None:
+            if remaining <= 0:
+                API_FAST_FAILS.inc(reason='deadline')
+                raise DeadlineExceeded(f"{method}: budget de l'update épuisé")
+            budget_bound = remaining < kwargs.get('timeout', remaining)
+            kwargs['timeout'] = min(kwargs.get('timeout', remaining), remaining)
+        if not self.breaker.allow():
+            API_FAST_FAILS.inc(reason='circuit_open')
+            raise CircuitOpenError(f"{method}: disjoncteur ouvert")
+
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.request(http_method, f"{self.base_url}/{method}", **kwargs)
+            status = response.status_code
+        except requests.Timeout:
+            # Timeout raccourci par le budget : ne dit rien de l'état de l'API
+            if budget_bound:
+                self.breaker.record_neutral()
+            else:
+                self.breaker.record_failure()
+            raise
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - start, method=method, status=status)
+        if status >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def post(self, method: str, json: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None,
+             files: Optional[Dict[str, Any]] = None, timeout: float = 10) -> requests.Response:
+        return self._request('POST', method, json=json, data=data, files=files, timeout=timeout)
+
+    def get(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 10) -> requests.Response:
+        return self._request('GET', method, params=params, timeout=timeout)
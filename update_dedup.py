@@ -0,0 +1,116 @@
+# update_dedup.py
+
+"""
+Fenêtre de déduplication des updates Telegram (re-livraisons du webhook).
+
+Un update est réservé (claim) à la réception, puis inscrit dans la fenêtre
+seulement une fois traité (mark_processed) : un arrêt en plein traitement ne
+le fait pas passer pour déjà vu. La fenêtre est écrite sur disque en même
+temps que l'état du moteur (flush=True quand l'update a fait sauvegarder
+l'état), et au plus tard tous les `save_every` updates.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import List
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DUPLICATES_DROPPED = REGISTRY.counter('bot_duplicate_updates_total', "Updates ignorés car update_id déjà traité")
+
+
+class UpdateDeduplicator:
+    """
+    Mémorise les N derniers update_id (anneau + ensemble, O(1) par update).
+    Persisté sous forme de plages [[début, fin], ...] : les update_id étant
+    quasi consécutifs, la fenêtre tient en quelques entiers.
+    """
+
+    def __init__(self, capacity: int = 2000, filename: str = 'processed_updates.json', save_every: int = 10):
+        self.capacity = capacity
+        self.filename = filename
+        self.save_every = max(1, save_every)
+        self._ring: deque = deque(maxlen=capacity)
+        self._seen = set()
+        # Updates reçus, en cours de traitement (une re-livraison concurrente est écartée)
+        self._in_flight = set()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+        atexit.register(self.flush)
+
+    def claim(self, update_id: int) -> bool:
+        """Réserve l'update pour traitement ; False si c'est un doublon (déjà traité ou en cours)."""
+        with self._lock:
+            if update_id in self._seen or update_id in self._in_flight:
+                DUPLICATES_DROPPED.inc()
+                return False
+            self._in_flight.add(update_id)
+        return True
+
+    def release(self, update_id: int) -> None:
+        """Traitement échoué : l'update pourra être re-livré et traité."""
+        with self._lock:
+            self._in_flight.discard(update_id)
+
+    def mark_processed(self, update_id: int, flush: bool = False) -> None:
+        """Update traité : inscrit dans la fenêtre (écrite avec l'état si `flush`)."""
+        with self._lock:
+            self._in_flight.discard(update_id)
+            if update_id in self._seen:
+                return
+            if len(self._ring) == self.capacity:
+                self._seen.discard(self._ring[0])
+            self._ring.append(update_id)
+            self._seen.add(update_id)
+            self._unsaved += 1
+            if flush or self._unsaved >= self.save_every:
+                self._save()
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    # --- Persistance compacte ---
+    @staticmethod
+    def _to_ranges(ids: List[int]) -> List[List[int]]:
+        ranges: List[List[int]] = []
+        for uid in sorted(ids):
+            if ranges and uid == ranges[-1][1] + 1:
+                ranges[-1][1] = uid
+            elif not ranges or uid != ranges[-1][1]:
+                ranges.append([uid, uid])
+        return ranges
+
+    def _save(self) -> None:
+        try:
+            with open(self.filename, 'w') as f:
+                json.dump(self._to_ranges(list(self._ring)), f)
+            self._unsaved = 0
+        except Exception as e:
+            logger.error(f"❌ Erreur sauvegarde {self.filename}: {e}")
+
+    def _load(self) -> None:
+        try:
+            if not os.path.exists(self.filename):
+                return
+            with open(self.filename, 'r') as f:
+                content = f.read().strip()
+            if not content:
+                return
+            ids = [uid for start, end in json.loads(content) for uid in range(int(start), int(end) + 1)]
+            for uid in ids[-self.capacity:]:
+                self._ring.append(uid)
+                self._seen.add(uid)
+            logger.info(f"🧾 Fenêtre de déduplication restaurée: {len(self._ring)} update_id")
+        except Exception as e:
+            logger.error(f"⚠️ Erreur chargement {self.filename}: {e}")
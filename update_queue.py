@@ -0,0 +1,134 @@
+# update_queue.py
+
+"""
+File d'attente bornée entre la route /webhook et le traitement des updates.
+Le webhook répond immédiatement à Telegram ; un thread unique consomme la file dans l'ordre.
+En surcharge, un LoadShedder optionnel (load_shedding.py) allège le traitement.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Callable, Deque, Dict, Optional
+
+from load_shedding import DEFER, DROP, PROCESS, SKIP_PREDICTION, LoadShedder, predictions_suspended
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = REGISTRY.gauge('bot_update_queue_depth', "Nombre d'updates en attente de traitement", ('queue',))
+QUEUE_WAIT = REGISTRY.histogram('bot_update_queue_wait_seconds', "Temps passé par un update dans la file avant traitement", ('queue',))
+QUEUE_ENQUEUED = REGISTRY.counter('bot_update_queue_enqueued_total', "Updates acceptés dans la file", ('queue',))
+QUEUE_REJECTED = REGISTRY.counter('bot_update_queue_rejected_total', "Updates refusés car la file est pleine", ('queue',))
+QUEUE_PROCESSED = REGISTRY.counter('bot_update_queue_processed_total', "Updates traités par le worker", ('queue', 'result'))
+
+_STOP = object()
+
+
+class UpdateQueue:
+    """File FIFO bornée consommée par un thread de traitement dédié."""
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], None], maxsize: int = 1000, name: str = 'webhook',
+                 shedder: Optional[LoadShedder] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.shedder = shedder
+        self._handler = handler
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        # Arrêt demandé alors que la file était pleine : le worker sort sans attendre le marqueur _STOP
+        self._stopping = threading.Event()
+        # Commandes admin mises de côté pendant une surcharge (toujours comptées comme non terminées pour join())
+        self._deferred: Deque[Dict[str, Any]] = deque()
+        QUEUE_DEPTH.set_function(self._queue.qsize, queue=name)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=f'{self.name}-worker', daemon=True)
+        self._thread.start()
+        logger.info(f"📥 File d'updates '{self.name}' démarrée (capacité {self.maxsize})")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Arrête le worker après avoir vidé les updates déjà en file (file pleine : arrêt après l'update en cours)."""
+        if not self._thread:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"⚠️ File '{self.name}' pleine à l'arrêt : {self._queue.qsize()} update(s) non traité(s)")
+            self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def put(self, update: Dict[str, Any]) -> bool:
+        """Ajoute un update sans bloquer. Retourne False si la file est pleine."""
+        if self.shedder:
+            self.shedder.note_enqueued(update)
+        try:
+            self._queue.put_nowait((time.monotonic(), update))
+        except queue.Full:
+            QUEUE_REJECTED.inc(queue=self.name)
+            logger.warning(f"⚠️ File '{self.name}' pleine ({self.maxsize}), update {update.get('update_id')} refusé")
+            return False
+        QUEUE_ENQUEUED.inc(queue=self.name)
+        return True
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def join(self) -> None:
+        """Bloque jusqu'à ce que tous les updates en file soient traités."""
+        self._queue.join()
+
+    def _handle(self, update: Dict[str, Any], action: str = PROCESS) -> None:
+        try:
+            with (predictions_suspended() if action == SKIP_PREDICTION else nullcontext()):
+                self._handler(update)
+            QUEUE_PROCESSED.inc(queue=self.name, result='ok')
+        except Exception as e:
+            QUEUE_PROCESSED.inc(queue=self.name, result='error')
+            logger.error(f"❌ Erreur traitement update {update.get('update_id')} depuis la file: {e}")
+
+    def _replay_deferred(self) -> None:
+        """Traite, dans l'ordre, les commandes mises de côté dès que la surcharge est passée."""
+        while self._deferred and not self.shedder.update_load(self._queue.qsize()):
+            self._handle(self._deferred.popleft())
+            self._queue.task_done()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                # Avec des commandes en attente, on se réveille régulièrement pour les reprendre
+                item = self._queue.get(timeout=1.0 if self._deferred else None)
+            except queue.Empty:
+                self._replay_deferred()
+                continue
+            done = True
+            try:
+                if item is _STOP:
+                    # Arrêt : les commandes mises de côté sont traitées avant de sortir
+                    while self._deferred:
+                        self._handle(self._deferred.popleft())
+                        self._queue.task_done()
+                    return
+                enqueued_at, update = item
+                QUEUE_WAIT.observe(time.monotonic() - enqueued_at, queue=self.name)
+                action = PROCESS
+                if self.shedder:
+                    self._replay_deferred()
+                    self.shedder.update_load(self._queue.qsize())
+                    action = self.shedder.decide(update)
+                if action == DROP:
+                    QUEUE_PROCESSED.inc(queue=self.name, result='shed')
+                elif action == DEFER:
+                    self._deferred.append(update)
+                    done = False
+                else:
+                    self._handle(update, action)
+            finally:
+                if done:
+                    self._queue.task_done()